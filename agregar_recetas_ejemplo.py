@@ -92,6 +92,8 @@ def agregar_recetas_ejemplo(usuario_id):
     ]
 
     with Conexion("base_datos/recetas.db") as db:
+        # Nombre -> ID de todas las etiquetas, desde el catálogo en caché
+        ids_etiquetas = dict(db.obtener_catalogo_etiquetas()['por_nombre'])
         for receta in recetas:
             try:
                 db.cursor.execute("""
@@ -112,32 +114,34 @@ def agregar_recetas_ejemplo(usuario_id):
                 receta_id = db.cursor.lastrowid
 
                 for etiqueta_nombre in receta.get("etiquetas", []):
-                    db.cursor.execute(
-                        "SELECT id_etiqueta FROM etiquetas WHERE nombre = ?",
-                        (etiqueta_nombre,)
-                    )
-                    etiqueta = db.cursor.fetchone()
+                    etiqueta_id = ids_etiquetas.get(etiqueta_nombre)
                     
-                    if not etiqueta:
+                    if etiqueta_id is None:
                         db.cursor.execute(
                             "INSERT INTO etiquetas (nombre) VALUES (?)",
                             (etiqueta_nombre,)
                         )
                         etiqueta_id = db.cursor.lastrowid
-                    else:
-                        etiqueta_id = etiqueta[0]
+                        ids_etiquetas[etiqueta_nombre] = etiqueta_id
                     
                     db.cursor.execute(
                         "INSERT OR IGNORE INTO receta_etiqueta (id_receta, id_etiqueta) VALUES (?, ?)",
                         (receta_id, etiqueta_id)
                     )
                 
+                db.actualizar_recetas_relacionadas(receta_id)
+                db.actualizar_ingredientes_receta(receta_id, receta["ingredientes"])
                 db.conexion.commit()
                 print(f"Receta agregada: {receta['titulo']}")
                 
             except Exception as e:
                 print(f"Error al agregar receta {receta.get('titulo')}: {e}")
                 db.conexion.rollback()
+                # Las etiquetas creadas en la transacción descartada ya no existen
+                ids_etiquetas = dict(db.obtener_catalogo_etiquetas()['por_nombre'])
+
+        # Invalidar la caché de la landing page en los procesos de la aplicación
+        db.invalidar_cache('recetas')
 
 if __name__ == "__main__":
     print("Creando tablas en orden correcto...")
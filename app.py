@@ -1,21 +1,372 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, session
 from flask_cors import CORS
 from base_datos.conexion import Conexion
+from base_datos.pool import PoolConexiones
+from base_datos.almacenamiento import perfil_desde_entorno
+from base_datos.busqueda import resaltar
+from base_datos.votos_diferidos import EscritorVotosDiferido, EscritorSaturado
+from base_datos.cache import CacheVersionada, catalogo_etiquetas, facetas_etiquetas
+from base_datos.despensa import IndiceDespensa
+from base_datos.filtros import IndiceFiltros, expresion_desde_parametros
+from base_datos.estaticos import MAX_EDAD_INMUTABLE, RecursosEstaticos
+from base_datos.compresion import MiddlewareCompresion
+from base_datos.contrasenas import METODO_POR_DEFECTO, ServicioContrasenas, ServicioSaturado
+from base_datos import instrumentacion
+from base_datos.metricas import Metricas
+import hashlib
+import mimetypes
 import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, g, send_from_directory
 
 app = Flask(__name__)
 app.secret_key = 'tu_clave_secreta_aqui'  # Cambia esto por una clave segura
 CORS(app)
+app.add_template_filter(resaltar)
+
+# Recursos estáticos con huella de contenido (base_datos/estaticos.py): al
+# desplegar, `flask --app app estaticos` genera en static/dist/ las copias con
+# hash en el nombre y sus variantes gzip/brotli; al importar sólo se lee el
+# manifiesto y url_for('static', ...) apunta a ellas. Sin manifiesto, o con
+# ESTATICOS_HUELLAS=0, se sirven los archivos originales como siempre.
+app.config['ESTATICOS_HUELLAS'] = os.environ.get('ESTATICOS_HUELLAS', '1') == '1'
+recursos_estaticos = RecursosEstaticos(app.static_folder)
+if app.config['ESTATICOS_HUELLAS']:
+    recursos_estaticos.preparar()
+
+@app.cli.command('estaticos')
+def comando_estaticos():
+    """Genera los recursos estáticos con huella y precomprimidos."""
+    recursos_estaticos.preparar(construir_antes=True)
+    print(f"Recursos con huella: {len(recursos_estaticos.manifiesto)}")
+
+@app.url_defaults
+def estatico_con_huella(endpoint, valores):
+    if endpoint == 'static' and app.config['ESTATICOS_HUELLAS']:
+        con_huella = recursos_estaticos.url(valores.get('filename'))
+        if con_huella:
+            valores['filename'] = con_huella
+
+def servir_estatico(filename):
+    """Reemplaza al handler de Flask: los recursos con huella son inmutables y precomprimidos"""
+    variante = recursos_estaticos.variante(filename, request.accept_encodings)
+    if variante is None:
+        return app.send_static_file(filename)
+    archivo, codificacion = variante
+    respuesta = send_from_directory(app.static_folder, archivo, max_age=MAX_EDAD_INMUTABLE,
+                                    mimetype=mimetypes.guess_type(filename)[0])
+    if codificacion:
+        respuesta.headers['Content-Encoding'] = codificacion
+    respuesta.vary.add('Accept-Encoding')
+    respuesta.cache_control.public = True
+    respuesta.cache_control.immutable = True
+    return respuesta
+
+app.view_functions['static'] = servir_estatico
+
+# Compresión de las respuestas HTML y JSON (base_datos/compresion.py): gzip, o
+# zstd si está instalado y el cliente lo acepta. COMPRESION_MINIMO es el tamaño
+# en bytes desde el que se comprime; COMPRESION=0 la desactiva (p. ej. si ya
+# comprime el proxy).
+app.config['COMPRESION'] = os.environ.get('COMPRESION', '1') == '1'
+app.config['COMPRESION_MINIMO'] = int(os.environ.get('COMPRESION_MINIMO', 1024))
+app.config['COMPRESION_NIVEL_GZIP'] = int(os.environ.get('COMPRESION_NIVEL_GZIP', 6))
+app.config['COMPRESION_NIVEL_ZSTD'] = int(os.environ.get('COMPRESION_NIVEL_ZSTD', 3))
+if app.config['COMPRESION']:
+    app.wsgi_app = MiddlewareCompresion(
+        app.wsgi_app,
+        minimo=app.config['COMPRESION_MINIMO'],
+        nivel_gzip=app.config['COMPRESION_NIVEL_GZIP'],
+        nivel_zstd=app.config['COMPRESION_NIVEL_ZSTD']
+    )
 
 # Configuración de la base de datos
 DB_NAME = "base_datos/recetas.db"
+app.config['DATABASE'] = DB_NAME
+
+# Perfil de PRAGMA (WAL, synchronous, mmap, caché...) aplicado a cada conexión física
+app.config['DB_PERFIL'] = perfil_desde_entorno()
+
+# Configuración del pool de conexiones. Las lecturas usan conexiones de solo
+# lectura en paralelo; las escrituras se serializan a través de un único escritor.
+app.config['DB_POOL_TAMANO'] = int(os.environ.get('DB_POOL_TAMANO', 5))
+app.config['DB_POOL_ESCRITORES'] = int(os.environ.get('DB_POOL_ESCRITORES', 1))
+app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+app.config['DB_POOL_MAX_USOS'] = int(os.environ.get('DB_POOL_MAX_USOS', 1000))
+app.config['DB_POOL_MAX_EDAD'] = float(os.environ.get('DB_POOL_MAX_EDAD', 300))
+
+# Instrumentación de SQL: con SQL_INSTRUMENTAR=1 cada respuesta lleva un encabezado
+# Server-Timing con la cantidad y el tiempo de las consultas, y las sentencias más
+# lentas que SQL_UMBRAL_LENTO_MS se informan con su EXPLAIN QUERY PLAN. Desactivada,
+# las conexiones son las de sqlite3 sin ningún agregado.
+app.config['SQL_INSTRUMENTAR'] = os.environ.get('SQL_INSTRUMENTAR', '0') == '1'
+app.config['SQL_UMBRAL_LENTO_MS'] = float(os.environ.get('SQL_UMBRAL_LENTO_MS', 100))
+
+# Métricas en formato Prometheus (/metrics). Con varios workers, METRICAS_DIR
+# apunta a una carpeta compartida donde cada proceso vuelca las suyas.
+app.config['METRICAS'] = os.environ.get('METRICAS', '1') == '1'
+app.config['METRICAS_DIR'] = os.environ.get('METRICAS_DIR')
+metricas = Metricas(directorio=app.config['METRICAS_DIR'])
+
+# Un pool de lectura y uno de escritura por archivo de base de datos
+_pools = {}
+_pools_lock = threading.Lock()
+
+def obtener_pool(solo_lectura=False):
+    """Devuelve el pool de lectura o de escritura de la base de datos configurada"""
+    nombre_bd = app.config['DATABASE']
+    with _pools_lock:
+        pool = _pools.get((nombre_bd, solo_lectura))
+        if pool is None:
+            if solo_lectura and (nombre_bd, False) not in _pools:
+                # El escritor fija el modo de diario (WAL) antes de abrir lectores
+                _pools[(nombre_bd, False)] = _crear_pool(nombre_bd, False)
+            pool = _crear_pool(nombre_bd, solo_lectura)
+            _pools[(nombre_bd, solo_lectura)] = pool
+        return pool
+
+def _crear_pool(nombre_bd, solo_lectura):
+    instrumentacion.configurar(umbral_lento_ms=app.config['SQL_UMBRAL_LENTO_MS'])
+    pool = PoolConexiones(
+        nombre_bd,
+        tamano=app.config['DB_POOL_TAMANO' if solo_lectura else 'DB_POOL_ESCRITORES'],
+        timeout=app.config['DB_POOL_TIMEOUT'],
+        max_usos=app.config['DB_POOL_MAX_USOS'],
+        max_edad=app.config['DB_POOL_MAX_EDAD'],
+        perfil=app.config['DB_PERFIL'],
+        solo_lectura=solo_lectura,
+        instrumentar=app.config['SQL_INSTRUMENTAR']
+    )
+    if not solo_lectura:
+        # Abrir el escritor de inmediato para que el modo de diario quede aplicado
+        pool.devolver(pool.obtener())
+    return pool
+
+def cerrar_pools():
+    """Cierra todos los pools de conexiones abiertos"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.cerrar()
+        _pools.clear()
+
+# Caché de datos de la landing page. Cada entrada se valida contra la versión
+# de los datos guardada en la base, así que una receta creada por otro proceso
+# también la invalida; CACHE_TTL (segundos, 0 la desactiva) acota su vida.
+app.config['CACHE_TTL'] = float(os.environ.get('CACHE_TTL', 60))
+cache_datos = CacheVersionada(ttl=app.config['CACHE_TTL'])
 
-def get_db_connection():
-    """Crea y devuelve una conexión a la base de datos"""
-    return Conexion("base_datos/recetas.db")
+def clave_cache(nombre):
+    """Clave de caché propia de la base de datos configurada"""
+    return (app.config['DATABASE'], nombre)
+
+# Índice en memoria de la búsqueda por despensa, uno por base de datos. Se pone
+# al día en cada búsqueda (las recetas nuevas se agregan de a una); DESPENSA_TTL
+# (segundos) fija cada cuánto se recarga entero para recoger ediciones y bajas.
+app.config['DESPENSA_TTL'] = float(os.environ.get('DESPENSA_TTL', 600))
+indices_despensa = {}
+_indices_despensa_lock = threading.Lock()
+
+def obtener_indice_despensa():
+    """Devuelve el índice de despensa de la base de datos configurada"""
+    with _indices_despensa_lock:
+        indice = indices_despensa.get(app.config['DATABASE'])
+        if indice is None:
+            indice = IndiceDespensa(ttl=app.config['DESPENSA_TTL'])
+            indices_despensa[app.config['DATABASE']] = indice
+        return indice
+
+# Índice en memoria de etiquetas y restricciones por receta para los filtros
+# combinados del listado, uno por base de datos; FILTROS_TTL como DESPENSA_TTL.
+app.config['FILTROS_TTL'] = float(os.environ.get('FILTROS_TTL', 600))
+indices_filtros = {}
+_indices_filtros_lock = threading.Lock()
+
+def obtener_indice_filtros():
+    """Devuelve el índice de filtros de la base de datos configurada"""
+    with _indices_filtros_lock:
+        indice = indices_filtros.get(app.config['DATABASE'])
+        if indice is None:
+            indice = IndiceFiltros(ttl=app.config['FILTROS_TTL'])
+            indices_filtros[app.config['DATABASE']] = indice
+        return indice
+
+def parametros_filtro():
+    """
+    Lee los filtros repetibles del listado: ?etiqueta= (todas), ?alguna= (al
+    menos una), ?sin= (ninguna) y ?restriccion= (todas).
+    """
+    return {clave: [valor for valor in request.args.getlist(clave) if valor]
+            for clave in ('etiqueta', 'alguna', 'sin', 'restriccion')}
+
+def aplicar_filtros(db, filtros):
+    """
+    Devuelve (etiqueta, filtro, expresión) para obtener_recetas_pagina: una
+    sola etiqueta se filtra en SQL como siempre; cualquier otra combinación se
+    evalúa en el índice de filtros y se pasa como Bitmap de IDs, junto con la
+    expresión que lo identifica en la caché de facetas.
+    """
+    if len(filtros['etiqueta']) <= 1 and not (filtros['alguna'] or filtros['sin'] or filtros['restriccion']):
+        return (filtros['etiqueta'] or [''])[0], None, None
+    indice = obtener_indice_filtros()
+    indice.actualizar(db)
+    expresion = expresion_desde_parametros(todas=filtros['etiqueta'], alguna=filtros['alguna'],
+                                           ninguna=filtros['sin'], restricciones=filtros['restriccion'])
+    return '', indice.evaluar(expresion), expresion
+
+def chips_filtros(busqueda, ingrediente, filtros):
+    """Filtros combinados activos como [{texto, url}], donde url es el listado sin ese filtro"""
+    prefijos = {'etiqueta': '', 'alguna': 'o ', 'sin': 'sin ', 'restriccion': ''}
+    chips = []
+    for clave, valores in filtros.items():
+        for valor in valores:
+            restantes = dict(filtros, **{clave: [v for v in valores if v != valor]})
+            chips.append({
+                'texto': prefijos[clave] + valor,
+                'url': url_for('ver_recetas', buscar=busqueda or None,
+                               ingrediente=ingrediente or None, **restantes)
+            })
+    return chips
+
+def enlaces_facetas(busqueda, ingrediente, filtros, facetas):
+    """
+    URL de cada etiqueta de las facetas: la suma al filtro actual (así el conteo
+    es lo que se va a listar) o, si ya está elegida, la quita.
+    """
+    enlaces = {}
+    for faceta in facetas['etiquetas']:
+        nombre = faceta['nombre']
+        etiquetas = [e for e in filtros['etiqueta'] if e != nombre]
+        if nombre not in filtros['etiqueta']:
+            etiquetas.append(nombre)
+        enlaces[nombre] = url_for('ver_recetas', buscar=busqueda or None, ingrediente=ingrediente or None,
+                                  **dict(filtros, etiqueta=etiquetas))
+    return enlaces
+
+# Escritura diferida de votos: agrupa ráfagas de votos en una sola transacción
+app.config['VOTOS_DIFERIDOS'] = os.environ.get('VOTOS_DIFERIDOS', '0') == '1'
+app.config['VOTOS_INTERVALO_MS'] = float(os.environ.get('VOTOS_INTERVALO_MS', 0))
+
+_escritor_votos = None
+_escritor_votos_lock = threading.Lock()
+
+def obtener_escritor_votos():
+    """Devuelve el escritor diferido de votos, creándolo la primera vez"""
+    global _escritor_votos
+    with _escritor_votos_lock:
+        if _escritor_votos is None:
+            _escritor_votos = EscritorVotosDiferido(
+                get_db_connection,
+                intervalo=app.config['VOTOS_INTERVALO_MS'] / 1000
+            )
+        return _escritor_votos
+
+# Hash de contraseñas en un pool de procesos acotado. PASSWORD_METODO fija el
+# costo (los hashes guardados con otro costo se actualizan al iniciar sesión);
+# con más de PASSWORD_MAX_PENDIENTES pedidos en curso se responde 503.
+app.config['PASSWORD_METODO'] = os.environ.get('PASSWORD_METODO', METODO_POR_DEFECTO)
+app.config['PASSWORD_PROCESOS'] = int(os.environ.get('PASSWORD_PROCESOS', os.cpu_count() or 1))
+app.config['PASSWORD_MAX_PENDIENTES'] = int(os.environ.get(
+    'PASSWORD_MAX_PENDIENTES', 4 * app.config['PASSWORD_PROCESOS'] or 4
+))
+
+_servicio_contrasenas = None
+_servicio_contrasenas_lock = threading.Lock()
+
+def obtener_servicio_contrasenas():
+    """Devuelve el servicio de hash de contraseñas, creándolo la primera vez"""
+    global _servicio_contrasenas
+    with _servicio_contrasenas_lock:
+        if _servicio_contrasenas is None:
+            _servicio_contrasenas = ServicioContrasenas(
+                metodo=app.config['PASSWORD_METODO'],
+                procesos=app.config['PASSWORD_PROCESOS'],
+                max_pendientes=app.config['PASSWORD_MAX_PENDIENTES']
+            )
+        return _servicio_contrasenas
+
+def respuesta_saturado(plantilla):
+    """Vuelve a mostrar el formulario con un 503 cuando el servicio de contraseñas está saturado"""
+    flash('Hay muchas solicitudes en este momento. Por favor, inténtalo de nuevo en unos segundos.', 'error')
+    return render_template(plantilla), 503, {'Retry-After': '1'}
+
+# Paginación del listado de recetas
+RECETAS_POR_PAGINA = 12
+MAX_RECETAS_POR_PAGINA = 50
+COMENTARIOS_POR_PAGINA = 10
+MAX_COMENTARIOS_POR_PAGINA = 50
+
+# Claves de versiones_cache que cambian el contenido de cada recurso de la API
+VERSIONES_LISTADO = ('recetas', 'etiquetas', 'votos', 'ingredientes', 'restricciones')
+VERSIONES_DETALLE = ('ingredientes',)
+
+def respuesta_condicional(partes, modificado, generar):
+    """
+    Responde un GET condicional sin armar el cuerpo si el cliente ya lo tiene.
+
+    El ETag es un hash de `partes` (versiones de los datos que forman la
+    respuesta, baratas de leer) y `modificado` (segundos epoch o None) es el
+    Last-Modified. Si If-None-Match coincide, o no viene y la fecha de
+    If-Modified-Since no es anterior, devuelve un 304 sin llamar a `generar`.
+    """
+    etag = hashlib.sha1(repr((request.endpoint,) + tuple(partes)).encode()).hexdigest()[:24]
+    if request.if_none_match:
+        vigente = request.if_none_match.contains_weak(etag)
+    else:
+        vigente = (modificado is not None and request.if_modified_since is not None
+                   and request.if_modified_since.timestamp() >= modificado)
+
+    respuesta = app.response_class(status=304) if vigente else generar()
+    if respuesta.status_code in (200, 304):
+        respuesta.set_etag(etag)
+        if modificado is not None:
+            respuesta.last_modified = datetime.fromtimestamp(modificado, timezone.utc)
+        # Los clientes pueden guardarla pero deben revalidarla en cada uso
+        respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+def get_db_connection(solo_lectura=False):
+    """
+    Devuelve una conexión a la base de datos tomada del pool.
+
+    Las rutas que sólo consultan deben pedir `solo_lectura=True` para no competir
+    con las escrituras por la conexión del escritor.
+    """
+    return Conexion(pool=obtener_pool(solo_lectura))
+
+@app.before_request
+def iniciar_request():
+    g.inicio_request = time.perf_counter()
+    if app.config['SQL_INSTRUMENTAR']:
+        g.registro_consultas = instrumentacion.iniciar_registro()
+
+@app.after_request
+def registrar_request(respuesta):
+    duracion = time.perf_counter() - g.inicio_request
+    registro = g.get('registro_consultas')
+    if registro is not None:
+        respuesta.headers['Server-Timing'] = f"{registro.server_timing()}, app;dur={duracion * 1000:.2f}"
+    if app.config['METRICAS']:
+        endpoint = (('endpoint', request.endpoint or 'sin_ruta'),)
+        metricas.observar('recetas_http_duracion_segundos', endpoint, duracion)
+        metricas.incrementar('recetas_http_pedidos_total',
+                             endpoint + (('metodo', request.method), ('codigo', str(respuesta.status_code))))
+        if respuesta.status_code >= 500:
+            metricas.incrementar('recetas_http_errores_total', endpoint)
+        metricas.volcar()
+    return respuesta
+
+@app.teardown_request
+def terminar_request(error=None):
+    registro = g.pop('registro_consultas', None)
+    if registro is not None:
+        instrumentacion.terminar_registro(registro)
+    if isinstance(error, sqlite3.OperationalError) and 'locked' in str(error):
+        metricas.incrementar('recetas_db_bloqueada_total')
 
 # Decorador para verificar que el usuario está autenticado
 def login_required(f):
@@ -30,8 +381,12 @@ def login_required(f):
 # Ruta principal (landing page)
 @app.route('/')
 def index():
-    with get_db_connection() as db:
-        recetas_populares = db.obtener_ultimas_recetas(limite=6)
+    with get_db_connection(solo_lectura=True) as db:
+        recetas_populares = cache_datos.obtener(
+            clave_cache('landing'),
+            db.obtener_version_cache('recetas'),
+            lambda: db.obtener_ultimas_recetas(limite=6)
+        )
     return render_template('landing.html', recetas_populares=recetas_populares)
     
 
@@ -60,18 +415,25 @@ def crear_cuenta():
             return redirect(url_for('crear_cuenta'))
 
         # Check if email already exists
-        with get_db_connection() as db:
+        with get_db_connection(solo_lectura=True) as db:
             if db.existe_email(email):
                 flash('El correo electrónico ya está registrado', 'error')
                 return redirect(url_for('crear_cuenta'))
 
+        # El hash se calcula sin tener tomada la conexión de escritura
+        try:
+            password_hash = obtener_servicio_contrasenas().hashear(password)
+        except ServicioSaturado:
+            return respuesta_saturado('crear_cuenta.html')
+
+        with get_db_connection() as db:
             # Create the user
             try:
                 usuario_id = db.crear_usuario(
                     nombre=nombre,
                     apellido=apellido,  # Make sure this is included
                     email=email,
-                    password=password
+                    password_hash=password_hash
                 )
 
                 if usuario_id:
@@ -92,18 +454,29 @@ def iniciar_sesion():
         email = request.form.get('email')
         password = request.form.get('password')
 
-        with get_db_connection() as db:
-            usuario = db.verificar_usuario(email, password)
-            
-            if usuario:
-                session['user_id'] = usuario['id']
-                session['nombre'] = usuario['nombre']
-                session['email'] = usuario['email']
-                flash(f'¡Bienvenido de nuevo, {usuario["nombre"]}!', 'success')
-                return redirect(url_for('perfil'))
-            else:
-                flash('Correo o contraseña incorrectos', 'error')
-                return redirect(url_for('iniciar_sesion'))
+        with get_db_connection(solo_lectura=True) as db:
+            usuario = db.obtener_credenciales(email)
+
+        valida = False
+        if usuario:
+            try:
+                valida, nuevo_hash = obtener_servicio_contrasenas().verificar(usuario['password'], password)
+            except ServicioSaturado:
+                return respuesta_saturado('inicio_sesion.html')
+            if nuevo_hash:
+                # El hash usaba otro costo: reemplazarlo ahora que se conoce la contraseña
+                with get_db_connection() as db:
+                    db.actualizar_password(usuario['id_usuario'], nuevo_hash)
+
+        if valida:
+            session['user_id'] = usuario['id_usuario']
+            session['nombre'] = usuario['nombre']
+            session['email'] = usuario['email']
+            flash(f'¡Bienvenido de nuevo, {usuario["nombre"]}!', 'success')
+            return redirect(url_for('perfil'))
+        else:
+            flash('Correo o contraseña incorrectos', 'error')
+            return redirect(url_for('iniciar_sesion'))
 
     return render_template('inicio_sesion.html')
 
@@ -124,94 +497,272 @@ def cerrar_sesion():
     session.clear()
     return redirect(url_for('index'))
 
-# Crear tablas si no existen al iniciar la aplicación
-with app.app_context():
-    if not os.path.exists(DB_NAME):
-        with get_db_connection() as db:
-            db.crear_todas_las_tablas()
-            # Crear un usuario de prueba
-            db.crear_usuario(
-                nombre="Admin",
-                apellido="Sistema",
-                email="admin@example.com",
-                password="admin123"
-            )
+# Crear tablas si no existen y aplicar las migraciones pendientes al iniciar la aplicación.
+# No se hace al importar el módulo (las pruebas y los benchmarks importan `app` y
+# después apuntan DATABASE a otra base): lo ejecutan `python app.py` y
+# `flask --app app inicializar-bd`.
+app.config['DB_MIGRAR_AL_INICIAR'] = os.environ.get('DB_MIGRAR_AL_INICIAR', '1') != '0'
+
+def inicializar_base_datos(migrar=True):
+    """
+    Crea la base configurada en app.config['DATABASE'] si no existe (con un
+    usuario de prueba) o, si ya existe y `migrar` es True, aplica las migraciones pendientes.
+    """
+    ruta = app.config['DATABASE']
+    with app.app_context():
+        if not os.path.exists(ruta):
+            with get_db_connection() as db:
+                db.crear_todas_las_tablas()
+                # Crear un usuario de prueba
+                db.crear_usuario(
+                    nombre="Admin",
+                    apellido="Sistema",
+                    email="admin@example.com",
+                    password="admin123"
+                )
+        elif migrar:
+            # Bases existentes: actualizar el esquema en el lugar
+            with get_db_connection() as db:
+                db.aplicar_migraciones()
+
+@app.cli.command('inicializar-bd')
+def comando_inicializar_bd():
+    """Crea la base o aplica las migraciones pendientes."""
+    inicializar_base_datos()
 
 @app.route('/recetas')
 def ver_recetas():
     busqueda = request.args.get('buscar', '')
-    etiqueta = request.args.get('etiqueta', '')
+    ingrediente = request.args.get('ingrediente', '')
+    filtros = parametros_filtro()
+    cursor = request.args.get('cursor') or None
     
-    with get_db_connection() as db:
+    with get_db_connection(solo_lectura=True) as db:
         etiquetas = db.obtener_todas_etiquetas()
-        recetas = db.obtener_recetas(busqueda=busqueda, etiqueta=etiqueta)
+        restricciones = db.obtener_restricciones()
+        etiqueta, filtro, expresion = aplicar_filtros(db, filtros)
+        try:
+            pagina = db.obtener_recetas_pagina(busqueda=busqueda, etiqueta=etiqueta,
+                                               limite=RECETAS_POR_PAGINA, cursor=cursor,
+                                               ingrediente=ingrediente, facetas=True, filtro=filtro,
+                                               clave_filtro=expresion)
+        except ValueError:
+            # Cursor inválido o de otro listado: volver a la primera página
+            cursor = None
+            pagina = db.obtener_recetas_pagina(busqueda=busqueda, etiqueta=etiqueta,
+                                               limite=RECETAS_POR_PAGINA, ingrediente=ingrediente,
+                                               facetas=True, filtro=filtro,
+                                               clave_filtro=expresion)
     
     return render_template('recetas.html', 
-                         recetas=recetas, 
+                         recetas=pagina['recetas'], 
                          etiquetas=etiquetas,
+                         restricciones=restricciones,
                          busqueda_actual=busqueda,
-                         etiqueta_actual=etiqueta)   
+                         etiqueta_actual=etiqueta,
+                         ingrediente_actual=ingrediente,
+                         filtros=filtros,
+                         filtros_combinados=filtro is not None,
+                         chips_filtros=chips_filtros(busqueda, ingrediente, filtros),
+                         facetas=pagina['facetas'],
+                         enlaces_facetas=enlaces_facetas(busqueda, ingrediente, filtros, pagina['facetas']),
+                         es_primera_pagina=cursor is None,
+                         siguiente_cursor=pagina['siguiente_cursor'])   
+
+@app.route('/api/recetas')
+def api_recetas():
+    busqueda = request.args.get('buscar', '')
+    ingrediente = request.args.get('ingrediente', '')
+    filtros = parametros_filtro()
+    cursor = request.args.get('cursor') or None
+    facetas = request.args.get('facetas') == '1'
+    try:
+        limite = int(request.args.get('limite', RECETAS_POR_PAGINA))
+        if not 1 <= limite <= MAX_RECETAS_POR_PAGINA:
+            raise ValueError("Límite fuera de rango")
+    except ValueError:
+        return jsonify({'error': f'El límite debe estar entre 1 y {MAX_RECETAS_POR_PAGINA}'}), 400
+
+    def generar():
+        etiqueta, filtro, expresion = aplicar_filtros(db, filtros)
+        try:
+            pagina = db.obtener_recetas_pagina(busqueda=busqueda, etiqueta=etiqueta,
+                                               limite=limite, cursor=cursor, ingrediente=ingrediente,
+                                               facetas=facetas, filtro=filtro,
+                                               clave_filtro=expresion)
+        except ValueError:
+            respuesta = jsonify({'error': 'Cursor inválido'})
+            respuesta.status_code = 400
+            return respuesta
+
+        for receta in pagina['recetas']:
+            for campo in ('titulo_resaltado', 'fragmento'):
+                if campo in receta:
+                    receta[campo] = str(resaltar(receta[campo]))
+
+        siguiente_url = None
+        if pagina['siguiente_cursor']:
+            siguiente_url = url_for('api_recetas', buscar=busqueda or None,
+                                    ingrediente=ingrediente or None, limite=limite,
+                                    cursor=pagina['siguiente_cursor'], **filtros)
+        respuesta = {
+            'recetas': pagina['recetas'],
+            'siguiente_cursor': pagina['siguiente_cursor'],
+            'siguiente_url': siguiente_url
+        }
+        if facetas:
+            respuesta['facetas'] = pagina['facetas']
+        return jsonify(respuesta)
+
+    # Las versiones se leen antes que nada: si el cliente tiene la página, 304.
+    # Si cambian mientras se arma, el ETag queda viejo y el próximo pedido no coincide.
+    with get_db_connection(solo_lectura=True) as db:
+        versiones = db.obtener_versiones_cache(VERSIONES_LISTADO)
+        return respuesta_condicional(sorted(versiones['versiones'].items()),
+                                     versiones['modificado'], generar)
+
+@app.route('/api/despensa')
+def api_despensa():
+    # ?ingrediente=huevo&ingrediente=papa o ?ingrediente=huevo,papa
+    despensa = [nombre.strip() for valor in request.args.getlist('ingrediente')
+                for nombre in valor.split(',') if nombre.strip()]
+    if not despensa:
+        return jsonify({'error': 'Indica al menos un ingrediente'}), 400
+    try:
+        limite = int(request.args.get('limite', RECETAS_POR_PAGINA))
+        if not 1 <= limite <= MAX_RECETAS_POR_PAGINA:
+            raise ValueError("Límite fuera de rango")
+    except ValueError:
+        return jsonify({'error': f'El límite debe estar entre 1 y {MAX_RECETAS_POR_PAGINA}'}), 400
+    try:
+        max_faltantes = request.args.get('faltantes')
+        max_faltantes = int(max_faltantes) if max_faltantes else None
+        if max_faltantes is not None and max_faltantes < 0:
+            raise ValueError("Faltantes negativos")
+    except ValueError:
+        return jsonify({'error': 'faltantes debe ser un entero mayor o igual a 0'}), 400
+
+    indice = obtener_indice_despensa()
+    with get_db_connection(solo_lectura=True) as db:
+        indice.actualizar(db)
+        resultado = indice.buscar(despensa, limite=limite, max_faltantes=max_faltantes)
+        puntajes = {id_receta: (disponibles, total)
+                    for id_receta, disponibles, total in resultado['resultados']}
+        recetas = db.obtener_recetas_por_ids(list(puntajes))
+        ingredientes = db.obtener_ingredientes_recetas([r['id_receta'] for r in recetas])
+
+    en_despensa = set(resultado['ingredientes'].values())
+    for receta in recetas:
+        disponibles, total = puntajes[receta['id_receta']]
+        receta['cobertura'] = round(disponibles / total, 4)
+        receta['ingredientes_disponibles'] = disponibles
+        receta['ingredientes_totales'] = total
+        receta['faltan'] = [i['nombre'] for i in ingredientes[receta['id_receta']]
+                            if i['id_ingrediente'] not in en_despensa]
+    return jsonify({
+        'recetas': recetas,
+        'total': resultado['total'],
+        'desconocidos': resultado['desconocidos']
+    })
 
 @app.route('/receta/<int:id_receta>')
 def ver_receta(id_receta):
-    with get_db_connection() as db:
+    with get_db_connection(solo_lectura=True) as db:
         # Obtener receta actual
         receta = db.obtener_receta_por_id(id_receta)
         if not receta:
             flash('Receta no encontrada', 'error')
             return redirect(url_for('ver_recetas'))
             
-        # Obtener comentarios
-        comentarios = db.obtener_comentarios_receta(id_receta)
+        # Primera página de comentarios; el resto se pide a /api/receta/<id>/comentarios
+        pagina_comentarios = db.obtener_comentarios_receta(id_receta, limite=COMENTARIOS_POR_PAGINA)
         
-        # Obtener estadísticas de votos
-        estadisticas = db.obtener_estadisticas_votos(id_receta)
+        # Estadísticas de votos: contadores que ya vienen con la receta
+        estadisticas = {'likes': receta['likes'], 'dislikes': receta['dislikes']}
         
         # Obtener voto del usuario actual
         voto_usuario = 0
         if 'user_id' in session:
             voto_usuario = db.obtener_voto_usuario(id_receta, session['user_id'])
         
-        # Obtener recetas relacionadas (mismas etiquetas)
-        recetas_relacionadas = []
-        if receta.get('etiquetas'):
-            etiqueta_ids = [e['id_etiqueta'] for e in receta['etiquetas']]
-            if etiqueta_ids:
-                placeholders = ','.join(['?'] * len(etiqueta_ids))
-                query = f"""
-                    SELECT DISTINCT r.*, u.nombre as autor 
-                    FROM recetas r
-                    JOIN usuario u ON r.id_usuario = u.id_usuario
-                    JOIN receta_etiqueta re ON r.id_receta = re.id_receta
-                    WHERE r.id_receta != ? AND re.id_etiqueta IN ({placeholders})
-                    LIMIT 3
-                """
-                params = [id_receta] + etiqueta_ids
-                db.cursor.execute(query, params)
-                recetas_relacionadas = [dict(row) for row in db.cursor.fetchall()]
-        
-        # Si no hay suficientes recetas relacionadas, completar con las más recientes
-        if len(recetas_relacionadas) < 3:
-            query = """
-                SELECT r.*, u.nombre as autor 
-                FROM recetas r
-                JOIN usuario u ON r.id_usuario = u.id_usuario
-                WHERE r.id_receta != ?
-                ORDER BY r.fecha_creacion DESC
-                LIMIT ?
-            """
-            limit = 3 - len(recetas_relacionadas)
-            db.cursor.execute(query, (id_receta, limit))
-            additional_recipes = [dict(row) for row in db.cursor.fetchall()]
-            recetas_relacionadas.extend(additional_recipes)
+        # Recetas relacionadas: una consulta al índice precalculado por etiquetas
+        recetas_relacionadas = db.obtener_recetas_relacionadas(id_receta)
     
     return render_template('ver_receta.html',
                          receta=receta,
-                         comentarios=comentarios,
+                         comentarios=pagina_comentarios['comentarios'],
+                         siguiente_cursor_comentarios=pagina_comentarios['siguiente_cursor'],
                          estadisticas=estadisticas,
                          voto_usuario=voto_usuario,
                          recetas_relacionadas=recetas_relacionadas)
 
+@app.route('/api/receta/<int:id_receta>')
+def api_receta(id_receta):
+    def generar():
+        receta = db.obtener_receta_por_id(id_receta)
+        if receta is None:
+            respuesta = jsonify({'error': 'Receta no encontrada'})
+            respuesta.status_code = 404
+            return respuesta
+        receta['ingredientes_indexados'] = db.obtener_ingredientes_receta(id_receta)
+        return jsonify(receta)
+
+    with get_db_connection(solo_lectura=True) as db:
+        fila = db.obtener_version_receta(id_receta)
+        if fila is None:
+            return jsonify({'error': 'Receta no encontrada'}), 404
+        versiones = db.obtener_versiones_cache(VERSIONES_DETALLE)
+        modificado = max(filter(None, (fila['modificado'], versiones['modificado'])), default=None)
+        return respuesta_condicional((id_receta, fila['version'], sorted(versiones['versiones'].items())),
+                                     modificado, generar)
+
+@app.route('/api/receta/<int:id_receta>/votos')
+def api_votos(id_receta):
+    # Los contadores son la respuesta entera: alcanza con la fila de la receta
+    with get_db_connection(solo_lectura=True) as db:
+        fila = db.obtener_version_receta(id_receta)
+    if fila is None:
+        return jsonify({'error': 'Receta no encontrada'}), 404
+    return respuesta_condicional(
+        (id_receta, fila['likes'], fila['dislikes']), fila['modificado'],
+        lambda: jsonify({'likes': fila['likes'], 'dislikes': fila['dislikes']})
+    )
+
+@app.route('/api/etiquetas')
+def api_etiquetas():
+    with get_db_connection(solo_lectura=True) as db:
+        versiones = db.obtener_versiones_cache(('etiquetas',))
+        return respuesta_condicional(
+            sorted(versiones['versiones'].items()), versiones['modificado'],
+            lambda: jsonify({'etiquetas': db.obtener_todas_etiquetas()})
+        )
+
+@app.route('/api/receta/<int:id_receta>/comentarios')
+def api_comentarios(id_receta):
+    cursor = request.args.get('cursor') or None
+    try:
+        limite = int(request.args.get('limite', COMENTARIOS_POR_PAGINA))
+        if not 1 <= limite <= MAX_COMENTARIOS_POR_PAGINA:
+            raise ValueError("Límite fuera de rango")
+    except ValueError:
+        return jsonify({'error': f'El límite debe estar entre 1 y {MAX_COMENTARIOS_POR_PAGINA}'}), 400
+
+    with get_db_connection(solo_lectura=True) as db:
+        try:
+            pagina = db.obtener_comentarios_receta(id_receta, limite=limite, cursor=cursor)
+        except ValueError:
+            return jsonify({'error': 'Cursor inválido'}), 400
+
+    siguiente_url = None
+    if pagina['siguiente_cursor']:
+        siguiente_url = url_for('api_comentarios', id_receta=id_receta, limite=limite,
+                                cursor=pagina['siguiente_cursor'])
+    return jsonify({
+        'comentarios': pagina['comentarios'],
+        'siguiente_cursor': pagina['siguiente_cursor'],
+        'siguiente_url': siguiente_url
+    })
+
 @app.route('/receta/<int:id_receta>/comentar', methods=['POST'])
 @login_required
 def comentar_receta(id_receta):
@@ -237,33 +788,120 @@ def votar_receta(id_receta):
         return jsonify({'error': 'No autorizado'}), 401
     
     try:
-        tipo_voto = int(request.json.get('tipo_voto', 0))
-        if tipo_voto not in [1, -1]:
+        tipo_voto = int((request.get_json(silent=True) or {}).get('tipo_voto', 0))
+        if tipo_voto not in [1, 0, -1]:
             raise ValueError("Tipo de voto no válido")
     except (ValueError, TypeError):
         return jsonify({'error': 'Tipo de voto no válido'}), 400
     
-    with get_db_connection() as db:
-        # Si el usuario ya votó de la misma manera, quitamos el voto
-        voto_actual = db.obtener_voto_usuario(id_receta, session['user_id'])
-        if voto_actual == tipo_voto:
-            tipo_voto = 0  # Para eliminar el voto
-        
-        db.votar_receta(
-            id_receta=id_receta,
-            id_usuario=session['user_id'],
-            tipo_voto=tipo_voto
-        )
-        estadisticas = db.obtener_estadisticas_votos(id_receta)
+    # Un único upsert: si el usuario repite el mismo voto, se quita; 0 lo quita siempre
+    try:
+        if app.config['VOTOS_DIFERIDOS']:
+            resultado = obtener_escritor_votos().votar(
+                id_receta, session['user_id'], tipo_voto, alternar=True
+            )
+        else:
+            with get_db_connection() as db:
+                resultado = db.votar_receta(
+                    id_receta=id_receta,
+                    id_usuario=session['user_id'],
+                    tipo_voto=tipo_voto,
+                    alternar=True
+                )
+    except sqlite3.IntegrityError:
+        return jsonify({'error': 'Receta no encontrada'}), 404
+    except EscritorSaturado:
+        return jsonify({'error': 'Hay muchos votos en este momento, inténtalo de nuevo'}), 503, {'Retry-After': '1'}
     
     return jsonify({
         'success': True,
-        'likes': estadisticas['likes'],
-        'dislikes': estadisticas['dislikes'],
-        'mi_voto': tipo_voto if tipo_voto != 0 else 0
+        'likes': resultado['likes'],
+        'dislikes': resultado['dislikes'],
+        'mi_voto': resultado['mi_voto']
     })
 
 
+@app.route('/api/estado/pool')
+def estado_pool():
+    return jsonify({
+        'lectura': obtener_pool(solo_lectura=True).estadisticas(),
+        'escritura': obtener_pool().estadisticas()
+    })
+
+
+@app.route('/api/estado/contrasenas')
+def estado_contrasenas():
+    return jsonify(obtener_servicio_contrasenas().estadisticas())
+
+
+@app.route('/api/estado/cache')
+def estado_cache():
+    return jsonify({
+        'datos': cache_datos.estadisticas(),
+        'etiquetas': catalogo_etiquetas.estadisticas(),
+        'facetas': facetas_etiquetas.estadisticas(),
+        'despensa': obtener_indice_despensa().estadisticas(),
+        'filtros': obtener_indice_filtros().estadisticas()
+    })
+
+
+def _pools_actuales():
+    with _pools_lock:
+        return [(solo_lectura, pool) for (nombre_bd, solo_lectura), pool in _pools.items()
+                if nombre_bd == app.config['DATABASE']]
+
+def medidores_app():
+    """Estado de los pools, las cachés y el servicio de contraseñas para /metrics"""
+    valores = []
+    for solo_lectura, pool in _pools_actuales():
+        estado = pool.estadisticas()
+        etiqueta = ('pool', 'lectura' if solo_lectura else 'escritura')
+        valores += [
+            ('recetas_db_conexiones', (etiqueta, ('estado', 'abiertas')), estado['abiertas']),
+            ('recetas_db_conexiones', (etiqueta, ('estado', 'en_uso')), estado['en_uso']),
+        ]
+    for nombre, cache in (('datos', cache_datos), ('etiquetas', catalogo_etiquetas),
+                          ('facetas', facetas_etiquetas)):
+        valores.append(('recetas_cache_entradas', (('cache', nombre),), cache.estadisticas()['entradas']))
+    if _servicio_contrasenas is not None:
+        valores.append(('recetas_contrasenas_pendientes', (), _servicio_contrasenas.estadisticas()['pendientes']))
+    return valores
+
+def contadores_app():
+    """Totales de los pools, las cachés y el servicio de contraseñas, exportados como contadores"""
+    valores = []
+    for solo_lectura, pool in _pools_actuales():
+        estado = pool.estadisticas()
+        etiqueta = ('pool', 'lectura' if solo_lectura else 'escritura')
+        valores += [
+            ('recetas_db_esperas_total', (etiqueta,), estado['esperas']),
+            ('recetas_db_espera_segundos_total', (etiqueta,), estado['tiempo_espera_total']),
+            ('recetas_db_agotados_total', (etiqueta,), estado['agotados']),
+        ]
+    for nombre, cache in (('datos', cache_datos), ('etiquetas', catalogo_etiquetas),
+                          ('facetas', facetas_etiquetas)):
+        estado = cache.estadisticas()
+        etiqueta = (('cache', nombre),)
+        valores += [
+            ('recetas_cache_aciertos_total', etiqueta, estado['aciertos']),
+            ('recetas_cache_fallos_total', etiqueta, estado['fallos']),
+        ]
+    if _servicio_contrasenas is not None:
+        estado = _servicio_contrasenas.estadisticas()
+        valores += [
+            ('recetas_contrasenas_rechazados_total', (), estado['rechazados']),
+            ('recetas_contrasenas_vencidos_total', (), estado['vencidos']),
+        ]
+    return valores
+
+metricas.registrar_medidor(medidores_app)
+metricas.registrar_contador(contadores_app)
+
+@app.route('/metrics')
+def exportar_metricas():
+    return metricas.exportar(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
 @app.route('/crear-receta', methods=['GET', 'POST'])
 @login_required
 def crear_receta():
@@ -276,6 +914,7 @@ def crear_receta():
         tiempo_preparacion = request.form.get('tiempo_preparacion')
         porciones = request.form.get('porciones')
         etiquetas = request.form.getlist('etiquetas')
+        restricciones = request.form.getlist('restricciones')
         
         # Validate required fields
         if not all([titulo, descripcion, ingredientes, instrucciones, tiempo_preparacion, porciones]):
@@ -308,8 +947,17 @@ def crear_receta():
                             INSERT INTO receta_etiqueta (id_receta, id_etiqueta)
                             VALUES (?, ?)
                         """, (receta_id, etiqueta_id))
+                for restriccion_id in restricciones:
+                    db.cursor.execute("""
+                        INSERT OR IGNORE INTO receta_has_restriccion (id_receta, id_restriccion)
+                        VALUES (?, ?)
+                    """, (receta_id, restriccion_id))
                 
+                # Sumar la receta al índice de relacionadas en la misma transacción
+                db.actualizar_recetas_relacionadas(receta_id)
+                db.actualizar_ingredientes_receta(receta_id, ingredientes)
                 db.conexion.commit()
+                cache_datos.invalidar(clave_cache('landing'))
                 flash('¡Receta creada exitosamente!', 'success')
                 return redirect(url_for('ver_receta', id_receta=receta_id))
                 
@@ -319,10 +967,14 @@ def crear_receta():
             return redirect(url_for('crear_receta'))
     
     # If it's a GET request, show the form
-    with get_db_connection() as db:
+    with get_db_connection(solo_lectura=True) as db:
         etiquetas = db.obtener_todas_etiquetas()
+        restricciones = db.obtener_restricciones()
     
-    return render_template('crear_receta.html', etiquetas=etiquetas)
+    return render_template('crear_receta.html', etiquetas=etiquetas, restricciones=restricciones)
 
 if __name__ == '__main__':
+    inicializar_base_datos(migrar=app.config['DB_MIGRAR_AL_INICIAR'])
+    if app.config['ESTATICOS_HUELLAS']:
+        recursos_estaticos.preparar(construir_antes=True)
     app.run(debug=True)
\ No newline at end of file
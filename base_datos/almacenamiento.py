@@ -0,0 +1,94 @@
+import os
+import sqlite3
+from urllib.request import pathname2url
+
+from base_datos.instrumentacion import ConexionInstrumentada
+
+# Perfil de almacenamiento por defecto: WAL permite que los lectores sigan
+# trabajando mientras un único escritor confirma transacciones.
+PERFIL_POR_DEFECTO = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,          # milisegundos
+    'mmap_size': 256 * 1024 * 1024,  # bytes
+    'cache_size': -16000,          # negativo = KiB (16 MB por conexión)
+    'temp_store': 'MEMORY',
+}
+
+# Perfil equivalente al comportamiento original (diario de rollback)
+PERFIL_CLASICO = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'busy_timeout': 5000,
+    'mmap_size': 0,
+    'cache_size': -2000,
+    'temp_store': 'DEFAULT',
+}
+
+_VARIABLES_ENTORNO = {
+    'journal_mode': ('DB_JOURNAL_MODE', str),
+    'synchronous': ('DB_SYNCHRONOUS', str),
+    'busy_timeout': ('DB_BUSY_TIMEOUT', int),
+    'mmap_size': ('DB_MMAP_SIZE', int),
+    'cache_size': ('DB_CACHE_SIZE', int),
+    'temp_store': ('DB_TEMP_STORE', str),
+}
+
+
+def perfil_desde_entorno(base=None):
+    """
+    Construye un perfil de almacenamiento a partir de las variables de entorno.
+
+    Args:
+        base (dict): Perfil de partida (por defecto PERFIL_POR_DEFECTO)
+
+    Returns:
+        dict: Perfil con los valores sobrescritos por el entorno
+    """
+    perfil = dict(base or PERFIL_POR_DEFECTO)
+    for clave, (variable, tipo) in _VARIABLES_ENTORNO.items():
+        if variable in os.environ:
+            perfil[clave] = tipo(os.environ[variable])
+    return perfil
+
+
+def conectar(nombre_bd, perfil=None, solo_lectura=False, check_same_thread=True, instrumentar=False):
+    """
+    Abre una conexión física configurada con el perfil indicado.
+
+    Las conexiones de solo lectura se abren con `mode=ro` y `query_only`, de modo
+    que nunca toman el lock de escritura. El modo de diario sólo lo fija el
+    escritor, ya que queda persistido en el archivo. Con `instrumentar` la
+    conexión mide sus consultas (ver base_datos.instrumentacion).
+
+    Returns:
+        sqlite3.Connection: Conexión con row_factory y claves foráneas activas
+    """
+    perfil = perfil or PERFIL_POR_DEFECTO
+    timeout = perfil.get('busy_timeout', 5000) / 1000
+    fabrica = ConexionInstrumentada if instrumentar else sqlite3.Connection
+    if solo_lectura:
+        uri = f"file:{pathname2url(os.path.abspath(nombre_bd))}?mode=ro"
+        conexion = sqlite3.connect(uri, uri=True, timeout=timeout,
+                                   check_same_thread=check_same_thread, factory=fabrica)
+    else:
+        conexion = sqlite3.connect(nombre_bd, timeout=timeout,
+                                   check_same_thread=check_same_thread, factory=fabrica)
+    conexion.row_factory = sqlite3.Row
+    aplicar_perfil(conexion, perfil, solo_lectura=solo_lectura)
+    return conexion
+
+
+def aplicar_perfil(conexion, perfil, solo_lectura=False):
+    """Aplica los PRAGMA del perfil a una conexión recién abierta."""
+    if not solo_lectura and perfil.get('journal_mode'):
+        conexion.execute(f"PRAGMA journal_mode = {perfil['journal_mode']}")
+    for pragma in ('synchronous', 'busy_timeout', 'mmap_size', 'cache_size', 'temp_store'):
+        if perfil.get(pragma) is not None:
+            conexion.execute(f"PRAGMA {pragma} = {perfil[pragma]}")
+    conexion.execute("PRAGMA foreign_keys = ON")
+    # Sin esto, INSERT OR REPLACE no dispara los triggers de borrado (contadores de votos)
+    conexion.execute("PRAGMA recursive_triggers = ON")
+    if solo_lectura:
+        conexion.execute("PRAGMA query_only = ON")
+    conexion.commit()
@@ -0,0 +1,67 @@
+import re
+
+from markupsafe import Markup, escape
+
+# Marcadores usados por highlight()/snippet(); se convierten en <mark> recién
+# después de escapar el texto, así el contenido de la receta nunca se interpreta como HTML.
+INICIO_RESALTADO = '\x02'
+FIN_RESALTADO = '\x03'
+
+# Pesos de bm25 por columna: titulo, descripcion, ingredientes, instrucciones
+PESOS_BM25 = (10.0, 2.0, 1.0, 0.5)
+
+SQL_INDICE_BUSQUEDA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS recetas_fts USING fts5(
+        titulo, descripcion, ingredientes, instrucciones,
+        content='recetas',
+        content_rowid='id_receta',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recetas_fts_insertar AFTER INSERT ON recetas BEGIN
+        INSERT INTO recetas_fts (rowid, titulo, descripcion, ingredientes, instrucciones)
+        VALUES (new.id_receta, new.titulo, new.descripcion, new.ingredientes, new.instrucciones);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recetas_fts_eliminar AFTER DELETE ON recetas BEGIN
+        INSERT INTO recetas_fts (recetas_fts, rowid, titulo, descripcion, ingredientes, instrucciones)
+        VALUES ('delete', old.id_receta, old.titulo, old.descripcion, old.ingredientes, old.instrucciones);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recetas_fts_actualizar
+    AFTER UPDATE OF titulo, descripcion, ingredientes, instrucciones ON recetas BEGIN
+        INSERT INTO recetas_fts (recetas_fts, rowid, titulo, descripcion, ingredientes, instrucciones)
+        VALUES ('delete', old.id_receta, old.titulo, old.descripcion, old.ingredientes, old.instrucciones);
+        INSERT INTO recetas_fts (rowid, titulo, descripcion, ingredientes, instrucciones)
+        VALUES (new.id_receta, new.titulo, new.descripcion, new.ingredientes, new.instrucciones);
+    END
+    """,
+]
+
+
+def construir_consulta_fts(texto):
+    """
+    Convierte el texto ingresado por el usuario en una consulta FTS5 segura.
+
+    Cada palabra se busca como prefijo ("pollo"*) y todas deben aparecer.
+
+    Returns:
+        str or None: Expresión MATCH o None si el texto no tiene palabras
+    """
+    palabras = re.findall(r'\w+', texto or '')
+    if not palabras:
+        return None
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def resaltar(texto):
+    """Filtro de Jinja: escapa el texto y marca con <mark> los términos encontrados."""
+    if not texto:
+        return ''
+    html = str(escape(texto))
+    return Markup(html.replace(INICIO_RESALTADO, '<mark>').replace(FIN_RESALTADO, '</mark>'))
@@ -0,0 +1,227 @@
+"""
+Caché en memoria de datos de lectura frecuente, invalidada por versión.
+
+Cada entrada guarda la versión de los datos con la que se calculó. La versión
+vive en la tabla `versiones_cache` y la incrementan triggers dentro de la misma
+transacción que modifica los datos, así que cualquier proceso (otro worker, el
+script de ejemplos, una importación) invalida la caché de todos los demás. El
+TTL acota además cuánto puede vivir una entrada ante cambios que no pasan por
+los triggers.
+"""
+import threading
+import time
+
+# Tabla de versiones y triggers que la incrementan. Las actualizaciones de los
+# contadores de votos (likes/dislikes) no invalidan: el listado no los muestra.
+SQL_VERSIONES_CACHE = [
+    """
+    CREATE TABLE IF NOT EXISTS versiones_cache (
+        clave TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """,
+    "INSERT OR IGNORE INTO versiones_cache (clave, version) VALUES ('recetas', 0)",
+    """
+    CREATE TRIGGER IF NOT EXISTS versiones_cache_recetas_insertar AFTER INSERT ON recetas BEGIN
+        UPDATE versiones_cache SET version = version + 1 WHERE clave = 'recetas';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS versiones_cache_recetas_eliminar AFTER DELETE ON recetas BEGIN
+        UPDATE versiones_cache SET version = version + 1 WHERE clave = 'recetas';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS versiones_cache_recetas_actualizar
+    AFTER UPDATE OF titulo, descripcion, ingredientes, instrucciones, tiempo_preparacion,
+                    porciones, imagen_url, id_usuario, fecha_creacion, activo ON recetas BEGIN
+        UPDATE versiones_cache SET version = version + 1 WHERE clave = 'recetas';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS versiones_cache_etiquetas_insertar AFTER INSERT ON receta_etiqueta BEGIN
+        UPDATE versiones_cache SET version = version + 1 WHERE clave = 'recetas';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS versiones_cache_etiquetas_eliminar AFTER DELETE ON receta_etiqueta BEGIN
+        UPDATE versiones_cache SET version = version + 1 WHERE clave = 'recetas';
+    END
+    """,
+]
+
+# Catálogo de etiquetas: cambia al crear/renombrar etiquetas y al (des)etiquetar
+# recetas, porque el catálogo incluye la cantidad de recetas por etiqueta.
+SQL_VERSIONES_ETIQUETAS = [
+    "INSERT OR IGNORE INTO versiones_cache (clave, version) VALUES ('etiquetas', 0)",
+    """
+    CREATE TRIGGER IF NOT EXISTS versiones_cache_catalogo_insertar AFTER INSERT ON etiquetas BEGIN
+        UPDATE versiones_cache SET version = version + 1 WHERE clave = 'etiquetas';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS versiones_cache_catalogo_eliminar AFTER DELETE ON etiquetas BEGIN
+        UPDATE versiones_cache SET version = version + 1 WHERE clave = 'etiquetas';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS versiones_cache_catalogo_actualizar AFTER UPDATE ON etiquetas BEGIN
+        UPDATE versiones_cache SET version = version + 1 WHERE clave = 'etiquetas';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS versiones_cache_catalogo_asignar AFTER INSERT ON receta_etiqueta BEGIN
+        UPDATE versiones_cache SET version = version + 1 WHERE clave = 'etiquetas';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS versiones_cache_catalogo_quitar AFTER DELETE ON receta_etiqueta BEGIN
+        UPDATE versiones_cache SET version = version + 1 WHERE clave = 'etiquetas';
+    END
+    """,
+]
+
+# Índice de ingredientes: cambia sólo al reconstruirlo entero (las altas de
+# recetas ya incrementan la versión 'recetas')
+SQL_VERSION_INGREDIENTES = [
+    "INSERT OR IGNORE INTO versiones_cache (clave, version) VALUES ('ingredientes', 0)",
+]
+
+# Restricciones alimentarias: cambian al crear/renombrar restricciones y al
+# asignarlas o quitarlas a recetas
+SQL_VERSIONES_RESTRICCIONES = [
+    "INSERT OR IGNORE INTO versiones_cache (clave, version) VALUES ('restricciones', 0)",
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS versiones_cache_{tabla}_{nombre} AFTER {evento} ON {tabla} BEGIN
+        UPDATE versiones_cache SET version = version + 1 WHERE clave = 'restricciones';
+    END
+    """
+    for tabla in ('restriccion', 'receta_has_restriccion')
+    for nombre, evento in (('insertar', 'INSERT'), ('eliminar', 'DELETE'), ('actualizar', 'UPDATE'))
+]
+
+
+# GET condicional: cada receta lleva su propia versión, que incrementan los
+# cambios de la fila, de sus votos y de sus etiquetas (también al renombrar una),
+# y cada clave de versiones_cache guarda el momento de su último cambio, para
+# validar respuestas sin volver a leerlas. Los votos tienen además su clave
+# global porque el listado muestra los contadores. Las columnas se agregan antes
+# con `agregar_columna` (ver migraciones.py).
+SQL_VERSIONES_CONDICIONALES = [
+    "INSERT OR IGNORE INTO versiones_cache (clave, version) VALUES ('votos', 0)",
+    "UPDATE versiones_cache SET actualizado = CURRENT_TIMESTAMP WHERE actualizado IS NULL",
+    """
+    CREATE TRIGGER IF NOT EXISTS versiones_cache_actualizado AFTER UPDATE OF version ON versiones_cache BEGIN
+        UPDATE versiones_cache SET actualizado = CURRENT_TIMESTAMP WHERE clave = new.clave;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recetas_version_actualizar
+    AFTER UPDATE OF titulo, descripcion, ingredientes, instrucciones, tiempo_preparacion,
+                    porciones, imagen_url, id_usuario, fecha_creacion, activo ON recetas BEGIN
+        UPDATE recetas SET version = version + 1, fecha_modificacion = CURRENT_TIMESTAMP
+        WHERE id_receta = new.id_receta;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recetas_version_votos AFTER UPDATE OF likes, dislikes ON recetas BEGIN
+        UPDATE recetas SET version = version + 1, fecha_modificacion = CURRENT_TIMESTAMP
+        WHERE id_receta = new.id_receta;
+        UPDATE versiones_cache SET version = version + 1 WHERE clave = 'votos';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recetas_version_etiquetar AFTER INSERT ON receta_etiqueta BEGIN
+        UPDATE recetas SET version = version + 1, fecha_modificacion = CURRENT_TIMESTAMP
+        WHERE id_receta = new.id_receta;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recetas_version_desetiquetar AFTER DELETE ON receta_etiqueta BEGIN
+        UPDATE recetas SET version = version + 1, fecha_modificacion = CURRENT_TIMESTAMP
+        WHERE id_receta = old.id_receta;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recetas_version_renombrar_etiqueta AFTER UPDATE OF nombre ON etiquetas BEGIN
+        UPDATE recetas SET version = version + 1, fecha_modificacion = CURRENT_TIMESTAMP
+        WHERE id_receta IN (SELECT id_receta FROM receta_etiqueta WHERE id_etiqueta = new.id_etiqueta);
+    END
+    """,
+]
+
+
+class CacheVersionada:
+    """Caché clave -> valor con TTL y validación por versión de los datos."""
+
+    def __init__(self, ttl=60.0, reloj=time.monotonic, max_entradas=None):
+        """
+        Args:
+            ttl (float): Segundos que vive una entrada; 0 desactiva la caché
+            reloj (callable): Fuente de tiempo (inyectable para pruebas)
+            max_entradas (int): Tope de entradas (se descarta la más vieja); None sin tope
+        """
+        self.ttl = ttl
+        self.reloj = reloj
+        self.max_entradas = max_entradas
+        self._entradas = {}
+        self._lock = threading.Lock()
+
+        # Estadísticas
+        self._aciertos = 0
+        self._fallos = 0
+        self._invalidaciones = 0
+
+    def obtener(self, clave, version, calcular):
+        """
+        Devuelve el valor cacheado si sigue vigente para `version`; si no, lo
+        calcula con `calcular()` y lo guarda.
+        """
+        ahora = self.reloj()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada and entrada[0] == version and ahora < entrada[1]:
+                self._aciertos += 1
+                return entrada[2]
+            self._fallos += 1
+
+        valor = calcular()
+        if self.ttl > 0:
+            with self._lock:
+                self._entradas.pop(clave, None)
+                if self.max_entradas and len(self._entradas) >= self.max_entradas:
+                    # Los diccionarios conservan el orden de inserción
+                    del self._entradas[next(iter(self._entradas))]
+                self._entradas[clave] = (version, ahora + self.ttl, valor)
+        return valor
+
+    def invalidar(self, clave=None):
+        """Descarta una entrada (o todas, si no se indica clave)."""
+        with self._lock:
+            if clave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(clave, None)
+            self._invalidaciones += 1
+
+    def estadisticas(self):
+        """Devuelve un diccionario con los contadores de la caché."""
+        with self._lock:
+            consultas = self._aciertos + self._fallos
+            return {
+                'ttl': self.ttl,
+                'entradas': len(self._entradas),
+                'aciertos': self._aciertos,
+                'fallos': self._fallos,
+                'invalidaciones': self._invalidaciones,
+                'tasa_aciertos': round(self._aciertos / consultas, 4) if consultas else 0.0,
+            }
+
+
+# Caché del catálogo de etiquetas compartida por todas las conexiones del proceso
+catalogo_etiquetas = CacheVersionada(ttl=300.0)
+
+# Conteos de etiquetas por filtro del listado (búsqueda e ingrediente). Hay una
+# entrada por filtro distinto, así que se acota la cantidad.
+facetas_etiquetas = CacheVersionada(ttl=300.0, max_entradas=1024)
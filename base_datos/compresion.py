@@ -0,0 +1,166 @@
+"""
+Compresión de respuestas dinámicas (HTML y JSON) como middleware WSGI.
+
+`MiddlewareCompresion` envuelve la aplicación y comprime el cuerpo con zstd o
+gzip según el encabezado Accept-Encoding del pedido. zstd se usa sólo si está
+disponible (`compression.zstd` desde Python 3.14, o el paquete `zstandard`) y el
+cliente lo acepta con al menos la misma preferencia que gzip.
+
+No se comprimen:
+  - respuestas cuyo tipo no está en `tipos` (por defecto HTML y JSON)
+  - respuestas que ya traen Content-Encoding (p. ej. los estáticos precomprimidos)
+  - respuestas sin Content-Length (streaming): habría que acumularlas enteras
+  - respuestas más chicas que `minimo` bytes, donde gzip ahorra poco o nada
+  - estados sin cuerpo (204, 304), rangos (206) y Cache-Control: no-transform
+
+Toda respuesta que podría comprimirse lleva `Vary: Accept-Encoding`, se
+comprima o no en este pedido, para que un caché intermedio no entregue la
+versión comprimida a quien no la pidió. Un ETag fuerte pasa a ser débil al
+comprimir: los bytes ya no son los mismos, pero la representación sí, y los
+GET condicionales (comparación débil) siguen respondiendo 304.
+"""
+import gzip
+
+from werkzeug.http import parse_accept_header
+
+try:
+    from compression import zstd as _zstd
+
+    def _comprimir_zstd(datos, nivel):
+        return _zstd.compress(datos, level=nivel)
+except ImportError:
+    try:
+        import zstandard as _zstd
+
+        def _comprimir_zstd(datos, nivel):
+            return _zstd.ZstdCompressor(level=nivel).compress(datos)
+    except ImportError:
+        _zstd = None
+        _comprimir_zstd = None
+
+TIPOS_COMPRIMIBLES = frozenset({'text/html', 'application/json'})
+ESTADOS_SIN_COMPRESION = ('204', '206', '304')
+
+
+def codificaciones_disponibles():
+    """Codificaciones que este proceso puede producir, en orden de preferencia."""
+    return ['zstd', 'gzip'] if _comprimir_zstd else ['gzip']
+
+
+def comprimir(datos, codificacion, nivel):
+    """Comprime `datos` con 'gzip' o 'zstd' al nivel indicado."""
+    if codificacion == 'zstd':
+        return _comprimir_zstd(datos, nivel)
+    # mtime=0: el mismo cuerpo produce siempre los mismos bytes
+    return gzip.compress(datos, compresslevel=nivel, mtime=0)
+
+
+def elegir_codificacion(accept_encoding, disponibles=None):
+    """
+    Elige la codificación para un encabezado Accept-Encoding.
+
+    Returns:
+        str o None: La codificación aceptada con mayor preferencia (a igual
+            preferencia, la primera de `disponibles`), o None
+    """
+    if not accept_encoding:
+        return None
+    aceptadas = parse_accept_header(accept_encoding)
+    mejor, mejor_calidad = None, 0
+    for codificacion in disponibles or codificaciones_disponibles():
+        calidad = aceptadas.quality(codificacion)
+        if calidad > mejor_calidad:
+            mejor, mejor_calidad = codificacion, calidad
+    return mejor
+
+
+def _encabezado(encabezados, nombre):
+    nombre = nombre.lower()
+    for clave, valor in encabezados:
+        if clave.lower() == nombre:
+            return valor
+    return None
+
+
+def _agregar_vary(encabezados):
+    """Agrega Accept-Encoding a Vary (o lo crea) sin duplicarlo."""
+    for i, (clave, valor) in enumerate(encabezados):
+        if clave.lower() == 'vary':
+            valores = [v.strip().lower() for v in valor.split(',')]
+            if 'accept-encoding' not in valores and '*' not in valores:
+                encabezados[i] = (clave, f"{valor}, Accept-Encoding")
+            return
+    encabezados.append(('Vary', 'Accept-Encoding'))
+
+
+class MiddlewareCompresion:
+    """Middleware WSGI que comprime las respuestas HTML y JSON."""
+
+    def __init__(self, aplicacion, minimo=1024, nivel_gzip=6, nivel_zstd=3, tipos=TIPOS_COMPRIMIBLES):
+        """
+        Args:
+            aplicacion: Aplicación WSGI a envolver (p. ej. app.wsgi_app)
+            minimo (int): Tamaño mínimo del cuerpo en bytes para comprimir
+            nivel_gzip (int): Nivel de gzip (1 a 9)
+            nivel_zstd (int): Nivel de zstd (1 a 22)
+            tipos (set): Tipos MIME (sin parámetros) que se comprimen
+        """
+        self.aplicacion = aplicacion
+        self.minimo = minimo
+        self.niveles = {'gzip': nivel_gzip, 'zstd': nivel_zstd}
+        self.tipos = frozenset(tipos)
+        self.disponibles = codificaciones_disponibles()
+
+    def _comprimible(self, estado, encabezados):
+        """Decide, mirando sólo los encabezados, si la respuesta puede comprimirse."""
+        if estado.split(' ', 1)[0] in ESTADOS_SIN_COMPRESION:
+            return False
+        tipo = (_encabezado(encabezados, 'Content-Type') or '').split(';', 1)[0].strip().lower()
+        if tipo not in self.tipos or _encabezado(encabezados, 'Content-Encoding'):
+            return False
+        if 'no-transform' in (_encabezado(encabezados, 'Cache-Control') or '').lower():
+            return False
+        longitud = _encabezado(encabezados, 'Content-Length')
+        return longitud is not None and int(longitud) >= self.minimo
+
+    def __call__(self, environ, start_response):
+        codificacion = elegir_codificacion(environ.get('HTTP_ACCEPT_ENCODING'), self.disponibles)
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            codificacion = None
+        pendiente = {}
+
+        def iniciar(estado, encabezados, exc_info=None):
+            if exc_info is None and self._comprimible(estado, encabezados):
+                encabezados = list(encabezados)
+                _agregar_vary(encabezados)
+                if codificacion is not None:
+                    # Se demora start_response hasta tener el cuerpo comprimido
+                    pendiente.update(estado=estado, encabezados=encabezados)
+                    return pendiente.setdefault('partes', []).append
+            return start_response(estado, encabezados, exc_info)
+
+        cuerpo = self.aplicacion(environ, iniciar)
+        if not pendiente:
+            return cuerpo
+
+        try:
+            datos = b''.join(pendiente['partes']) + b''.join(cuerpo)
+        finally:
+            if hasattr(cuerpo, 'close'):
+                cuerpo.close()
+        comprimido = comprimir(datos, codificacion, self.niveles[codificacion])
+        if len(comprimido) >= len(datos):
+            start_response(pendiente['estado'], pendiente['encabezados'])
+            return [datos]
+
+        encabezados = []
+        for clave, valor in pendiente['encabezados']:
+            nombre = clave.lower()
+            if nombre == 'content-length':
+                continue
+            if nombre == 'etag' and not valor.startswith('W/'):
+                valor = 'W/' + valor
+            encabezados.append((clave, valor))
+        encabezados += [('Content-Encoding', codificacion), ('Content-Length', str(len(comprimido)))]
+        start_response(pendiente['estado'], encabezados)
+        return [comprimido]
@@ -1,19 +1,37 @@
+import json
 import sqlite3
+from contextlib import contextmanager
+from base_datos.almacenamiento import conectar
+from base_datos.busqueda import (
+    SQL_INDICE_BUSQUEDA, PESOS_BM25, INICIO_RESALTADO, FIN_RESALTADO, construir_consulta_fts
+)
+from base_datos.cache import catalogo_etiquetas, facetas_etiquetas
+from base_datos.ingredientes import indexar_recetas, normalizar_nombre, reconstruir_ingredientes
+from base_datos.paginacion import codificar_cursor, decodificar_cursor
+from base_datos.migraciones import aplicar_migraciones
+from base_datos.relacionadas import actualizar_relacionadas, reconstruir_relacionadas
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
+# Filtros (Bitmap de IDs) de hasta este tamaño se pasan como lista al IN; los
+# más grandes se prueban fila por fila mientras se recorre el índice por fecha,
+# que encuentra una página sin leer ni ordenar todo el conjunto
+MAX_IDS_FILTRO_EN_LISTA = 2000
+
 class Conexion:
     """
     Clase para manejar la conexión a la base de datos y operaciones relacionadas.
     """
-    def __init__(self, nombre_bd="base_datos/recetas.db"):
-        self.conexion = sqlite3.connect(nombre_bd)
-        # Configurar el row_factory para devolver diccionarios
-        self.conexion.row_factory = sqlite3.Row
+    def __init__(self, nombre_bd="base_datos/recetas.db", pool=None, perfil=None):
+        self.pool = pool
+        self.nombre_bd = pool.nombre_bd if pool is not None else nombre_bd
+        if pool is not None:
+            # Tomar prestada una conexión ya configurada del pool
+            self.conexion = pool.obtener()
+        else:
+            # Conexión propia con row_factory, claves foráneas y el perfil de PRAGMA
+            self.conexion = conectar(nombre_bd, perfil)
         self.cursor = self.conexion.cursor()
-        # Habilitar el soporte de claves foráneas
-        self.cursor.execute("PRAGMA foreign_keys = ON")
-        self.conexion.commit()
 
     # -------------------------------------------------------------
     # TABLAS BASE SIN FOREIGN KEYS
@@ -86,39 +104,6 @@ class Conexion:
         """)
         self.conexion.commit()
     
-    def obtener_comentarios_receta(self, id_receta):
-        """Obtiene todos los comentarios de una receta"""
-        self.cursor.execute("""
-            SELECT c.*, u.nombre as nombre_usuario
-            FROM comentarios c
-            JOIN usuario u ON c.id_usuario = u.id_usuario
-            WHERE c.id_receta = ?
-            ORDER BY c.fecha_creacion DESC
-        """, (id_receta,))
-        
-        comentarios = []
-        for row in self.cursor.fetchall():
-            comentario = dict(row)
-            # Convert the string date to a datetime object
-            if 'fecha_creacion' in comentario and isinstance(comentario['fecha_creacion'], str):
-                from datetime import datetime
-                try:
-                    # Try ISO format first (for example recipes)
-                    if 'T' in comentario['fecha_creacion']:
-                        comentario['fecha_creacion'] = datetime.fromisoformat(comentario['fecha_creacion'])
-                    else:
-                        # Try SQLite datetime format
-                        comentario['fecha_creacion'] = datetime.strptime(
-                            comentario['fecha_creacion'], 
-                            '%Y-%m-%d %H:%M:%S'
-                        )
-                except (ValueError, TypeError) as e:
-                    print(f"Error al convertir fecha: {e}")
-                    # If conversion fails, keep the original string
-                    pass
-            comentarios.append(comentario)
-        return comentarios
-    
     def crear_tabla_empleado(self):
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS empleado (
@@ -257,80 +242,56 @@ class Conexion:
         """)
         self.conexion.commit()
     
-    def crear_todas_las_tablas(self):
-        """Crea todas las tablas en el orden correcto para evitar conflictos de claves foráneas"""
-        try:
-            # 1. Primero las tablas sin dependencias
-            self.crear_tabla_permisos()
-            self.crear_tabla_restriccion()
-            self.crear_tabla_categoria()
-            self.crear_tabla_usuario()
-            self.crear_tabla_empleado()
-            self.crear_tabla_ingrediente()
-            self.crear_tabla_etiquetas()  # Asegurarse de que las etiquetas se creen antes de recetas
-            
-            # 2. Luego las tablas que dependen de las anteriores
-            self.crear_tabla_receta()  # Depende de usuario
-            self.crear_tabla_comentarios()  # Depende de usuario y receta
-            self.crear_tabla_votos()  # Depende de usuario y receta
-            self.crear_tabla_lista_favoritos()  # Depende de usuario
-            
-            # 3. Tablas de relación many-to-many
-            self.crear_tabla_receta_etiqueta()  # Depende de recetas y etiquetas
-            self.crear_tabla_receta_has_ingrediente()
-            self.crear_tabla_receta_has_restriccion()
-            self.crear_tabla_receta_has_categoria()
-            self.crear_tabla_empleado_has_permisos()
-            self.crear_tabla_usuario_has_permisos()
-            self.crear_tabla_lista_favoritos_has_receta()
-            
-            print("Todas las tablas fueron creadas correctamente.")
-            return True
-            
-        except Exception as e:
-            print(f"Error al crear las tablas: {e}")
-            self.conexion.rollback()
-            return False
-    
     # -------------------------------------------------------------
     # CREAR TODAS LAS TABLAS EN ORDEN CORRECTO SIN CONFLICTOS
     # -------------------------------------------------------------
 
     def crear_todas_las_tablas(self):
-        """Crea todas las tablas en el orden correcto para evitar conflictos de claves foráneas"""
+        """
+        Crea el esquema base (si falta) y aplica las migraciones pendientes.
+
+        Es seguro llamarlo sobre una base existente: sólo agrega lo que falte.
+        """
         try:
-            # 1. Primero las tablas sin dependencias
-            self.crear_tabla_permisos()
-            self.crear_tabla_restriccion()
-            self.crear_tabla_categoria()
-            self.crear_tabla_usuario()
-            self.crear_tabla_empleado()
-            self.crear_tabla_ingrediente()
-        
-            # 2. Luego las tablas que dependen de las anteriores
-            self.crear_tabla_receta()  # Depende de usuario
-            self.crear_tabla_etiquetas()  # Nueva tabla para etiquetas
-            self.crear_tabla_receta_etiqueta()  # Tabla puente entre recetas y etiquetas
-            self.crear_tabla_comentarios()  # Depende de usuario y receta
-            self.crear_tabla_votos()  # Depende de usuario y receta
-            self.crear_tabla_lista_favoritos()  # Depende de usuario
-        
-            # 3. Finalmente las tablas de relación many-to-many
-            self.crear_tabla_receta_has_ingrediente()
-            self.crear_tabla_receta_has_restriccion()
-            self.crear_tabla_receta_has_categoria()
-            self.crear_tabla_empleado_has_permisos()
-            self.crear_tabla_usuario_has_permisos()
-            self.crear_tabla_lista_favoritos_has_receta()
-        
+            self.crear_esquema_base()
+            self.aplicar_migraciones()
             print("Todas las tablas fueron creadas correctamente.")
             return True
-        
         except Exception as e:
             print(f"Error al crear las tablas: {e}")
             self.conexion.rollback()
             return False
 
+    def aplicar_migraciones(self, hasta=None):
+        """Aplica las migraciones de esquema pendientes (ver base_datos.migraciones)."""
+        return aplicar_migraciones(self.conexion, hasta)
+
+    def crear_esquema_base(self):
+        """Crea las tablas base (versión 0 del esquema) en el orden correcto para evitar conflictos de claves foráneas"""
+        # 1. Primero las tablas sin dependencias
+        self.crear_tabla_permisos()
+        self.crear_tabla_restriccion()
+        self.crear_tabla_categoria()
+        self.crear_tabla_usuario()
+        self.crear_tabla_empleado()
+        self.crear_tabla_ingrediente()
+
+        # 2. Luego las tablas que dependen de las anteriores
+        self.crear_tabla_receta()  # Depende de usuario
+        self.crear_tabla_etiquetas()  # Nueva tabla para etiquetas
+        self.crear_tabla_receta_etiqueta()  # Tabla puente entre recetas y etiquetas
+        self.crear_tabla_comentarios()  # Depende de usuario y receta
+        self.crear_tabla_votos()  # Depende de usuario y receta
+        self.crear_tabla_lista_favoritos()  # Depende de usuario
+
+        # 3. Finalmente las tablas de relación many-to-many
+        self.crear_tabla_receta_has_ingrediente()
+        self.crear_tabla_receta_has_restriccion()
+        self.crear_tabla_receta_has_categoria()
+        self.crear_tabla_empleado_has_permisos()
+        self.crear_tabla_usuario_has_permisos()
+        self.crear_tabla_lista_favoritos_has_receta()
+
     def crear_tabla_etiquetas(self):
         """Crea la tabla de etiquetas para las recetas"""
         self.cursor.execute("""
@@ -369,11 +330,33 @@ class Conexion:
         """)
         self.conexion.commit()
     
+    def crear_indice_busqueda(self):
+        """
+        Crea el índice FTS5 de recetas y los triggers que lo mantienen sincronizado.
+
+        Si el índice no existía (base de datos anterior), se reconstruye con las
+        recetas ya cargadas.
+        """
+        self.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recetas_fts'"
+        )
+        existia = self.cursor.fetchone() is not None
+        for sentencia in SQL_INDICE_BUSQUEDA:
+            self.cursor.execute(sentencia)
+        if not existia:
+            self.reconstruir_indice_busqueda()
+        self.conexion.commit()
+
+    def reconstruir_indice_busqueda(self):
+        """Reconstruye el índice FTS5 completo a partir de la tabla recetas."""
+        self.cursor.execute("INSERT INTO recetas_fts (recetas_fts) VALUES ('rebuild')")
+        self.conexion.commit()
+    
     # ====================================================
     # MÉTODOS PARA MANEJO DE USUARIOS
     # ====================================================
 
-    def crear_usuario(self, nombre, apellido, email, password):
+    def crear_usuario(self, nombre, apellido, email, password=None, password_hash=None):
         """
         Crea un nuevo usuario en la base de datos.
         
@@ -382,21 +365,23 @@ class Conexion:
             apellido (str): Apellido del usuario
             email (str): Email del usuario (debe ser único)
             password (str): Contraseña en texto plano (se hasheará automáticamente)
+            password_hash (str): Hash ya calculado (por ejemplo, por ServicioContrasenas);
+                                 si se indica, `password` se ignora
             
         Returns:
             int or None: ID del usuario creado o None si hubo un error
         """
         try:
             print(f"Intentando crear usuario: {email}")  # Depuración
-            hashed_password = generate_password_hash(password)
-            print(f"Contraseña hasheada correctamente")  # Depuración
+            if password_hash is None:
+                password_hash = generate_password_hash(password)
             
             self.cursor.execute(
                 """
                 INSERT INTO usuario (nombre, apellido, email, password)
                 VALUES (?, ?, ?, ?)
                 """,
-                (nombre, apellido, email, hashed_password)
+                (nombre, apellido, email, password_hash)
             )
             self.conexion.commit()
             user_id = self.cursor.lastrowid
@@ -404,20 +389,7 @@ class Conexion:
             return user_id
         
         except sqlite3.IntegrityError as e:
-            print(f"Error de integridad al crear usuario: {e}")  # Depuración
-            if "UNIQUE constraint failed" in str(e):
-                print("El correo electrónico ya está registrado")
-            hashed_password = generate_password_hash(password)
-            self.cursor.execute(
-                """
-                INSERT INTO usuario (nombre, apellido, email, password)
-                VALUES (?, ?, ?, ?)
-                """,
-                (nombre, apellido, email, hashed_password)
-            )
-            self.conexion.commit()
-            return self.cursor.lastrowid
-        except sqlite3.IntegrityError as e:
+            self.conexion.rollback()
             if "UNIQUE constraint failed" in str(e):
                 print("Error: El correo electrónico ya está registrado")
             else:
@@ -427,6 +399,32 @@ class Conexion:
             print(f"Error inesperado al crear usuario: {e}")
             return None
 
+    def obtener_credenciales(self, email):
+        """
+        Obtiene los datos de un usuario activo junto con su hash de contraseña,
+        para verificarla fuera de la conexión (ver ServicioContrasenas).
+
+        Returns:
+            dict or None: {id_usuario, nombre, apellido, email, password}
+        """
+        self.cursor.execute(
+            """
+            SELECT id_usuario, nombre, apellido, email, password 
+            FROM usuario 
+            WHERE email = ? AND activo = 1
+            """,
+            (email,)
+        )
+        usuario = self.cursor.fetchone()
+        return dict(usuario) if usuario else None
+
+    def actualizar_password(self, id_usuario, password_hash):
+        """Reemplaza el hash de contraseña de un usuario (por ejemplo, tras cambiar el costo)."""
+        self.cursor.execute(
+            "UPDATE usuario SET password = ? WHERE id_usuario = ?", (password_hash, id_usuario)
+        )
+        self.conexion.commit()
+
     def verificar_usuario(self, email, password):
         """
         Verifica las credenciales de un usuario.
@@ -507,11 +505,15 @@ class Conexion:
             return False
 
     def cerrar_conexion(self):
-        """Cierra la conexión a la base de datos."""
+        """Cierra la conexión a la base de datos (o la devuelve al pool)."""
         try:
             if self.conexion:
                 self.cursor.close()
-                self.conexion.close()
+                if self.pool is not None:
+                    self.pool.devolver(self.conexion)
+                else:
+                    self.conexion.close()
+                self.conexion = None
         except Exception as e:
             print(f"Error al cerrar la conexión: {e}")
     
@@ -523,41 +525,273 @@ class Conexion:
         """Asegura que la conexión se cierre al salir del bloque 'with'."""
         self.cerrar_conexion()
 
-    def obtener_recetas(self, busqueda=None, etiqueta=None, limite=10, offset=0):
-        query = """
-            SELECT r.*, u.nombre as autor 
-        FROM recetas r
-        JOIN usuario u ON r.id_usuario = u.id_usuario
-        WHERE 1=1
+    def _consulta_recetas(self, busqueda=None, etiqueta=None, despues_de=None, ingrediente=None,
+                          filtro=None):
+        """
+        Arma la consulta del listado de recetas (sin LIMIT).
+
+        Sin búsqueda, el orden es (fecha_creacion, id_receta) descendente; con
+        búsqueda, (rango bm25, id_receta) ascendente. `despues_de` son los valores
+        de esa clave de la última fila ya vista (paginación por keyset).
+        `filtro` es un Bitmap con los IDs admitidos (ver `_filtro_registrado`).
+
+        Returns:
+            tuple: (query, params, tipo de orden)
         """
+        consulta_fts = construir_consulta_fts(busqueda)
         params = []
-        
-        if busqueda:
-            query += " AND (r.titulo LIKE ? OR r.descripcion LIKE ? OR r.ingredientes LIKE ?)"
-            params.extend([f'%{busqueda}%'] * 3)
+
+        if consulta_fts:
+            pesos = ', '.join(str(peso) for peso in PESOS_BM25)
+            rango = f"bm25(recetas_fts, {pesos})"
+            query = f"""
+                SELECT r.*, u.nombre as autor, {rango} as rango,
+                       highlight(recetas_fts, 0, ?, ?) as titulo_resaltado,
+                       snippet(recetas_fts, -1, ?, ?, '…', 16) as fragmento
+                FROM recetas_fts
+                JOIN recetas r ON r.id_receta = recetas_fts.rowid
+                JOIN usuario u ON r.id_usuario = u.id_usuario
+                WHERE recetas_fts MATCH ?
+            """
+            params.extend([INICIO_RESALTADO, FIN_RESALTADO] * 2)
+            params.append(consulta_fts)
+            tipo = 'rango'
+            if despues_de:
+                query += f" AND ({rango}, r.id_receta) > (?, ?)"
+                params.extend(despues_de)
+            orden = f" ORDER BY {rango}, r.id_receta"
+        else:
+            query = """
+                SELECT r.*, u.nombre as autor 
+                FROM recetas r
+                JOIN usuario u ON r.id_usuario = u.id_usuario
+                WHERE 1=1
+            """
+            tipo = 'fecha'
+            if despues_de:
+                query += " AND (r.fecha_creacion, r.id_receta) < (?, ?)"
+                params.extend(despues_de)
+            orden = " ORDER BY r.fecha_creacion DESC, r.id_receta DESC"
         
         if etiqueta:
+            # El nombre se resuelve con el catálogo en memoria; una etiqueta
+            # inexistente no coincide con ninguna receta
             query += """
                 AND r.id_receta IN (
                     SELECT re.id_receta 
                     FROM receta_etiqueta re
-                    JOIN etiquetas e ON re.id_etiqueta = e.id_etiqueta
-                    WHERE e.nombre = ?
+                    WHERE re.id_etiqueta = ?
                 )
             """
-            params.append(etiqueta)
-        
-        query += " ORDER BY r.fecha_creacion DESC LIMIT ? OFFSET ?"
-        params.extend([limite, offset])
-        
-        self.cursor.execute(query, params)
-        recetas = [dict(row) for row in self.cursor.fetchall()]
+            params.append(self.obtener_id_etiqueta(etiqueta))
+
+        if ingrediente:
+            # Join por el índice de ingredientes en lugar de LIKE sobre el texto
+            query += """
+                AND r.id_receta IN (
+                    SELECT ri.id_receta
+                    FROM ingrediente i
+                    JOIN receta_has_ingrediente ri ON ri.id_ingrediente = i.id_ingrediente
+                    WHERE i.nombre = ?
+                )
+            """
+            params.append(normalizar_nombre(ingrediente))
+
+        if filtro is not None:
+            if len(filtro) <= MAX_IDS_FILTRO_EN_LISTA:
+                query += " AND r.id_receta IN (SELECT value FROM json_each(?))"
+                params.append(json.dumps(list(filtro)))
+            else:
+                query += " AND receta_en_filtro(r.id_receta)"
         
-        # Agregar etiquetas a cada receta
-        for receta in recetas:
-            receta['etiquetas'] = self.obtener_etiquetas_receta(receta['id_receta'])
+        return query + orden, params, tipo
+
+    @contextmanager
+    def _filtro_registrado(self, filtro):
+        """Registra receta_en_filtro() en la conexión mientras se usa la consulta."""
+        if filtro is None or len(filtro) <= MAX_IDS_FILTRO_EN_LISTA:
+            yield
+            return
+        self.conexion.create_function('receta_en_filtro', 1, filtro.__contains__, deterministic=True)
+        try:
+            yield
+        finally:
+            self.conexion.create_function('receta_en_filtro', 1, None)
+
+    def obtener_recetas(self, busqueda=None, etiqueta=None, limite=10, offset=0, ingrediente=None,
+                        filtro=None):
+        """
+        Lista recetas, opcionalmente filtradas por texto, etiqueta e ingrediente.
+
+        La búsqueda por texto usa el índice FTS5: las recetas se ordenan por
+        relevancia (bm25, con más peso en el título) e incluyen `titulo_resaltado`
+        y `fragmento` con los términos marcados para el filtro `resaltar`.
+        `filtro` es un Bitmap de IDs (p. ej. de `IndiceFiltros.evaluar`) que
+        restringe además el listado. Para recorrer páginas profundas conviene
+        `obtener_recetas_pagina`.
+        """
+        query, params, _ = self._consulta_recetas(busqueda, etiqueta, ingrediente=ingrediente, filtro=filtro)
+        with self._filtro_registrado(filtro):
+            self.cursor.execute(query + " LIMIT ? OFFSET ?", params + [limite, offset])
+            recetas = [dict(row) for row in self.cursor.fetchall()]
         
-        return recetas
+        # Agregar etiquetas a todas las recetas de la página con una sola consulta
+        return self.agregar_etiquetas_a_recetas(recetas)
+
+    def obtener_recetas_pagina(self, busqueda=None, etiqueta=None, limite=10, cursor=None, ingrediente=None,
+                               facetas=False, filtro=None, clave_filtro=None):
+        """
+        Obtiene una página del listado de recetas usando paginación por keyset.
+
+        A diferencia de OFFSET, cada página continúa desde la clave de la última
+        fila, por lo que las páginas profundas cuestan lo mismo que la primera.
+
+        Args:
+            busqueda (str): Texto a buscar
+            etiqueta (str): Nombre de la etiqueta a filtrar
+            limite (int): Cantidad de recetas por página
+            cursor (str): Token devuelto como 'siguiente_cursor' en la página anterior
+            ingrediente (str): Ingrediente que deben tener las recetas (se normaliza)
+            facetas (bool): Agregar 'facetas' con los conteos por etiqueta (ver
+                obtener_facetas_etiquetas)
+            filtro (Bitmap): IDs admitidos (combinaciones de etiquetas y restricciones)
+            clave_filtro: Identifica al filtro en la caché de facetas (p. ej. su expresión)
+
+        Returns:
+            dict: {'recetas': [...], 'siguiente_cursor': str o None[, 'facetas': {...}]}
+
+        Raises:
+            ValueError: Si el cursor es inválido
+        """
+        tipo = 'rango' if construir_consulta_fts(busqueda) else 'fecha'
+        despues_de = decodificar_cursor(cursor, tipo, 2) if cursor else None
+        query, params, tipo = self._consulta_recetas(busqueda, etiqueta, despues_de, ingrediente, filtro)
+
+        # Pedir una fila de más para saber si existe una página siguiente
+        with self._filtro_registrado(filtro):
+            self.cursor.execute(query + " LIMIT ?", params + [limite + 1])
+            recetas = [dict(row) for row in self.cursor.fetchall()]
+
+        siguiente_cursor = None
+        if len(recetas) > limite:
+            recetas = recetas[:limite]
+            ultima = recetas[-1]
+            clave = ultima['rango'] if tipo == 'rango' else ultima['fecha_creacion']
+            siguiente_cursor = codificar_cursor(tipo, clave, ultima['id_receta'])
+
+        pagina = {
+            'recetas': self.agregar_etiquetas_a_recetas(recetas),
+            'siguiente_cursor': siguiente_cursor
+        }
+        if facetas:
+            pagina['facetas'] = self.obtener_facetas_etiquetas(busqueda, ingrediente, filtro, clave_filtro, etiqueta)
+        return pagina
+
+    def _consulta_ids_filtrados(self, busqueda=None, ingrediente=None, filtro=False, etiqueta=None):
+        """
+        Arma un SELECT de los IDs de las recetas que coinciden con la búsqueda,
+        el ingrediente y la etiqueta (el mismo criterio que `_consulta_recetas`).
+
+        Con `filtro` True la consulta termina con un parámetro más, que el
+        llamador completa con la lista JSON de IDs del Bitmap. Va siempre como
+        lista, sea del tamaño que sea: a diferencia del listado, que corta en la
+        primera página, aquí se recorre el conjunto entero, y llamar a
+        receta_en_filtro() por cada fila de la tabla cuesta más que armarla.
+
+        Returns:
+            tuple: (query, params), o (None, []) si no hay ningún filtro
+        """
+        # (SELECT de IDs, columna con que se le intersectan los siguientes); la
+        # lista del Bitmap va última porque su parámetro lo agrega el llamador
+        conjuntos, params = [], []
+        consulta_fts = construir_consulta_fts(busqueda)
+        if consulta_fts:
+            # '+rowid': que FTS5 no use los IN como restricción (busca el
+            # texto una vez por ID); se filtra sobre las coincidencias
+            conjuntos.append(("SELECT rowid AS id_receta FROM recetas_fts WHERE recetas_fts MATCH ?", '+rowid'))
+            params.append(consulta_fts)
+        if ingrediente:
+            conjuntos.append(("""
+                SELECT ri.id_receta
+                FROM ingrediente i
+                JOIN receta_has_ingrediente ri ON ri.id_ingrediente = i.id_ingrediente
+                WHERE i.nombre = ?
+            """, 'ri.id_receta'))
+            params.append(normalizar_nombre(ingrediente))
+        if etiqueta:
+            # Una etiqueta inexistente no coincide con ninguna receta
+            conjuntos.append(("SELECT re.id_receta FROM receta_etiqueta re WHERE re.id_etiqueta = ?",
+                              're.id_receta'))
+            params.append(self.obtener_id_etiqueta(etiqueta))
+        if filtro:
+            # El índice de filtros se pone al día antes de evaluar: sus IDs existen
+            conjuntos.append(("SELECT value AS id_receta FROM json_each(?)", 'value'))
+        if not conjuntos:
+            return None, []
+        (query, columna), *resto = conjuntos
+        for subconsulta, _ in resto:
+            query += f" AND {columna} IN ({subconsulta})"
+        return query, params
+
+    def obtener_facetas_etiquetas(self, busqueda=None, ingrediente=None, filtro=None, clave_filtro=None,
+                                  etiqueta=None):
+        """
+        Cuenta, para cada etiqueta, cuántas recetas del filtro actual la tienen.
+
+        Los conteos describen siempre las recetas que se están listando, con la
+        etiqueta elegida o con un `filtro` (Bitmap de las combinaciones de
+        etiquetas y restricciones): el de cada etiqueta es lo que daría sumarla
+        al filtro y 'total' es la cantidad listada. Todo sale de una única
+        consulta agregada sobre el conjunto filtrado (sin filtros, del
+        catálogo) y se guarda en caché hasta que cambien las recetas o las
+        etiquetas. La `clave_filtro` (la expresión) identifica al Bitmap en la
+        clave de la caché; sin ella, los conteos filtrados se calculan en cada
+        llamada.
+
+        Returns:
+            dict: {'total': int, 'etiquetas': [{id_etiqueta, nombre, recetas}]}
+                  sólo con las etiquetas presentes, de la más a la menos usada
+        """
+        query, params = self._consulta_ids_filtrados(busqueda, ingrediente, filtro is not None, etiqueta)
+
+        def calcular():
+            catalogo = self.obtener_catalogo_etiquetas()['etiquetas']
+            nombres = {e['id_etiqueta']: e['nombre'] for e in catalogo}
+            if query is None:
+                # Sin filtros los conteos son los del catálogo
+                self.cursor.execute("SELECT NULL, COUNT(*) FROM recetas")
+                filas = self.cursor.fetchall() + [(e['id_etiqueta'], e['recetas']) for e in catalogo
+                                                  if e['recetas']]
+            else:
+                self.cursor.execute(f"""
+                    WITH filtradas AS MATERIALIZED ({query})
+                    SELECT NULL, COUNT(*) FROM filtradas
+                    UNION ALL
+                    SELECT re.id_etiqueta, COUNT(*)
+                    FROM filtradas f
+                    JOIN receta_etiqueta re ON re.id_receta = f.id_receta
+                    GROUP BY re.id_etiqueta
+                """, params + ([json.dumps(list(filtro))] if filtro is not None else []))
+                filas = self.cursor.fetchall()
+            total, etiquetas = 0, []
+            for id_etiqueta, cantidad in filas:
+                if id_etiqueta is None:
+                    total = cantidad
+                elif id_etiqueta in nombres:
+                    etiquetas.append({'id_etiqueta': id_etiqueta, 'nombre': nombres[id_etiqueta],
+                                      'recetas': cantidad})
+            etiquetas.sort(key=lambda e: (-e['recetas'], e['nombre']))
+            return {'total': total, 'etiquetas': etiquetas}
+
+        if self.conexion.in_transaction or (filtro is not None and clave_filtro is None):
+            return calcular()
+        version = (self.obtener_version_cache('recetas'), self.obtener_version_cache('etiquetas'))
+        clave = (self.nombre_bd, query, tuple(params))
+        if filtro is not None:
+            # La expresión identifica al filtro; la lista de IDs sólo se arma si hay que calcular
+            version += (self.obtener_version_cache('restricciones'),)
+            clave += (clave_filtro,)
+        return facetas_etiquetas.obtener(clave, version, calcular)
 
     def obtener_receta_por_id(self, id_receta):
         """
@@ -570,8 +804,14 @@ class Conexion:
             dict or None: Diccionario con los datos de la receta o None si no se encuentra
         """
         try:
+            # La receta y sus etiquetas (agregadas como JSON) en una sola consulta
             self.cursor.execute("""
-                SELECT r.*, u.nombre || ' ' || u.apellido as autor 
+                SELECT r.*, u.nombre || ' ' || u.apellido as autor,
+                       (SELECT json_group_array(json_object('id_etiqueta', e.id_etiqueta,
+                                                            'nombre', e.nombre))
+                        FROM receta_etiqueta re
+                        JOIN etiquetas e ON e.id_etiqueta = re.id_etiqueta
+                        WHERE re.id_receta = r.id_receta) as etiquetas_json
                 FROM recetas r
                 JOIN usuario u ON r.id_usuario = u.id_usuario
                 WHERE r.id_receta = ?
@@ -584,8 +824,8 @@ class Conexion:
             # Convertir a diccionario
             receta_dict = dict(receta)
             
-            # Obtener etiquetas de la receta
-            receta_dict['etiquetas'] = self.obtener_etiquetas_receta(id_receta)
+            # Decodificar las etiquetas de la receta
+            receta_dict['etiquetas'] = json.loads(receta_dict.pop('etiquetas_json') or '[]')
             
             # Asegurar que los campos estén presentes
             receta_dict.setdefault('ingredientes', '')
@@ -609,8 +849,88 @@ class Conexion:
         """, (id_receta,))
         return [dict(row) for row in self.cursor.fetchall()]
 
+    def obtener_etiquetas_recetas(self, ids_receta):
+        """
+        Obtiene las etiquetas de varias recetas con una única consulta.
+
+        Args:
+            ids_receta (list): IDs de las recetas
+
+        Returns:
+            dict: {id_receta: [etiquetas]} con una lista (posiblemente vacía) por ID
+        """
+        etiquetas = {id_receta: [] for id_receta in ids_receta}
+        if not etiquetas:
+            return etiquetas
+        placeholders = ','.join(['?'] * len(etiquetas))
+        self.cursor.execute(f"""
+            SELECT re.id_receta, e.*
+            FROM receta_etiqueta re
+            JOIN etiquetas e ON e.id_etiqueta = re.id_etiqueta
+            WHERE re.id_receta IN ({placeholders})
+            ORDER BY re.id_receta, e.id_etiqueta
+        """, list(etiquetas))
+        for row in self.cursor.fetchall():
+            etiqueta = dict(row)
+            etiquetas[etiqueta.pop('id_receta')].append(etiqueta)
+        return etiquetas
+
+    def agregar_etiquetas_a_recetas(self, recetas):
+        """Completa la clave 'etiquetas' de cada receta usando el cargador por lotes."""
+        etiquetas = self.obtener_etiquetas_recetas([r['id_receta'] for r in recetas])
+        for receta in recetas:
+            receta['etiquetas'] = etiquetas[receta['id_receta']]
+        return recetas
+
     def obtener_todas_etiquetas(self):
-        self.cursor.execute("SELECT * FROM etiquetas")
+        return self.obtener_catalogo_etiquetas()['etiquetas']
+
+    def obtener_id_etiqueta(self, nombre):
+        """Devuelve el ID de la etiqueta con ese nombre, o None si no existe."""
+        return self.obtener_catalogo_etiquetas()['por_nombre'].get(nombre)
+
+    def obtener_catalogo_etiquetas(self):
+        """
+        Obtiene el catálogo de etiquetas desde la caché del proceso.
+
+        El catálogo se vuelve a leer sólo cuando cambia la versión 'etiquetas'
+        (triggers sobre etiquetas y receta_etiqueta). Dentro de una transacción
+        abierta se lee directamente, sin guardarlo, porque la versión que ve
+        esta conexión todavía puede deshacerse. El resultado es compartido: no
+        debe modificarse.
+
+        Returns:
+            dict: {'etiquetas': [{id_etiqueta, nombre, recetas}], 'por_nombre': {nombre: id}}
+        """
+        def calcular():
+            self.cursor.execute("""
+                SELECT e.id_etiqueta, e.nombre, COUNT(re.id_receta) as recetas
+                FROM etiquetas e
+                LEFT JOIN receta_etiqueta re ON re.id_etiqueta = e.id_etiqueta
+                GROUP BY e.id_etiqueta
+                ORDER BY e.id_etiqueta
+            """)
+            etiquetas = [dict(row) for row in self.cursor.fetchall()]
+            return {
+                'etiquetas': etiquetas,
+                'por_nombre': {e['nombre']: e['id_etiqueta'] for e in etiquetas}
+            }
+
+        if self.conexion.in_transaction:
+            return calcular()
+        return catalogo_etiquetas.obtener(
+            (self.nombre_bd, 'etiquetas'), self.obtener_version_cache('etiquetas'), calcular
+        )
+
+    def obtener_restricciones(self):
+        """Lista las restricciones alimentarias con la cantidad de recetas que las cumplen."""
+        self.cursor.execute("""
+            SELECT r.id_restriccion, r.nombre, COUNT(rr.id_receta) as recetas
+            FROM restriccion r
+            LEFT JOIN receta_has_restriccion rr ON rr.id_restriccion = r.id_restriccion
+            GROUP BY r.id_restriccion
+            ORDER BY r.nombre
+        """)
         return [dict(row) for row in self.cursor.fetchall()]
 
     def agregar_comentario(self, id_receta, id_usuario, contenido):
@@ -621,50 +941,158 @@ class Conexion:
         self.conexion.commit()
         return self.cursor.lastrowid
 
-    def obtener_comentarios_receta(self, id_receta):
-        self.cursor.execute("""
-            SELECT c.*, u.nombre, u.apellido 
+    def obtener_comentarios_receta(self, id_receta, limite=10, cursor=None):
+        """
+        Obtiene una página de comentarios de una receta, del más nuevo al más viejo.
+
+        Usa paginación por keyset sobre (fecha_creacion, id_comentario), que
+        recorre el índice idx_comentarios_receta. Las fechas se formatean en SQL:
+        `fecha` en ISO 8601 y `fecha_formateada` lista para mostrar.
+
+        Args:
+            id_receta (int): ID de la receta
+            limite (int): Cantidad de comentarios por página
+            cursor (str): Token devuelto como 'siguiente_cursor' en la página anterior
+
+        Returns:
+            dict: {'comentarios': [...], 'siguiente_cursor': str o None}
+
+        Raises:
+            ValueError: Si el cursor es inválido
+        """
+        query = """
+            SELECT c.id_comentario, c.id_usuario, c.descripcion as contenido,
+                   c.fecha_creacion,
+                   strftime('%Y-%m-%dT%H:%M:%S', c.fecha_creacion) as fecha,
+                   strftime('%d/%m/%Y %H:%M', c.fecha_creacion) as fecha_formateada,
+                   u.nombre, u.apellido
             FROM comentarios c
             JOIN usuario u ON c.id_usuario = u.id_usuario
             WHERE c.id_receta = ?
-            ORDER BY c.fecha_creacion DESC
-        """, (id_receta,))
-        return [dict(row) for row in self.cursor.fetchall()]
+        """
+        params = [id_receta]
+        if cursor:
+            query += " AND (c.fecha_creacion, c.id_comentario) < (?, ?)"
+            params.extend(decodificar_cursor(cursor, 'comentario', 2))
+        query += " ORDER BY c.fecha_creacion DESC, c.id_comentario DESC LIMIT ?"
+        self.cursor.execute(query, params + [limite + 1])
+        comentarios = [dict(row) for row in self.cursor.fetchall()]
 
-    def votar_receta(self, id_receta, id_usuario, tipo_voto):
-        # Verificar si ya existe un voto
-        self.cursor.execute("""
-            SELECT id FROM votos 
-            WHERE id_receta = ? AND id_usuario = ?
-        """, (id_receta, id_usuario))
-        
-        if self.cursor.fetchone():
-            # Actualizar voto existente
+        siguiente_cursor = None
+        if len(comentarios) > limite:
+            comentarios = comentarios[:limite]
+            ultimo = comentarios[-1]
+            siguiente_cursor = codificar_cursor('comentario', ultimo['fecha_creacion'], ultimo['id_comentario'])
+
+        # La clave de orden cruda sólo sirve para el cursor
+        for comentario in comentarios:
+            del comentario['fecha_creacion']
+        return {'comentarios': comentarios, 'siguiente_cursor': siguiente_cursor}
+
+    def aplicar_voto(self, id_receta, id_usuario, tipo_voto, alternar=False):
+        """
+        Registra un voto sin confirmar la transacción.
+
+        Un 1 o -1 se guarda con un único INSERT ... ON CONFLICT DO UPDATE; con
+        `alternar`, repetir el mismo voto lo quita (se borra la fila, como con
+        un 0). Un 0 elimina el voto. Los contadores de la receta los actualizan
+        los triggers de la tabla votos.
+
+        Returns:
+            dict: {'likes', 'dislikes', 'mi_voto'} después del voto
+        """
+        if tipo_voto == 0:
             self.cursor.execute("""
-                UPDATE votos 
-                SET tipo_voto = ?
-                WHERE id_receta = ? AND id_usuario = ?
-            """, (tipo_voto, id_receta, id_usuario))
+                DELETE FROM votos WHERE id_receta = ? AND id_usuario = ?
+            """, (id_receta, id_usuario))
+            mi_voto = 0
+        elif alternar and self.cursor.execute("""
+                DELETE FROM votos WHERE id_receta = ? AND id_usuario = ? AND tipo_voto = ?
+            """, (id_receta, id_usuario, tipo_voto)).rowcount:
+            mi_voto = 0
         else:
-            # Insertar nuevo voto
             self.cursor.execute("""
                 INSERT INTO votos (id_receta, id_usuario, tipo_voto)
                 VALUES (?, ?, ?)
+                ON CONFLICT (id_receta, id_usuario)
+                DO UPDATE SET tipo_voto = excluded.tipo_voto, fecha_creacion = CURRENT_TIMESTAMP
             """, (id_receta, id_usuario, tipo_voto))
-        
-        self.conexion.commit()
-        return self.obtener_estadisticas_votos(id_receta)
+            mi_voto = tipo_voto
+
+        resultado = self.obtener_estadisticas_votos(id_receta)
+        resultado['mi_voto'] = mi_voto
+        return resultado
+
+    def votar_receta(self, id_receta, id_usuario, tipo_voto, alternar=False):
+        """
+        Registra el voto de un usuario y confirma la transacción.
+
+        Args:
+            id_receta (int): ID de la receta
+            id_usuario (int): ID del usuario
+            tipo_voto (int): 1 (like), -1 (dislike) o 0 (quitar el voto)
+            alternar (bool): Si repetir el voto actual lo quita
+
+        Returns:
+            dict: {'likes', 'dislikes', 'mi_voto'} después del voto
+        """
+        try:
+            resultado = self.aplicar_voto(id_receta, id_usuario, tipo_voto, alternar)
+            self.conexion.commit()
+            return resultado
+        except Exception:
+            self.conexion.rollback()
+            raise
 
     def obtener_estadisticas_votos(self, id_receta):
+        """Lee los contadores de votos de la receta (mantenidos por triggers sobre votos)."""
         self.cursor.execute("""
-            SELECT 
-                SUM(CASE WHEN tipo_voto = 1 THEN 1 ELSE 0 END) as likes,
-                SUM(CASE WHEN tipo_voto = -1 THEN 1 ELSE 0 END) as dislikes
-            FROM votos
+            SELECT likes, dislikes
+            FROM recetas
             WHERE id_receta = ?
         """, (id_receta,))
         return dict(self.cursor.fetchone() or {'likes': 0, 'dislikes': 0})
 
+    def verificar_contadores_votos(self):
+        """
+        Compara los contadores de cada receta con los votos registrados.
+
+        Returns:
+            list: Diccionarios con las recetas cuyos contadores no coinciden
+        """
+        self.cursor.execute("""
+            SELECT r.id_receta, r.likes, r.dislikes,
+                   COALESCE(v.likes, 0) as likes_reales,
+                   COALESCE(v.dislikes, 0) as dislikes_reales
+            FROM recetas r
+            LEFT JOIN (
+                SELECT id_receta,
+                       SUM(tipo_voto = 1) as likes,
+                       SUM(tipo_voto = -1) as dislikes
+                FROM votos
+                GROUP BY id_receta
+            ) v ON v.id_receta = r.id_receta
+            WHERE r.likes != COALESCE(v.likes, 0) OR r.dislikes != COALESCE(v.dislikes, 0)
+        """)
+        return [dict(row) for row in self.cursor.fetchall()]
+
+    def reparar_contadores_votos(self):
+        """
+        Recalcula desde la tabla votos los contadores que no coinciden.
+
+        Returns:
+            int: Cantidad de recetas corregidas
+        """
+        inconsistentes = self.verificar_contadores_votos()
+        self.cursor.executemany("""
+            UPDATE recetas SET likes = ?, dislikes = ? WHERE id_receta = ?
+        """, [
+            (fila['likes_reales'], fila['dislikes_reales'], fila['id_receta'])
+            for fila in inconsistentes
+        ])
+        self.conexion.commit()
+        return len(inconsistentes)
+
     def obtener_voto_usuario(self, id_receta, id_usuario):
         
         self.cursor.execute("""
@@ -700,4 +1128,184 @@ class Conexion:
             ORDER BY r.fecha_creacion DESC
             LIMIT ?
         """, (limite,))
-        return [dict(row) for row in self.cursor.fetchall()]
\ No newline at end of file
+        recetas = [dict(row) for row in self.cursor.fetchall()]
+        return self.agregar_etiquetas_a_recetas(recetas)
+
+    def obtener_version_cache(self, clave='recetas'):
+        """Devuelve la versión actual de un conjunto de datos cacheado."""
+        self.cursor.execute("SELECT version FROM versiones_cache WHERE clave = ?", (clave,))
+        fila = self.cursor.fetchone()
+        return fila[0] if fila else 0
+
+    def obtener_versiones_cache(self, claves):
+        """
+        Lee de una vez las versiones de varios conjuntos de datos, para armar
+        validadores (ETag, Last-Modified) sin ejecutar las consultas pesadas.
+
+        Returns:
+            dict: {'versiones': {clave: version}, 'modificado': segundos epoch
+                   del último cambio de cualquiera de ellas, o None}
+        """
+        self.cursor.execute(f"""
+            SELECT clave, version, CAST(strftime('%s', actualizado) AS INTEGER)
+            FROM versiones_cache WHERE clave IN ({','.join('?' * len(claves))})
+        """, list(claves))
+        filas = self.cursor.fetchall()
+        fechas = [fila[2] for fila in filas if fila[2] is not None]
+        return {
+            'versiones': {clave: version for clave, version, _ in filas},
+            'modificado': max(fechas) if fechas else None
+        }
+
+    def obtener_version_receta(self, id_receta):
+        """
+        Lee la versión de una receta y sus contadores de votos por clave primaria.
+
+        Returns:
+            dict or None: {version, likes, dislikes, modificado (segundos epoch)}
+        """
+        self.cursor.execute("""
+            SELECT version, likes, dislikes,
+                   CAST(strftime('%s', COALESCE(fecha_modificacion, fecha_creacion)) AS INTEGER) as modificado
+            FROM recetas WHERE id_receta = ?
+        """, (id_receta,))
+        fila = self.cursor.fetchone()
+        return dict(fila) if fila else None
+
+    def invalidar_cache(self, clave='recetas'):
+        """
+        Incrementa la versión de un conjunto de datos, invalidando las cachés de
+        todos los procesos. Útil tras escrituras que no disparan los triggers.
+        """
+        self.cursor.execute(
+            "UPDATE versiones_cache SET version = version + 1 WHERE clave = ?", (clave,)
+        )
+        self.conexion.commit()
+
+    def obtener_recetas_relacionadas(self, id_receta, limite=3):
+        """
+        Obtiene las recetas más parecidas a una receta desde el índice precalculado.
+
+        Si la receta tiene menos relacionadas que `limite`, se completa con las
+        más recientes.
+
+        Returns:
+            list: Recetas relacionadas (con autor y etiquetas)
+        """
+        self.cursor.execute("""
+            SELECT r.*, u.nombre as autor
+            FROM recetas_relacionadas rr
+            JOIN recetas r ON r.id_receta = rr.id_relacionada
+            JOIN usuario u ON r.id_usuario = u.id_usuario
+            WHERE rr.id_receta = ?
+            ORDER BY rr.puntaje DESC, rr.id_relacionada DESC
+            LIMIT ?
+        """, (id_receta, limite))
+        recetas = [dict(row) for row in self.cursor.fetchall()]
+
+        if len(recetas) < limite:
+            excluidas = [id_receta] + [r['id_receta'] for r in recetas]
+            placeholders = ','.join(['?'] * len(excluidas))
+            self.cursor.execute(f"""
+                SELECT r.*, u.nombre as autor
+                FROM recetas r
+                JOIN usuario u ON r.id_usuario = u.id_usuario
+                WHERE r.id_receta NOT IN ({placeholders})
+                ORDER BY r.fecha_creacion DESC, r.id_receta DESC
+                LIMIT ?
+            """, excluidas + [limite - len(recetas)])
+            recetas.extend(dict(row) for row in self.cursor.fetchall())
+
+        return self.agregar_etiquetas_a_recetas(recetas)
+
+    def actualizar_recetas_relacionadas(self, id_receta):
+        """
+        Actualiza el índice de relacionadas para una receta nueva. No confirma:
+        se llama dentro de la misma transacción que inserta la receta.
+        """
+        actualizar_relacionadas(self.conexion, id_receta)
+
+    def reconstruir_recetas_relacionadas(self):
+        """
+        Recalcula el índice completo de recetas relacionadas.
+
+        Returns:
+            int: Cantidad de pares guardados
+        """
+        filas = reconstruir_relacionadas(self.conexion)
+        self.conexion.commit()
+        return filas
+
+    def obtener_ingredientes_receta(self, id_receta):
+        """Devuelve los ingredientes indexados de una receta, en el orden en que se escribieron."""
+        self.cursor.execute("""
+            SELECT i.nombre, ri.cantidad, ri.unidad, ri.texto
+            FROM receta_has_ingrediente ri
+            JOIN ingrediente i ON i.id_ingrediente = ri.id_ingrediente
+            WHERE ri.id_receta = ?
+            ORDER BY ri.orden
+        """, (id_receta,))
+        return [dict(row) for row in self.cursor.fetchall()]
+
+    def obtener_ingredientes_recetas(self, ids_receta):
+        """
+        Obtiene los ingredientes indexados de varias recetas con una única consulta.
+
+        Returns:
+            dict: {id_receta: [ingredientes]} con una lista (posiblemente vacía) por ID
+        """
+        ingredientes = {id_receta: [] for id_receta in ids_receta}
+        if not ingredientes:
+            return ingredientes
+        placeholders = ','.join(['?'] * len(ingredientes))
+        self.cursor.execute(f"""
+            SELECT ri.id_receta, i.id_ingrediente, i.nombre, ri.cantidad, ri.unidad, ri.texto
+            FROM receta_has_ingrediente ri
+            JOIN ingrediente i ON i.id_ingrediente = ri.id_ingrediente
+            WHERE ri.id_receta IN ({placeholders})
+            ORDER BY ri.id_receta, ri.orden
+        """, list(ingredientes))
+        for row in self.cursor.fetchall():
+            ingrediente = dict(row)
+            ingredientes[ingrediente.pop('id_receta')].append(ingrediente)
+        return ingredientes
+
+    def obtener_recetas_por_ids(self, ids_receta):
+        """
+        Obtiene varias recetas (con autor y etiquetas) en el orden de `ids_receta`.
+        Los IDs que ya no existen se omiten.
+        """
+        if not ids_receta:
+            return []
+        placeholders = ','.join(['?'] * len(ids_receta))
+        self.cursor.execute(f"""
+            SELECT r.*, u.nombre as autor
+            FROM recetas r
+            JOIN usuario u ON r.id_usuario = u.id_usuario
+            WHERE r.id_receta IN ({placeholders})
+        """, list(ids_receta))
+        por_id = {row['id_receta']: dict(row) for row in self.cursor.fetchall()}
+        recetas = [por_id[id_receta] for id_receta in ids_receta if id_receta in por_id]
+        return self.agregar_etiquetas_a_recetas(recetas)
+
+    def actualizar_ingredientes_receta(self, id_receta, ingredientes=None):
+        """
+        Indexa los ingredientes de una receta a partir de su texto. No confirma:
+        se llama dentro de la misma transacción que inserta la receta.
+        """
+        if ingredientes is None:
+            self.cursor.execute("SELECT ingredientes FROM recetas WHERE id_receta = ?", (id_receta,))
+            fila = self.cursor.fetchone()
+            ingredientes = fila[0] if fila else ''
+        return indexar_recetas(self.conexion, [(id_receta, ingredientes)])
+
+    def reconstruir_indice_ingredientes(self):
+        """
+        Vuelve a indexar los ingredientes de todas las recetas.
+
+        Returns:
+            int: Cantidad de ingredientes indexados
+        """
+        filas = reconstruir_ingredientes(self.conexion)
+        self.conexion.commit()
+        return filas
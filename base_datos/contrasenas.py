@@ -0,0 +1,185 @@
+"""
+Hash de contraseñas fuera del hilo del request.
+
+Los hashes de contraseña son caros a propósito (scrypt usa ~32 MB y decenas de
+milisegundos por cálculo). `ServicioContrasenas` los calcula en un pool de
+procesos acotado: una ráfaga de logins ocupa esos procesos en lugar de los
+hilos que atienden el resto de las rutas, y cuando hay demasiados pedidos en
+espera se rechazan de inmediato con `ServicioSaturado` (la app responde 503).
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import (
+    DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+)
+
+# Mismo costo que usa werkzeug por defecto (scrypt, N=2^15, r=8, p=1)
+METODO_POR_DEFECTO = 'scrypt:32768:8:1'
+
+
+class ServicioSaturado(Exception):
+    """Se lanza cuando la cola de hashes pendientes está llena o un resultado no llega a tiempo."""
+
+
+def normalizar_metodo(metodo):
+    """
+    Completa un método de hash de werkzeug con sus parámetros por defecto, tal
+    como queda escrito al comienzo del hash ('scrypt' -> 'scrypt:32768:8:1').
+    """
+    partes = metodo.split(':')
+    if partes[0] == 'scrypt':
+        partes += ['32768', '8', '1'][len(partes) - 1:]
+    elif partes[0] == 'pbkdf2':
+        partes += ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)][len(partes) - 1:]
+    return ':'.join(partes)
+
+
+def necesita_rehash(hash_guardado, metodo):
+    """Indica si un hash fue calculado con un método o costo distinto al actual."""
+    return hash_guardado.split('$', 1)[0] != normalizar_metodo(metodo)
+
+
+def hashear(password, metodo=METODO_POR_DEFECTO):
+    """Calcula el hash de una contraseña con el método indicado."""
+    return generate_password_hash(password, method=metodo)
+
+
+def verificar(hash_guardado, password, metodo=METODO_POR_DEFECTO):
+    """
+    Verifica una contraseña y, si es correcta pero el hash quedó con otro costo,
+    calcula el nuevo en el mismo viaje al proceso.
+
+    Returns:
+        tuple: (es_valida, nuevo_hash o None)
+    """
+    if not check_password_hash(hash_guardado, password):
+        return False, None
+    if necesita_rehash(hash_guardado, metodo):
+        return True, hashear(password, metodo)
+    return True, None
+
+
+class ServicioContrasenas:
+    """Pool de procesos acotado para calcular y verificar hashes de contraseña."""
+
+    def __init__(self, metodo=METODO_POR_DEFECTO, procesos=1, max_pendientes=8, timeout=10.0):
+        """
+        Args:
+            metodo (str): Método y costo de werkzeug (p. ej. 'scrypt:16384:8:1' o 'pbkdf2:sha256:600000')
+            procesos (int): Procesos del pool; 0 calcula en el hilo que llama
+            max_pendientes (int): Hashes en curso o en espera antes de rechazar pedidos
+            timeout (float): Segundos máximos de espera por un resultado; al vencer
+                se lanza ServicioSaturado, pero el cupo sigue ocupado hasta que el
+                proceso termina (o se cancela el pedido si todavía no empezó)
+        """
+        self.metodo = normalizar_metodo(metodo)
+        self.procesos = procesos
+        self.max_pendientes = max_pendientes
+        self.timeout = timeout
+
+        self._cupos = threading.BoundedSemaphore(max_pendientes)
+        self._lock = threading.Lock()
+        self._ejecutor = None
+
+        # Estadísticas
+        self._pendientes = 0
+        self._completados = 0
+        self._rechazados = 0
+        self._vencidos = 0
+        self._rehashes = 0
+        self._tiempo_total = 0.0
+
+    def hashear(self, password):
+        """Devuelve el hash de una contraseña con el costo configurado."""
+        return self._ejecutar(hashear, password, self.metodo)
+
+    def verificar(self, hash_guardado, password):
+        """
+        Verifica una contraseña contra su hash.
+
+        Returns:
+            tuple: (es_valida, nuevo_hash) donde nuevo_hash no es None si el hash
+            guardado usa otro costo y conviene reemplazarlo
+
+        Raises:
+            ServicioSaturado: Si hay demasiados pedidos en espera
+        """
+        valida, nuevo_hash = self._ejecutar(verificar, hash_guardado, password, self.metodo)
+        if nuevo_hash:
+            with self._lock:
+                self._rehashes += 1
+        return valida, nuevo_hash
+
+    def _ejecutar(self, funcion, *args):
+        if not self._cupos.acquire(blocking=False):
+            with self._lock:
+                self._rechazados += 1
+            raise ServicioSaturado("Demasiadas operaciones de contraseña en espera")
+        with self._lock:
+            self._pendientes += 1
+        inicio = time.perf_counter()
+
+        def liberar(_futuro=None):
+            with self._lock:
+                self._pendientes -= 1
+                self._completados += 1
+                self._tiempo_total += time.perf_counter() - inicio
+            self._cupos.release()
+
+        if self.procesos <= 0:
+            try:
+                return funcion(*args)
+            finally:
+                liberar()
+
+        try:
+            futuro = self._obtener_ejecutor().submit(funcion, *args)
+        except BaseException:
+            liberar()
+            raise
+        # El cupo se libera cuando el trabajo termina en el pool, no cuando el
+        # request deja de esperarlo: así max_pendientes acota lo que hay en el ejecutor
+        futuro.add_done_callback(liberar)
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TimeoutError:
+            # Si todavía no empezó, no ocupa más el pool
+            futuro.cancel()
+            with self._lock:
+                self._vencidos += 1
+            raise ServicioSaturado("La operación de contraseña no terminó a tiempo") from None
+
+    def _obtener_ejecutor(self):
+        with self._lock:
+            if self._ejecutor is None:
+                # 'spawn' evita heredar con fork los locks y hilos de la app
+                self._ejecutor = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._ejecutor
+
+    def cerrar(self):
+        """Termina los procesos del pool."""
+        with self._lock:
+            ejecutor, self._ejecutor = self._ejecutor, None
+        if ejecutor is not None:
+            ejecutor.shutdown()
+
+    def estadisticas(self):
+        """Devuelve un diccionario con el estado y los contadores del servicio."""
+        with self._lock:
+            return {
+                'metodo': self.metodo,
+                'procesos': self.procesos,
+                'max_pendientes': self.max_pendientes,
+                'pendientes': self._pendientes,
+                'completados': self._completados,
+                'rechazados': self._rechazados,
+                'vencidos': self._vencidos,
+                'rehashes': self._rehashes,
+                'tiempo_promedio': round(self._tiempo_total / self._completados, 6) if self._completados else 0.0,
+            }
@@ -0,0 +1,269 @@
+"""
+Búsqueda por despensa: "¿qué puedo cocinar con lo que tengo?".
+
+`IndiceDespensa` guarda en memoria, para cada ingrediente, el conjunto de
+recetas que lo usan como un bitset: un int de Python cuyo bit i es la receta en
+la posición i (las posiciones siguen el orden de los IDs). Para puntuar todas
+las recetas contra una despensa se suman los bitsets de sus ingredientes en un
+contador por planos de bits ("bit-sliced"): el plano k tiene prendido el bit i
+si la cantidad de ingredientes de la despensa que usa la receta i tiene el bit
+k en 1. Cada suma son unos pocos AND/XOR sobre enteros de N bits, así que se
+procesan 64 recetas por palabra de máquina sin recorrer receta por receta en
+Python.
+
+Las recetas se ordenan por cobertura (qué parte de sus ingredientes está en la
+despensa), luego por cantidad de ingredientes disponibles y luego de la más
+nueva a la más vieja. Cada combinación (disponibles, total) es una máscara de
+bits, así que las mejores N se extraen sin ordenar todo el catálogo.
+
+El índice se pone al día contra `versiones_cache`: si cambió la versión
+'recetas' se agregan sólo las recetas con ID mayor a la última indexada (el alta
+es incremental y la ve cualquier proceso); si cambió 'ingredientes' (una
+reconstrucción completa del índice de ingredientes) o venció el TTL, se vuelve a
+cargar entero. Las recetas borradas desaparecen de los resultados al leerlas.
+"""
+import threading
+import time
+
+from base_datos.ingredientes import normalizar_nombre
+
+
+def _bitset(posiciones, tamano):
+    """Arma un bitset con las posiciones indicadas (todas menores que `tamano`)."""
+    if len(posiciones) < 64:
+        bits = 0
+        for posicion in posiciones:
+            bits |= 1 << posicion
+        return bits
+    buffer = bytearray((tamano + 7) // 8)
+    for posicion in posiciones:
+        buffer[posicion >> 3] |= 1 << (posicion & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def sumar_bitsets(bitsets):
+    """
+    Cuenta, para cada posición, en cuántos de los bitsets está prendida.
+
+    Returns:
+        list: Planos de bits del contador (el plano k es el bit k de la cuenta)
+    """
+    planos = []
+    for bits in bitsets:
+        acarreo = bits
+        for k, plano in enumerate(planos):
+            planos[k], acarreo = plano ^ acarreo, plano & acarreo
+            if not acarreo:
+                break
+        if acarreo:
+            planos.append(acarreo)
+    return planos
+
+
+def posiciones_con_cuenta(planos, cuenta, universo):
+    """Bitset de las posiciones de `universo` cuyo contador vale exactamente `cuenta`."""
+    if cuenta >> len(planos):
+        return 0
+    mascara = universo
+    for k, plano in enumerate(planos):
+        mascara &= plano if (cuenta >> k) & 1 else ~plano
+        if not mascara:
+            break
+    return mascara
+
+
+class IndiceDespensa:
+    """Índice invertido ingrediente -> bitset de recetas, compartido por los hilos."""
+
+    def __init__(self, ttl=600.0, reloj=time.monotonic):
+        """
+        Args:
+            ttl (float): Segundos entre recargas completas (0: sólo por versión)
+            reloj (callable): Fuente de tiempo (inyectable para pruebas)
+        """
+        self.ttl = ttl
+        self.reloj = reloj
+        self._lock = threading.Lock()
+        self._vaciar()
+
+        # Estadísticas
+        self._recargas = 0
+        self._incrementales = 0
+        self._busquedas = 0
+
+    def _vaciar(self):
+        # Posición -> id_receta (creciente) e id_receta -> posición
+        self._ids = []
+        self._posicion = {}
+        # id_ingrediente -> bitset de recetas; nombre normalizado -> id_ingrediente
+        self._recetas_con = {}
+        self._ingredientes = {}
+        # Cantidad de ingredientes -> bitset de recetas con esa cantidad
+        self._por_total = {}
+        self._ultima_receta = 0
+        self._ultimo_ingrediente = 0
+        self._versiones = None
+        self._vence = 0.0
+
+    # -------------------------------------------------------------
+    # CARGA
+    # -------------------------------------------------------------
+
+    def actualizar(self, db):
+        """
+        Pone el índice al día con la base de `db` (una Conexion, puede ser de
+        solo lectura). Devuelve 'completa', 'incremental' o None si no hizo falta.
+        """
+        versiones = (db.obtener_version_cache('recetas'), db.obtener_version_cache('ingredientes'))
+        with self._lock:
+            if self._versiones is None or versiones[1] != self._versiones[1] \
+                    or (self.ttl > 0 and self.reloj() >= self._vence):
+                self._cargar(db.conexion)
+                self._recargas += 1
+                tipo = 'completa'
+            elif versiones[0] != self._versiones[0]:
+                self._agregar_nuevas(db.conexion)
+                self._incrementales += 1
+                tipo = 'incremental'
+            else:
+                return None
+            self._versiones = versiones
+            return tipo
+
+    def _cargar_nombres(self, conexion):
+        for id_ingrediente, nombre in conexion.execute(
+            "SELECT id_ingrediente, nombre FROM ingrediente WHERE id_ingrediente > ?",
+            (self._ultimo_ingrediente,)
+        ):
+            self._ingredientes[nombre] = id_ingrediente
+            self._ultimo_ingrediente = max(self._ultimo_ingrediente, id_ingrediente)
+
+    def _cargar(self, conexion):
+        """Carga el índice completo: dos recorridos de índices cubrientes."""
+        self._vaciar()
+        self._vence = self.reloj() + self.ttl
+        self._cargar_nombres(conexion)
+
+        por_total = {}
+        for id_receta, total in conexion.execute("""
+            SELECT id_receta, COUNT(*) FROM receta_has_ingrediente
+            GROUP BY id_receta ORDER BY id_receta
+        """):
+            self._posicion[id_receta] = len(self._ids)
+            self._ids.append(id_receta)
+            por_total.setdefault(total, []).append(self._posicion[id_receta])
+        if self._ids:
+            self._ultima_receta = self._ids[-1]
+        tamano = len(self._ids)
+        self._por_total = {total: _bitset(posiciones, tamano) for total, posiciones in por_total.items()}
+
+        # Ordenado por ingrediente: se arma un bitset por vez
+        actual, posiciones = None, []
+        for id_ingrediente, id_receta in conexion.execute("""
+            SELECT id_ingrediente, id_receta FROM receta_has_ingrediente
+            ORDER BY id_ingrediente, id_receta
+        """):
+            if id_ingrediente != actual:
+                if posiciones:
+                    self._recetas_con[actual] = _bitset(posiciones, tamano)
+                actual, posiciones = id_ingrediente, []
+            posicion = self._posicion.get(id_receta)
+            if posicion is not None:
+                posiciones.append(posicion)
+        if posiciones:
+            self._recetas_con[actual] = _bitset(posiciones, tamano)
+
+    def _agregar_nuevas(self, conexion):
+        """Agrega las recetas con ID mayor a la última indexada."""
+        self._cargar_nombres(conexion)
+        nuevas = {}
+        for id_receta, id_ingrediente in conexion.execute("""
+            SELECT id_receta, id_ingrediente FROM receta_has_ingrediente
+            WHERE id_receta > ? ORDER BY id_receta
+        """, (self._ultima_receta,)):
+            nuevas.setdefault(id_receta, set()).add(id_ingrediente)
+        for id_receta, ingredientes in nuevas.items():
+            posicion = len(self._ids)
+            bit = 1 << posicion
+            self._posicion[id_receta] = posicion
+            self._ids.append(id_receta)
+            self._ultima_receta = id_receta
+            for id_ingrediente in ingredientes:
+                self._recetas_con[id_ingrediente] = self._recetas_con.get(id_ingrediente, 0) | bit
+            self._por_total[len(ingredientes)] = self._por_total.get(len(ingredientes), 0) | bit
+
+    # -------------------------------------------------------------
+    # BÚSQUEDA
+    # -------------------------------------------------------------
+
+    def buscar(self, despensa, limite=12, max_faltantes=None):
+        """
+        Busca las recetas que mejor cubre una despensa.
+
+        Args:
+            despensa (list): Nombres de ingredientes (se normalizan)
+            limite (int): Cantidad máxima de recetas a devolver
+            max_faltantes (int): Descarta recetas a las que les falten más ingredientes
+
+        Returns:
+            dict: {'resultados': [(id_receta, disponibles, total)], 'total': recetas
+                   con al menos un ingrediente, 'ingredientes': {nombre: id},
+                   'desconocidos': [nombres que ninguna receta usa]}
+        """
+        nombres = [nombre for nombre in map(normalizar_nombre, despensa) if nombre]
+        ingredientes, desconocidos = {}, []
+        with self._lock:
+            self._busquedas += 1
+            for nombre in nombres:
+                id_ingrediente = self._ingredientes.get(nombre)
+                if id_ingrediente is None:
+                    desconocidos.append(nombre)
+                else:
+                    ingredientes[nombre] = id_ingrediente
+            planos = sumar_bitsets(
+                self._recetas_con[i] for i in set(ingredientes.values()) if i in self._recetas_con
+            )
+            por_total = dict(self._por_total)
+            ids = self._ids
+
+        alguna = 0
+        for plano in planos:
+            alguna |= plano
+
+        # (disponibles, total) de mejor a peor cobertura
+        combinaciones = sorted(
+            ((disponibles, total) for total in por_total for disponibles in range(1, total + 1)
+             if max_faltantes is None or total - disponibles <= max_faltantes),
+            key=lambda par: (-par[0] / par[1], -par[0], -par[1])
+        )
+        mascaras = {}
+        resultados = []
+        for disponibles, total in combinaciones:
+            if len(resultados) >= limite:
+                break
+            if disponibles not in mascaras:
+                mascaras[disponibles] = posiciones_con_cuenta(planos, disponibles, alguna)
+            mascara = mascaras[disponibles] & por_total[total]
+            # Del bit más alto al más bajo: de la receta más nueva a la más vieja
+            while mascara and len(resultados) < limite:
+                posicion = mascara.bit_length() - 1
+                mascara ^= 1 << posicion
+                resultados.append((ids[posicion], disponibles, total))
+
+        return {
+            'resultados': resultados,
+            'total': alguna.bit_count(),
+            'ingredientes': ingredientes,
+            'desconocidos': desconocidos,
+        }
+
+    def estadisticas(self):
+        """Devuelve un diccionario con el tamaño y la actividad del índice."""
+        with self._lock:
+            return {
+                'recetas': len(self._ids),
+                'ingredientes': len(self._recetas_con),
+                'recargas': self._recargas,
+                'incrementales': self._incrementales,
+                'busquedas': self._busquedas,
+            }
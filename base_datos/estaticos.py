@@ -0,0 +1,202 @@
+"""
+Recursos estáticos con huella de contenido y precomprimidos.
+
+`construir` copia cada archivo de `static/` a `static/dist/` con un hash de su
+contenido en el nombre (`landing.css` -> `dist/landing.3f2a9c1b0d.css`) y, para
+los tipos de texto, escribe al lado las variantes `.gz` y `.br` (brotli sólo si
+el módulo `brotli` está instalado). El manifiesto `dist/manifest.json` relaciona
+cada nombre original con el que tiene huella.
+
+Como el nombre cambia cuando cambia el contenido, esas URLs se sirven con
+`Cache-Control: immutable` y un año de vida: el navegador no vuelve a
+validarlas en cada navegación. Los recursos se construyen al desplegar; la
+aplicación sólo lee el manifiesto y, si no existe, sirve los archivos
+originales.
+
+Uso:
+    python -m base_datos.estaticos [--directorio static] [--limpiar]
+    flask --app app estaticos
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIRECTORIO_SALIDA = 'dist'
+MANIFIESTO = 'manifest.json'
+LONGITUD_HUELLA = 10
+EXTENSIONES_COMPRIMIBLES = {'.css', '.js', '.mjs', '.svg', '.html', '.txt', '.json', '.map', '.xml'}
+# Un año: lo máximo que respetan los navegadores
+MAX_EDAD_INMUTABLE = 365 * 24 * 3600
+
+
+def _escribir(ruta, contenido):
+    """Escribe el archivo de forma atómica si todavía no existe."""
+    if os.path.exists(ruta):
+        return False
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+    return True
+
+
+def _comprimir_gzip(contenido, nivel):
+    # mtime=0: la misma entrada produce siempre los mismos bytes
+    return gzip.compress(contenido, compresslevel=nivel, mtime=0)
+
+
+def _comprimir_brotli(contenido, nivel):
+    return brotli.compress(contenido, quality=nivel)
+
+
+def construir(directorio, nivel_gzip=9, nivel_brotli=11):
+    """
+    Genera los archivos con huella, sus variantes comprimidas y el manifiesto.
+
+    Args:
+        directorio (str): Carpeta de archivos estáticos (la salida va en su subcarpeta dist/)
+        nivel_gzip (int): Nivel de gzip (1 a 9); se comprime una sola vez
+        nivel_brotli (int): Calidad de brotli (0 a 11)
+
+    Returns:
+        dict: {'manifiesto': {nombre: nombre con huella}, 'escritos': cantidad de archivos nuevos}
+    """
+    salida = os.path.join(directorio, DIRECTORIO_SALIDA)
+    os.makedirs(salida, exist_ok=True)
+    compresores = [('.gz', _comprimir_gzip, nivel_gzip)]
+    if brotli is not None:
+        compresores.append(('.br', _comprimir_brotli, nivel_brotli))
+
+    manifiesto = {}
+    escritos = 0
+    for raiz, carpetas, archivos in os.walk(directorio):
+        if os.path.abspath(raiz) == os.path.abspath(directorio):
+            carpetas[:] = [c for c in carpetas if c != DIRECTORIO_SALIDA]
+        carpetas.sort()
+        for nombre_archivo in sorted(archivos):
+            ruta = os.path.join(raiz, nombre_archivo)
+            nombre = os.path.relpath(ruta, directorio).replace(os.sep, '/')
+            with open(ruta, 'rb') as archivo:
+                contenido = archivo.read()
+            base, extension = os.path.splitext(nombre)
+            huella = hashlib.sha256(contenido).hexdigest()[:LONGITUD_HUELLA]
+            con_huella = f"{DIRECTORIO_SALIDA}/{base}.{huella}{extension}"
+            destino = os.path.join(directorio, *con_huella.split('/'))
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            escritos += _escribir(destino, contenido)
+            if extension.lower() in EXTENSIONES_COMPRIMIBLES:
+                for sufijo, comprimir, nivel in compresores:
+                    if os.path.exists(destino + sufijo):
+                        continue
+                    comprimido = comprimir(contenido, nivel)
+                    # Una variante que no ahorra bytes no vale la decodificación
+                    if len(comprimido) < len(contenido):
+                        escritos += _escribir(destino + sufijo, comprimido)
+            manifiesto[nombre] = con_huella
+
+    temporal = os.path.join(salida, f"{MANIFIESTO}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, indent=2, sort_keys=True)
+    os.replace(temporal, os.path.join(salida, MANIFIESTO))
+    return {'manifiesto': manifiesto, 'escritos': escritos}
+
+
+def limpiar(directorio, manifiesto):
+    """Borra de dist/ los archivos con huella que ya no están en el manifiesto."""
+    salida = os.path.join(directorio, DIRECTORIO_SALIDA)
+    vigentes = {os.path.join(directorio, *nombre.split('/')) for nombre in manifiesto.values()}
+    borrados = 0
+    for raiz, _, archivos in os.walk(salida):
+        for nombre_archivo in archivos:
+            ruta = os.path.join(raiz, nombre_archivo)
+            original = ruta[:-3] if ruta.endswith(('.gz', '.br')) else ruta
+            if nombre_archivo != MANIFIESTO and original not in vigentes:
+                os.remove(ruta)
+                borrados += 1
+    return borrados
+
+
+class RecursosEstaticos:
+    """Manifiesto de recursos con huella y elección de la variante comprimida a servir."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self.manifiesto = {}
+        self._codificaciones = {}
+
+    def preparar(self, construir_antes=False):
+        """
+        Lee el manifiesto (o construye antes los recursos si `construir_antes`)
+        y registra qué variantes comprimidas hay de cada uno. Sin manifiesto
+        no hay recursos con huella y se sirven los originales.
+        """
+        ruta = os.path.join(self.directorio, DIRECTORIO_SALIDA, MANIFIESTO)
+        if construir_antes:
+            manifiesto = construir(self.directorio)['manifiesto']
+        elif os.path.exists(ruta):
+            with open(ruta, encoding='utf-8') as archivo:
+                manifiesto = json.load(archivo)
+        else:
+            manifiesto = {}
+        codificaciones = {}
+        for con_huella in manifiesto.values():
+            destino = os.path.join(self.directorio, *con_huella.split('/'))
+            codificaciones[con_huella] = [
+                (codificacion, sufijo) for codificacion, sufijo in (('br', '.br'), ('gzip', '.gz'))
+                if os.path.exists(destino + sufijo)
+            ]
+        self.manifiesto = manifiesto
+        self._codificaciones = codificaciones
+
+    def url(self, nombre):
+        """Devuelve el nombre con huella de un recurso, o None si no está en el manifiesto."""
+        return self.manifiesto.get(nombre)
+
+    def variante(self, nombre, aceptadas):
+        """
+        Elige qué archivo servir para un nombre con huella.
+
+        Args:
+            nombre (str): Nombre pedido (relativo a la carpeta de estáticos)
+            aceptadas: Encabezado Accept-Encoding ya parseado (request.accept_encodings)
+
+        Returns:
+            tuple o None: (archivo, Content-Encoding o None), o None si no es un recurso con huella
+        """
+        codificaciones = self._codificaciones.get(nombre)
+        if codificaciones is None:
+            return None
+        for codificacion, sufijo in codificaciones:
+            if aceptadas.quality(codificacion) > 0:
+                return nombre + sufijo, codificacion
+        return nombre, None
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Genera los recursos estáticos con huella y precomprimidos")
+    parser.add_argument('--directorio', default="static", help="Carpeta de archivos estáticos")
+    parser.add_argument('--limpiar', action='store_true',
+                        help="Borrar las versiones anteriores que ya no están en el manifiesto")
+    args = parser.parse_args(argumentos)
+
+    inicio = time.perf_counter()
+    resultado = construir(args.directorio)
+    for nombre, con_huella in sorted(resultado['manifiesto'].items()):
+        print(f"{nombre} -> {con_huella}")
+    print(f"Archivos nuevos: {resultado['escritos']}" + ("" if brotli else " (brotli no instalado: sólo gzip)"))
+    if args.limpiar:
+        print(f"Archivos anteriores borrados: {limpiar(args.directorio, resultado['manifiesto'])}")
+    print(f"Listo en {time.perf_counter() - inicio:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
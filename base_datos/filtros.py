@@ -0,0 +1,345 @@
+"""
+Filtro de recetas por combinaciones de etiquetas y restricciones alimentarias.
+
+`IndiceFiltros` guarda en memoria, para cada etiqueta y cada restricción, el
+conjunto de recetas que la tienen como un `Bitmap` comprimido al estilo
+"roaring": los IDs se parten en bloques de 65536 y cada bloque es un conjunto
+de Python si tiene pocos elementos (hasta 4096) o un int usado como bitmap si
+tiene muchos. Las etiquetas raras ocupan lo que sus recetas y las frecuentes
+un bit por receta, y las operaciones entre bitmaps densos son AND/OR de enteros.
+
+Una expresión de filtro es una tupla anidada:
+    ('etiqueta', nombre), ('restriccion', nombre)
+    ('y', expr, ...), ('o', expr, ...), ('no', expr)
+así "Sin TACC y Vegano y no Sin Lactosa" es
+    ('y', ('etiqueta', 'Sin TACC'), ('etiqueta', 'Vegano'), ('no', ('etiqueta', 'Sin Lactosa'))).
+Un nombre inexistente no coincide con ninguna receta.
+
+El índice se pone al día contra `versiones_cache` como el de despensa: si
+cambió alguna versión se agregan las filas de las recetas nuevas y se verifica
+con un COUNT que no haya otros cambios (etiquetas asignadas o quitadas a
+recetas viejas, recetas borradas); si los hay, o venció el TTL, se recarga.
+"""
+import threading
+import time
+
+# Restricciones: un nombre por fila y una fila por (receta, restricción). Las
+# tablas nunca se usaron, pero por las dudas se quitan duplicados. Se cargan
+# las restricciones más comunes para que el formulario de recetas las ofrezca.
+SQL_INDICES_RESTRICCIONES = [
+    """
+    DELETE FROM restriccion WHERE nombre IS NULL OR id_restriccion NOT IN (
+        SELECT MIN(id_restriccion) FROM restriccion GROUP BY nombre
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_restriccion_nombre ON restriccion (nombre)",
+    """
+    DELETE FROM receta_has_restriccion WHERE id_receta IS NULL OR id_restriccion IS NULL
+        OR id_restriccion NOT IN (SELECT id_restriccion FROM restriccion)
+        OR id_receta_restriccion NOT IN (
+            SELECT MIN(id_receta_restriccion) FROM receta_has_restriccion GROUP BY id_receta, id_restriccion
+        )
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_receta_restriccion
+    ON receta_has_restriccion (id_receta, id_restriccion)
+    """,
+    """
+    INSERT OR IGNORE INTO restriccion (nombre)
+    VALUES ('Vegetariano'), ('Vegano'), ('Sin TACC'), ('Sin lactosa')
+    """,
+]
+
+# Cantidad máxima de elementos de un bloque guardado como conjunto
+MAX_CONJUNTO = 4096
+BITS_BLOQUE = 16
+MASCARA_BLOQUE = (1 << BITS_BLOQUE) - 1
+
+
+def _a_bits(conjunto):
+    """Convierte un bloque guardado como conjunto en un bitmap (int)."""
+    buffer = bytearray(1 << (BITS_BLOQUE - 3))
+    for bajo in conjunto:
+        buffer[bajo >> 3] |= 1 << (bajo & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _de_bits(bits):
+    """Devuelve los elementos de un bloque bitmap en orden creciente."""
+    elementos = []
+    for indice, byte in enumerate(bits.to_bytes(1 << (BITS_BLOQUE - 3), 'little')):
+        if byte:
+            base = indice << 3
+            elementos.extend(base + j for j in range(8) if byte >> j & 1)
+    return elementos
+
+
+def _compactar(bloque):
+    """Elige la representación de un bloque según su cantidad de elementos."""
+    if isinstance(bloque, set):
+        return _a_bits(bloque) if len(bloque) > MAX_CONJUNTO else bloque
+    return set(_de_bits(bloque)) if bloque.bit_count() <= MAX_CONJUNTO else bloque
+
+
+def _y(a, b):
+    if isinstance(a, set) and isinstance(b, set):
+        return a & b
+    return (a if isinstance(a, int) else _a_bits(a)) & (b if isinstance(b, int) else _a_bits(b))
+
+
+def _o(a, b):
+    if isinstance(a, set) and isinstance(b, set):
+        return a | b
+    return (a if isinstance(a, int) else _a_bits(a)) | (b if isinstance(b, int) else _a_bits(b))
+
+
+def _menos(a, b):
+    if isinstance(a, set) and isinstance(b, set):
+        return a - b
+    return (a if isinstance(a, int) else _a_bits(a)) & ~(b if isinstance(b, int) else _a_bits(b))
+
+
+class Bitmap:
+    """Conjunto de enteros no negativos comprimido por bloques (conjuntos o bitmaps)."""
+
+    __slots__ = ('_bloques',)
+
+    def __init__(self, valores=()):
+        grupos = {}
+        for valor in valores:
+            grupos.setdefault(valor >> BITS_BLOQUE, set()).add(valor & MASCARA_BLOQUE)
+        self._bloques = {alto: _compactar(bajos) for alto, bajos in grupos.items()}
+
+    @classmethod
+    def _desde_bloques(cls, bloques):
+        bitmap = cls()
+        bitmap._bloques = {alto: bloque for alto, bloque in bloques.items() if bloque}
+        return bitmap
+
+    def agregar(self, valor):
+        alto, bajo = valor >> BITS_BLOQUE, valor & MASCARA_BLOQUE
+        bloque = self._bloques.get(alto)
+        if bloque is None:
+            self._bloques[alto] = {bajo}
+        elif isinstance(bloque, set):
+            bloque.add(bajo)
+            if len(bloque) > MAX_CONJUNTO:
+                self._bloques[alto] = _a_bits(bloque)
+        else:
+            self._bloques[alto] = bloque | (1 << bajo)
+
+    def copia(self):
+        return Bitmap._desde_bloques({
+            alto: set(bloque) if isinstance(bloque, set) else bloque
+            for alto, bloque in self._bloques.items()
+        })
+
+    def __contains__(self, valor):
+        bloque = self._bloques.get(valor >> BITS_BLOQUE)
+        if bloque is None:
+            return False
+        if isinstance(bloque, set):
+            return (valor & MASCARA_BLOQUE) in bloque
+        return bool(bloque >> (valor & MASCARA_BLOQUE) & 1)
+
+    def __len__(self):
+        return sum(len(b) if isinstance(b, set) else b.bit_count() for b in self._bloques.values())
+
+    def __iter__(self):
+        """Recorre los valores en orden creciente."""
+        for alto in sorted(self._bloques):
+            bloque = self._bloques[alto]
+            base = alto << BITS_BLOQUE
+            for bajo in (sorted(bloque) if isinstance(bloque, set) else _de_bits(bloque)):
+                yield base + bajo
+
+    def __and__(self, otro):
+        return Bitmap._desde_bloques({
+            alto: _y(bloque, otro._bloques[alto])
+            for alto, bloque in self._bloques.items() if alto in otro._bloques
+        })
+
+    def __or__(self, otro):
+        bloques = dict(self._bloques)
+        for alto, bloque in otro._bloques.items():
+            bloques[alto] = _o(bloques[alto], bloque) if alto in bloques else bloque
+        return Bitmap._desde_bloques(bloques)
+
+    def __sub__(self, otro):
+        return Bitmap._desde_bloques({
+            alto: _menos(bloque, otro._bloques[alto]) if alto in otro._bloques else bloque
+            for alto, bloque in self._bloques.items()
+        })
+
+    def __eq__(self, otro):
+        return isinstance(otro, Bitmap) and list(self) == list(otro)
+
+    def __repr__(self):
+        return f"Bitmap({len(self)} elementos)"
+
+
+def expresion_desde_parametros(todas=(), alguna=(), ninguna=(), restricciones=()):
+    """
+    Arma la expresión de filtro de los parámetros repetidos del listado:
+    todas las etiquetas de `todas`, al menos una de `alguna`, ninguna de
+    `ninguna` y todas las restricciones de `restricciones`.
+
+    Returns:
+        tuple o None: La expresión, o None si no hay ningún filtro
+    """
+    terminos = [('etiqueta', nombre) for nombre in todas]
+    terminos += [('restriccion', nombre) for nombre in restricciones]
+    if alguna:
+        terminos.append(('o',) + tuple(('etiqueta', nombre) for nombre in alguna))
+    terminos += [('no', ('etiqueta', nombre)) for nombre in ninguna]
+    if not terminos:
+        return None
+    return ('y',) + tuple(terminos)
+
+
+class IndiceFiltros:
+    """Bitmaps de recetas por etiqueta y por restricción, compartidos por los hilos."""
+
+    def __init__(self, ttl=600.0, reloj=time.monotonic):
+        """
+        Args:
+            ttl (float): Segundos entre recargas completas (0: sólo por versión)
+            reloj (callable): Fuente de tiempo (inyectable para pruebas)
+        """
+        self.ttl = ttl
+        self.reloj = reloj
+        self._lock = threading.Lock()
+        self._vaciar()
+
+        # Estadísticas
+        self._recargas = 0
+        self._incrementales = 0
+        self._evaluaciones = 0
+
+    def _vaciar(self):
+        self._todas = Bitmap()
+        # tipo ('etiqueta' o 'restriccion') -> {id: Bitmap} y {nombre: id}
+        self._bitmaps = {'etiqueta': {}, 'restriccion': {}}
+        self._nombres = {'etiqueta': {}, 'restriccion': {}}
+        # Filas cargadas de cada tabla, para detectar cambios que no son altas
+        self._filas = {'recetas': 0, 'etiqueta': 0, 'restriccion': 0}
+        self._ultima_receta = 0
+        self._versiones = None
+        self._vence = 0.0
+
+    # -------------------------------------------------------------
+    # CARGA
+    # -------------------------------------------------------------
+
+    _TABLAS = {
+        'etiqueta': ("SELECT id_etiqueta, nombre FROM etiquetas",
+                     "SELECT id_receta, id_etiqueta FROM receta_etiqueta WHERE id_receta > ?",
+                     "SELECT COUNT(*) FROM receta_etiqueta"),
+        'restriccion': ("SELECT id_restriccion, nombre FROM restriccion",
+                        "SELECT id_receta, id_restriccion FROM receta_has_restriccion WHERE id_receta > ?",
+                        "SELECT COUNT(*) FROM receta_has_restriccion"),
+    }
+
+    def actualizar(self, db):
+        """
+        Pone el índice al día con la base de `db` (una Conexion, puede ser de
+        solo lectura). Devuelve 'completa', 'incremental' o None si no hizo falta.
+        """
+        versiones = tuple(db.obtener_version_cache(clave)
+                          for clave in ('recetas', 'etiquetas', 'restricciones'))
+        with self._lock:
+            if self._versiones is None or (self.ttl > 0 and self.reloj() >= self._vence):
+                tipo = 'completa'
+            elif versiones != self._versiones:
+                tipo = 'incremental' if self._agregar_nuevas(db.conexion) else 'completa'
+            else:
+                return None
+            if tipo == 'completa':
+                self._vaciar()
+                self._vence = self.reloj() + self.ttl
+                self._agregar_nuevas(db.conexion)
+                self._recargas += 1
+            else:
+                self._incrementales += 1
+            self._versiones = versiones
+            return tipo
+
+    def _agregar_nuevas(self, conexion):
+        """
+        Agrega las recetas con ID mayor a la última cargada y sus filas.
+        Devuelve False si las tablas tienen otros cambios (hace falta recargar).
+        """
+        ultima = self._ultima_receta
+        for (id_receta,) in conexion.execute("SELECT id_receta FROM recetas WHERE id_receta > ?", (ultima,)):
+            self._todas.agregar(id_receta)
+            self._ultima_receta = max(self._ultima_receta, id_receta)
+            self._filas['recetas'] += 1
+
+        for tipo, (sql_nombres, sql_filas, _) in self._TABLAS.items():
+            self._nombres[tipo] = {nombre: id_ for id_, nombre in conexion.execute(sql_nombres)}
+            nuevas = {}
+            for id_receta, id_ in conexion.execute(sql_filas, (ultima,)):
+                nuevas.setdefault(id_, []).append(id_receta)
+                self._filas[tipo] += 1
+            bitmaps = self._bitmaps[tipo]
+            for id_, ids_receta in nuevas.items():
+                if id_ in bitmaps:
+                    for id_receta in ids_receta:
+                        bitmaps[id_].agregar(id_receta)
+                else:
+                    bitmaps[id_] = Bitmap(ids_receta)
+
+        conteos = {'recetas': conexion.execute("SELECT COUNT(*) FROM recetas").fetchone()[0]}
+        for tipo, (_, _, sql_conteo) in self._TABLAS.items():
+            conteos[tipo] = conexion.execute(sql_conteo).fetchone()[0]
+        return conteos == self._filas
+
+    # -------------------------------------------------------------
+    # EVALUACIÓN
+    # -------------------------------------------------------------
+
+    def _evaluar(self, expresion):
+        operador = expresion[0]
+        if operador in ('etiqueta', 'restriccion'):
+            id_ = self._nombres[operador].get(expresion[1])
+            return self._bitmaps[operador].get(id_, Bitmap())
+        if operador == 'no':
+            return self._todas - self._evaluar(expresion[1])
+        if operador == 'o':
+            resultado = Bitmap()
+            for hijo in expresion[1:]:
+                resultado = resultado | self._evaluar(hijo)
+            return resultado
+        if operador == 'y':
+            # Las negaciones se restan en lugar de complementarse y las
+            # intersecciones empiezan por el conjunto más chico
+            positivos = [self._evaluar(h) for h in expresion[1:] if h[0] != 'no']
+            negativos = [self._evaluar(h[1]) for h in expresion[1:] if h[0] == 'no']
+            positivos.sort(key=len)
+            resultado = positivos[0] if positivos else self._todas
+            for bitmap in positivos[1:]:
+                if not len(resultado):
+                    break
+                resultado = resultado & bitmap
+            for bitmap in negativos:
+                resultado = resultado - bitmap
+            return resultado
+        raise ValueError(f"Operador de filtro desconocido: {operador}")
+
+    def evaluar(self, expresion):
+        """Devuelve un Bitmap (propio del llamador) con los IDs que cumplen la expresión."""
+        with self._lock:
+            self._evaluaciones += 1
+            return self._evaluar(expresion).copia()
+
+    def estadisticas(self):
+        """Devuelve un diccionario con el tamaño y la actividad del índice."""
+        with self._lock:
+            return {
+                'recetas': len(self._todas),
+                'etiquetas': len(self._bitmaps['etiqueta']),
+                'restricciones': len(self._bitmaps['restriccion']),
+                'recargas': self._recargas,
+                'incrementales': self._incrementales,
+                'evaluaciones': self._evaluaciones,
+            }
@@ -0,0 +1,355 @@
+"""
+Importación masiva de recetas desde archivos JSONL o CSV.
+
+El archivo se lee como un flujo (generadores) y se inserta por lotes: cada lote
+es una única transacción con `executemany` para recetas y etiquetas, y los
+autores y etiquetas se resuelven con mapas en memoria en lugar de un SELECT por
+fila. Cada lote guarda también cuántas filas del archivo ya se procesaron en la
+tabla `importaciones`, así que una importación interrumpida continúa desde el
+último lote confirmado.
+
+Con `--diferir-indices` se quitan durante la carga los triggers (búsqueda FTS,
+versiones de caché) e índices secundarios de recetas y etiquetas, y se
+reconstruyen una sola vez al final.
+
+Uso:
+    python -m base_datos.importador recetas.jsonl [--bd RUTA] [--lote 1000]
+        [--formato jsonl|csv] [--usuario EMAIL] [--diferir-indices] [--reiniciar]
+
+Cada registro admite: titulo (obligatorio), descripcion, ingredientes,
+instrucciones, tiempo_preparacion, porciones, imagen_url, fecha_creacion,
+email (autor) y etiquetas (lista en JSONL; separadas por "|" en CSV).
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import time
+
+from base_datos.conexion import Conexion
+from base_datos.ingredientes import indexar_recetas
+from base_datos.relacionadas import reconstruir_relacionadas
+
+# Tablas cuyos triggers e índices secundarios se quitan con --diferir-indices
+TABLAS_DIFERIBLES = ('recetas', 'receta_etiqueta', 'etiquetas')
+
+CAMPOS_TEXTO = ('descripcion', 'ingredientes', 'instrucciones', 'imagen_url', 'fecha_creacion')
+
+
+def huella_archivo(ruta, tamano=64 * 1024):
+    """Identifica el contenido de un archivo por el hash de su comienzo."""
+    with open(ruta, 'rb') as archivo:
+        return hashlib.sha1(archivo.read(tamano)).hexdigest()
+
+
+def leer_registros(ruta, formato=None, saltear=0):
+    """
+    Genera los registros (diccionarios) de un archivo JSONL o CSV.
+
+    Args:
+        ruta (str): Archivo a leer
+        formato (str): 'jsonl' o 'csv' (por defecto, según la extensión)
+        saltear (int): Registros iniciales a omitir (ya importados)
+    """
+    formato = formato or ('csv' if ruta.lower().endswith('.csv') else 'jsonl')
+    with open(ruta, encoding='utf-8', newline='') as archivo:
+        if formato == 'csv':
+            registros = csv.DictReader(archivo)
+            yield from itertools.islice(registros, saltear, None)
+        else:
+            lineas = (linea for linea in archivo if linea.strip())
+            # Las líneas ya importadas se saltean sin decodificar el JSON
+            for linea in itertools.islice(lineas, saltear, None):
+                try:
+                    yield json.loads(linea)
+                except ValueError as e:
+                    yield ValueError(f"JSON inválido: {e}")
+
+
+def normalizar(registro):
+    """
+    Valida un registro y lo lleva al formato de la tabla recetas.
+
+    Raises:
+        ValueError: Si el registro no es válido
+    """
+    if isinstance(registro, Exception):
+        raise registro
+    if not isinstance(registro, dict):
+        raise ValueError("El registro no es un objeto")
+    titulo = (registro.get('titulo') or '').strip()
+    if not titulo:
+        raise ValueError("Falta el título")
+
+    receta = {'titulo': titulo}
+    for campo in CAMPOS_TEXTO:
+        valor = registro.get(campo)
+        if isinstance(valor, list):
+            valor = '\n'.join(str(v) for v in valor)
+        receta[campo] = valor or None
+    for campo in ('tiempo_preparacion', 'porciones'):
+        valor = registro.get(campo)
+        try:
+            receta[campo] = int(valor) if valor not in (None, '') else None
+        except (TypeError, ValueError):
+            raise ValueError(f"{campo} no es un número: {valor!r}")
+
+    etiquetas = registro.get('etiquetas') or []
+    if isinstance(etiquetas, str):
+        etiquetas = etiquetas.split('|')
+    receta['etiquetas'] = list(dict.fromkeys(e.strip() for e in etiquetas if e and e.strip()))
+    receta['email'] = (registro.get('email') or '').strip().lower() or None
+    return receta
+
+
+class ImportadorRecetas:
+    """Importa recetas por lotes usando una conexión de escritura."""
+
+    def __init__(self, db, tamano_lote=1000, usuario_por_defecto=None, diferir_indices=False):
+        """
+        Args:
+            db (Conexion): Conexión de escritura
+            tamano_lote (int): Registros por transacción
+            usuario_por_defecto (str): Email del autor para registros sin autor conocido
+            diferir_indices (bool): Reconstruir triggers e índices al final en lugar de por fila
+        """
+        self.db = db
+        self.conexion = db.conexion
+        self.tamano_lote = tamano_lote
+        self.diferir_indices = diferir_indices
+
+        self.usuarios = {
+            email.lower(): id_usuario
+            for email, id_usuario in self.conexion.execute("SELECT email, id_usuario FROM usuario")
+        }
+        self.id_usuario_por_defecto = None
+        if usuario_por_defecto:
+            self.id_usuario_por_defecto = self.usuarios.get(usuario_por_defecto.lower())
+            if self.id_usuario_por_defecto is None:
+                raise ValueError(f"No existe el usuario {usuario_por_defecto}")
+        self._cargar_etiquetas()
+
+    def _cargar_etiquetas(self):
+        # Directo de la tabla: con --diferir-indices los triggers que versionan
+        # el catálogo en caché no corren
+        self.etiquetas = {
+            nombre: id_etiqueta
+            for nombre, id_etiqueta in self.conexion.execute("SELECT nombre, id_etiqueta FROM etiquetas")
+        }
+
+    def importar(self, ruta, formato=None, reiniciar=False, informar=print):
+        """
+        Importa un archivo, continuando desde el último lote confirmado.
+
+        Returns:
+            dict: Filas procesadas, importadas y rechazadas, segundos y filas por segundo
+        """
+        archivo = os.path.abspath(ruta)
+        huella = huella_archivo(ruta)
+        estado = self._estado(archivo, huella, reiniciar)
+        if estado['completada']:
+            informar(f"{ruta} ya fue importado ({estado['importadas']} recetas)")
+            return self._resumen(estado, 0, 0.0)
+        if estado['filas']:
+            informar(f"Continuando desde la fila {estado['filas']}")
+
+        if self.diferir_indices:
+            self._quitar_objetos_diferibles(archivo)
+
+        inicio = time.perf_counter()
+        procesadas = 0
+        registros = leer_registros(ruta, formato, saltear=estado['filas'])
+        while True:
+            lote = list(itertools.islice(registros, self.tamano_lote))
+            if not lote:
+                break
+            importadas, rechazadas = self._importar_lote(archivo, lote, informar)
+            procesadas += len(lote)
+            estado['filas'] += len(lote)
+            estado['importadas'] += importadas
+            estado['rechazadas'] += rechazadas
+            duracion = time.perf_counter() - inicio
+            informar(f"{estado['filas']} filas ({procesadas / duracion:.0f} filas/s)")
+
+        self._finalizar(archivo)
+        estado['completada'] = True
+        return self._resumen(estado, procesadas, time.perf_counter() - inicio)
+
+    def _estado(self, archivo, huella, reiniciar):
+        self.conexion.execute("""
+            INSERT INTO importaciones (archivo, huella) VALUES (?, ?)
+            ON CONFLICT (archivo) DO NOTHING
+        """, (archivo, huella))
+        fila = self.conexion.execute("""
+            SELECT huella, filas, importadas, rechazadas, completada
+            FROM importaciones WHERE archivo = ?
+        """, (archivo,)).fetchone()
+        if reiniciar:
+            self.conexion.execute("""
+                UPDATE importaciones SET huella = ?, filas = 0, importadas = 0, rechazadas = 0,
+                       completada = 0, actualizado = CURRENT_TIMESTAMP
+                WHERE archivo = ?
+            """, (huella, archivo))
+        elif fila['huella'] != huella:
+            self.conexion.rollback()
+            raise ValueError(f"{archivo} cambió desde la importación anterior; use --reiniciar")
+        self.conexion.commit()
+        if reiniciar:
+            return {'filas': 0, 'importadas': 0, 'rechazadas': 0, 'completada': False}
+        return {clave: fila[clave] for clave in ('filas', 'importadas', 'rechazadas', 'completada')}
+
+    def _importar_lote(self, archivo, lote, informar=print):
+        recetas, rechazadas = [], 0
+        for registro in lote:
+            try:
+                receta = normalizar(registro)
+            except ValueError as e:
+                rechazadas += 1
+                informar(f"Registro rechazado: {e}")
+                continue
+            receta['id_usuario'] = self.usuarios.get(receta['email'], self.id_usuario_por_defecto)
+            if receta['id_usuario'] is None:
+                rechazadas += 1
+                informar(f"Registro rechazado: autor desconocido ({receta['email']}) en '{receta['titulo']}'")
+                continue
+            recetas.append(receta)
+
+        self.conexion.execute("BEGIN IMMEDIATE")
+        try:
+            # IDs explícitos: con el lock de escritura tomado nadie más inserta recetas
+            siguiente = self.conexion.execute("""
+                SELECT MAX(COALESCE((SELECT MAX(id_receta) FROM recetas), 0),
+                           COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'recetas'), 0))
+            """).fetchone()[0] + 1
+            enlaces = []
+            for id_receta, receta in enumerate(recetas, start=siguiente):
+                receta['id_receta'] = id_receta
+                for nombre in receta['etiquetas']:
+                    enlaces.append((id_receta, self._id_etiqueta(nombre)))
+
+            self.conexion.executemany("""
+                INSERT INTO recetas (id_receta, titulo, descripcion, ingredientes, instrucciones,
+                                     tiempo_preparacion, porciones, imagen_url, id_usuario,
+                                     fecha_creacion)
+                VALUES (:id_receta, :titulo, :descripcion, :ingredientes, :instrucciones,
+                        :tiempo_preparacion, :porciones, :imagen_url, :id_usuario,
+                        COALESCE(:fecha_creacion, CURRENT_TIMESTAMP))
+            """, recetas)
+            self.conexion.executemany(
+                "INSERT INTO receta_etiqueta (id_receta, id_etiqueta) VALUES (?, ?)", enlaces
+            )
+            indexar_recetas(self.conexion, [(r['id_receta'], r['ingredientes']) for r in recetas])
+            if self.diferir_indices:
+                # Sin los triggers de versiones, invalidar las cachés una vez por lote
+                self.conexion.execute("UPDATE versiones_cache SET version = version + 1")
+            self.conexion.execute("""
+                UPDATE importaciones
+                SET filas = filas + ?, importadas = importadas + ?, rechazadas = rechazadas + ?,
+                    actualizado = CURRENT_TIMESTAMP
+                WHERE archivo = ?
+            """, (len(lote), len(recetas), rechazadas, archivo))
+            self.conexion.commit()
+        except Exception:
+            self.conexion.rollback()
+            # Las etiquetas creadas en el lote descartado ya no existen
+            self._cargar_etiquetas()
+            raise
+        return len(recetas), rechazadas
+
+    def _id_etiqueta(self, nombre):
+        id_etiqueta = self.etiquetas.get(nombre)
+        if id_etiqueta is None:
+            id_etiqueta = self.conexion.execute(
+                "INSERT INTO etiquetas (nombre) VALUES (?)", (nombre,)
+            ).lastrowid
+            self.etiquetas[nombre] = id_etiqueta
+        return id_etiqueta
+
+    def _quitar_objetos_diferibles(self, archivo):
+        """Guarda la definición de triggers e índices secundarios y los elimina."""
+        self.conexion.execute("BEGIN IMMEDIATE")
+        try:
+            guardados = self.conexion.execute(
+                "SELECT objetos_diferidos FROM importaciones WHERE archivo = ?", (archivo,)
+            ).fetchone()[0]
+            objetos = json.loads(guardados) if guardados else []
+            placeholders = ','.join(['?'] * len(TABLAS_DIFERIBLES))
+            actuales = self.conexion.execute(f"""
+                SELECT type, name, sql FROM sqlite_master
+                WHERE type IN ('trigger', 'index') AND sql IS NOT NULL
+                  AND tbl_name IN ({placeholders})
+            """, TABLAS_DIFERIBLES).fetchall()
+            for tipo, nombre, sql in actuales:
+                if not any(o[1] == nombre for o in objetos):
+                    objetos.append([tipo, nombre, sql])
+                self.conexion.execute(f'DROP {tipo.upper()} IF EXISTS "{nombre}"')
+            self.conexion.execute(
+                "UPDATE importaciones SET objetos_diferidos = ? WHERE archivo = ?",
+                (json.dumps(objetos), archivo)
+            )
+            self.conexion.commit()
+        except Exception:
+            self.conexion.rollback()
+            raise
+
+    def _finalizar(self, archivo):
+        """Restaura lo diferido y recalcula índices derivados en una transacción."""
+        self.conexion.execute("BEGIN IMMEDIATE")
+        try:
+            guardados = self.conexion.execute(
+                "SELECT objetos_diferidos FROM importaciones WHERE archivo = ?", (archivo,)
+            ).fetchone()[0]
+            if guardados:
+                for _, _, sql in json.loads(guardados):
+                    self.conexion.execute(sql)
+                self.conexion.execute("INSERT INTO recetas_fts (recetas_fts) VALUES ('rebuild')")
+                # Los triggers de versiones no corrieron: invalidar todas las cachés
+                self.conexion.execute("UPDATE versiones_cache SET version = version + 1")
+            reconstruir_relacionadas(self.conexion)
+            self.conexion.execute("""
+                UPDATE importaciones
+                SET completada = 1, objetos_diferidos = NULL, actualizado = CURRENT_TIMESTAMP
+                WHERE archivo = ?
+            """, (archivo,))
+            self.conexion.commit()
+        except Exception:
+            self.conexion.rollback()
+            raise
+
+    def _resumen(self, estado, procesadas, segundos):
+        return {
+            'filas': estado['filas'],
+            'importadas': estado['importadas'],
+            'rechazadas': estado['rechazadas'],
+            'segundos': round(segundos, 3),
+            'filas_por_segundo': round(procesadas / segundos, 1) if segundos else 0.0,
+        }
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Importación masiva de recetas (JSONL o CSV)")
+    parser.add_argument('archivo')
+    parser.add_argument('--bd', default="base_datos/recetas.db", help="Ruta de la base de datos")
+    parser.add_argument('--formato', choices=['jsonl', 'csv'], help="Por defecto, según la extensión")
+    parser.add_argument('--lote', type=int, default=1000, help="Registros por transacción")
+    parser.add_argument('--usuario', help="Email del autor para registros sin autor conocido")
+    parser.add_argument('--diferir-indices', action='store_true',
+                        help="Reconstruir búsqueda, índices y triggers al final")
+    parser.add_argument('--reiniciar', action='store_true',
+                        help="Ignorar el progreso guardado y empezar desde el comienzo")
+    args = parser.parse_args(argumentos)
+
+    with Conexion(args.bd) as db:
+        db.crear_esquema_base()
+        db.aplicar_migraciones()
+        importador = ImportadorRecetas(db, tamano_lote=args.lote, usuario_por_defecto=args.usuario,
+                                       diferir_indices=args.diferir_indices)
+        resumen = importador.importar(args.archivo, args.formato, reiniciar=args.reiniciar)
+    print(f"{resumen['importadas']} recetas importadas, {resumen['rechazadas']} rechazadas "
+          f"en {resumen['segundos']}s ({resumen['filas_por_segundo']} filas/s)")
+
+
+if __name__ == '__main__':
+    main()
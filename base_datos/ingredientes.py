@@ -0,0 +1,339 @@
+"""
+Índice estructurado de ingredientes a partir del texto libre de las recetas.
+
+La columna `recetas.ingredientes` guarda una línea por ingrediente escrita a
+mano ("2 tazas de harina 0000", "½ kg de papas", "Sal a gusto"). Cada línea se
+separa en cantidad, unidad y nombre normalizado, y se guarda en las tablas
+`ingrediente` (un nombre por fila) y `receta_has_ingrediente`, de modo que
+"recetas con X" es un join indexado en lugar de un LIKE sobre el texto.
+
+El nombre se normaliza para que variantes de la misma cosa coincidan: minúsculas,
+sin viñetas ni aclaraciones ("cebolla, picada" y "Cebollas picadas" -> "cebolla")
+y con los plurales regulares del español llevados al singular.
+"""
+import re
+import unicodedata
+
+SQL_INDICE_INGREDIENTES = [
+    # Un nombre normalizado por ingrediente (la tabla nunca tuvo datos, pero por las dudas)
+    """
+    DELETE FROM ingrediente WHERE nombre IS NULL OR id_ingrediente NOT IN (
+        SELECT MIN(id_ingrediente) FROM ingrediente GROUP BY nombre
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_ingrediente_nombre ON ingrediente (nombre)",
+]
+
+# La tabla original apunta a una tabla "receta" que no existe (con claves
+# foráneas activas no admite inserciones) y no tiene unidad ni texto original
+SQL_TABLA_RECETA_INGREDIENTE = """
+    CREATE TABLE receta_has_ingrediente (
+        id_receta_ingrediente INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_receta INTEGER NOT NULL,
+        id_ingrediente INTEGER NOT NULL,
+        cantidad FLOAT,
+        unidad TEXT,
+        texto TEXT,
+        orden INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (id_receta) REFERENCES recetas(id_receta) ON DELETE CASCADE,
+        FOREIGN KEY (id_ingrediente) REFERENCES ingrediente(id_ingrediente)
+    )
+"""
+
+FRACCIONES = {'½': 0.5, '¼': 0.25, '¾': 0.75, '⅓': 1 / 3, '⅔': 2 / 3, '⅛': 0.125}
+
+NUMEROS = {
+    'un': 1, 'una': 1, 'uno': 1, 'medio': 0.5, 'media': 0.5, 'dos': 2, 'tres': 3,
+    'cuatro': 4, 'cinco': 5, 'seis': 6, 'siete': 7, 'ocho': 8, 'nueve': 9, 'diez': 10,
+    'docena': 12,
+}
+
+# Forma escrita -> unidad canónica
+UNIDADES = {}
+for _canonica, _formas in {
+    'g': ['g', 'gr', 'grs', 'gramo', 'gramos'],
+    'kg': ['kg', 'kgs', 'kilo', 'kilos', 'kilogramo', 'kilogramos'],
+    'ml': ['ml', 'cc', 'cm3', 'mililitro', 'mililitros'],
+    'l': ['l', 'lt', 'lts', 'litro', 'litros'],
+    'taza': ['taza', 'tazas', 'tz'],
+    'cda': ['cda', 'cdas', 'cucharada', 'cucharadas'],
+    'cdita': ['cdita', 'cditas', 'cdta', 'cdtas', 'cucharadita', 'cucharaditas'],
+    'pizca': ['pizca', 'pizcas'],
+    'diente': ['diente', 'dientes'],
+    'unidad': ['u', 'unidad', 'unidades'],
+    'lata': ['lata', 'latas'],
+    'paquete': ['paquete', 'paquetes', 'paq'],
+    'sobre': ['sobre', 'sobres'],
+    'rama': ['rama', 'ramas', 'ramita', 'ramitas'],
+    'hoja': ['hoja', 'hojas'],
+    'puñado': ['puñado', 'puñados'],
+    'chorro': ['chorro', 'chorrito', 'chorros'],
+    'rodaja': ['rodaja', 'rodajas'],
+    'feta': ['feta', 'fetas'],
+    'vaso': ['vaso', 'vasos'],
+    'atado': ['atado', 'atados'],
+}.items():
+    for _forma in _formas:
+        UNIDADES[_forma] = _canonica
+
+# Aclaraciones al final del nombre que no cambian el ingrediente
+DESCRIPTORES = {
+    'picado', 'picada', 'picados', 'picadas', 'rallado', 'rallada', 'rallados', 'ralladas',
+    'molido', 'molida', 'cortado', 'cortada', 'cortados', 'cortadas', 'fresco', 'fresca',
+    'frescos', 'frescas', 'grande', 'grandes', 'mediano', 'mediana', 'medianos', 'medianas',
+    'chico', 'chica', 'chicos', 'chicas', 'pequeño', 'pequeña', 'maduro', 'madura', 'maduros',
+    'maduras', 'derretido', 'derretida', 'tibio', 'tibia', 'frío', 'fría', 'natural',
+    'finamente', 'pelado', 'pelada', 'pelados', 'peladas', 'cocido', 'cocida', 'cocidos',
+    'cocidas', 'opcional', 'aprox', 'aproximadamente',
+}
+
+FRASES_SIN_CANTIDAD = ('a gusto', 'c/n', 'cantidad necesaria', 'cant. necesaria', 'a elección')
+
+PREPOSICIONES = {'de', 'del', 'con', 'sin', 'en', 'a', 'al', 'y', 'o', 'para'}
+
+# Singulares terminados en -le, -ne, -re o -ce: su plural sólo agrega una 's'
+# y las reglas de -es (frijoles -> frijol, nueces -> nuez) los cortarían mal
+SINGULARES_EN_E = {
+    'chile', 'mole', 'carne', 'dulce', 'postre', 'vinagre', 'jengibre', 'hojaldre',
+    'liebre', 'sobre', 'nance',
+}
+
+_VINETA = re.compile(r'^\s*(?:[-*•·]+|\d+[.)](?!\d))\s*')
+_CANTIDAD = re.compile(
+    r'^(?P<entero>\d+)\s+(?P<num>\d+)/(?P<den>\d+)'                 # 1 1/2
+    r'|^(?P<fnum>\d+)/(?P<fden>\d+)'                                # 1/2
+    r'|^(?P<decimal>\d+(?:[.,]\d+)?)(?:\s*(?P<fraccion>[½¼¾⅓⅔⅛]))?'  # 2, 1,5, 1½
+    r'|^(?P<unicode>[½¼¾⅓⅔⅛])'                                      # ½
+)
+_RANGO = re.compile(r'^\s*(?:-|a)\s*\d+(?:[.,]\d+)?')
+_PALABRA = re.compile(r'^([^\W\d_]+|\d+\w*)\.?', re.UNICODE)
+
+
+def _leer_cantidad(texto):
+    """Devuelve (cantidad o None, resto del texto)."""
+    coincidencia = _CANTIDAD.match(texto)
+    if coincidencia:
+        grupos = coincidencia.groupdict()
+        if grupos['entero']:
+            cantidad = int(grupos['entero']) + int(grupos['num']) / max(int(grupos['den']), 1)
+        elif grupos['fnum']:
+            cantidad = int(grupos['fnum']) / max(int(grupos['fden']), 1)
+        elif grupos['decimal']:
+            cantidad = float(grupos['decimal'].replace(',', '.')) + FRACCIONES.get(grupos['fraccion'], 0)
+        else:
+            cantidad = FRACCIONES[grupos['unicode']]
+        resto = texto[coincidencia.end():]
+        # Rangos ("2-3 papas", "2 a 3 papas"): se guarda el mínimo
+        rango = _RANGO.match(resto)
+        if rango:
+            resto = resto[rango.end():]
+        return cantidad, resto.strip()
+
+    palabra = texto.split(' ', 1)
+    if palabra[0].lower() in NUMEROS:
+        cantidad = NUMEROS[palabra[0].lower()]
+        resto = palabra[1] if len(palabra) > 1 else ''
+        # "media docena", "una docena"
+        if resto.lower().startswith('docena'):
+            cantidad *= 12
+            resto = resto[len('docena'):].strip()
+        return cantidad, resto.strip()
+    return None, texto
+
+
+def _leer_unidad(texto):
+    """Devuelve (unidad canónica o None, resto del texto)."""
+    coincidencia = _PALABRA.match(texto)
+    if not coincidencia:
+        return None, texto
+    palabra = coincidencia.group(1).lower()
+    unidad = UNIDADES.get(palabra)
+    if unidad is None:
+        return None, texto
+    resto = texto[coincidencia.end():].strip()
+    # "1 u." o "2 cdas. de": quitar el punto y el "de"
+    resto = re.sub(r'^(?:de|del)\s+', '', resto, flags=re.IGNORECASE)
+    return unidad, resto
+
+
+_CON_TILDE = str.maketrans('aeiou', 'áéíóú')
+_SIN_TILDE = str.maketrans('áéíóú', 'aeiou')
+
+
+def _singular_en_n(raiz):
+    """
+    Tilde del singular de un plural en -Vnes, que la pierde o la gana al
+    sumar la sílaba: las agudas de más de una sílaba la llevan en la última
+    vocal (calabacines -> calabacín, limones -> limón), las monosílabas no
+    (panes -> pan) y las llanas la tenían sólo en el plural (exámenes -> examen).
+    """
+    if raiz != raiz.translate(_SIN_TILDE):
+        return raiz.translate(_SIN_TILDE)
+    if len(re.findall(r'[aeiouü]+', raiz)) < 2:
+        return raiz
+    return raiz[:-2] + raiz[-2].translate(_CON_TILDE) + raiz[-1]
+
+
+def singular(palabra):
+    """Lleva al singular los plurales regulares del español."""
+    if len(palabra) <= 3 or not palabra.endswith('s'):
+        return palabra
+    if palabra[:-1] in SINGULARES_EN_E:
+        return palabra[:-1]                  # chiles -> chile, dulces -> dulce
+    if palabra.endswith('ces'):
+        return palabra[:-3] + 'z'            # nueces -> nuez
+    if palabra.endswith('nes') and palabra[-4] in 'aeiouáéíóú':
+        return _singular_en_n(palabra[:-2])  # calabacines -> calabacín, panes -> pan
+    # Sólo tras las consonantes con que terminan los singulares de la cocina:
+    # verdes -> verde y potajes -> potaje (no "verd" ni "potaj")
+    if palabra[-3:-2] in ('l', 'r', 'n') and palabra.endswith('es'):
+        return palabra[:-2]                  # frijoles -> frijol, flores -> flor
+    if palabra[-2] in 'aeo':
+        return palabra[:-1]                  # papas -> papa, tomates -> tomate
+    return palabra
+
+
+def normalizar_nombre(texto):
+    """
+    Nombre canónico de un ingrediente: minúsculas, sin aclaraciones entre
+    paréntesis ni después de una coma, sin descriptores finales y en singular.
+    """
+    texto = unicodedata.normalize('NFC', texto).lower()
+    texto = re.sub(r'\(.*?\)', ' ', texto)
+    texto = texto.split(',', 1)[0]
+    for frase in FRASES_SIN_CANTIDAD:
+        texto = texto.replace(frase, ' ')
+    texto = re.sub(r'\s+(?:para|en)\s.*$', '', texto)  # "para decorar", "en cubos"
+    palabras = re.findall(r"[^\W\d_]+(?:'[^\W\d_]+)?|\d+", texto)
+    while palabras and (palabras[-1] in DESCRIPTORES or palabras[-1] in PREPOSICIONES):
+        palabras.pop()
+    while palabras and palabras[0] in PREPOSICIONES:
+        palabras.pop(0)
+    return ' '.join(p if p in PREPOSICIONES else singular(p) for p in palabras)
+
+
+def parsear_linea(linea):
+    """
+    Separa una línea de ingredientes en sus partes.
+
+    Returns:
+        dict or None: {'cantidad', 'unidad', 'nombre', 'texto'}, o None si la
+        línea no nombra un ingrediente (vacía o un título como "Para la masa:")
+    """
+    texto = _VINETA.sub('', linea.strip()).strip()
+    if not texto or texto.endswith(':'):
+        return None
+    cantidad, resto = _leer_cantidad(texto)
+    unidad, resto = _leer_unidad(resto)
+    if cantidad is None and unidad is None:
+        # "Sal a gusto", "Harina c/n"
+        resto = texto
+    nombre = normalizar_nombre(resto)
+    if not nombre:
+        return None
+    if cantidad is not None and unidad is None:
+        unidad = 'unidad'
+    return {'cantidad': cantidad, 'unidad': unidad, 'nombre': nombre, 'texto': linea.strip()}
+
+
+def parsear_ingredientes(texto):
+    """Parsea el texto de ingredientes de una receta; un ingrediente repetido se guarda una vez."""
+    ingredientes = {}
+    for linea in (texto or '').splitlines():
+        ingrediente = parsear_linea(linea)
+        if ingrediente and ingrediente['nombre'] not in ingredientes:
+            ingredientes[ingrediente['nombre']] = ingrediente
+    return list(ingredientes.values())
+
+
+def migrar_tabla_receta_ingrediente(conexion):
+    """Recrea receta_has_ingrediente con la clave foránea correcta (si hace falta)."""
+    columnas = [fila[1] for fila in conexion.execute("PRAGMA table_info(receta_has_ingrediente)")]
+    if 'unidad' in columnas:
+        return
+    conexion.execute("ALTER TABLE receta_has_ingrediente RENAME TO receta_has_ingrediente_anterior")
+    conexion.execute(SQL_TABLA_RECETA_INGREDIENTE)
+    conexion.execute("""
+        INSERT INTO receta_has_ingrediente (id_receta_ingrediente, id_receta, id_ingrediente, cantidad)
+        SELECT id_receta_ingrediente, id_receta, id_ingrediente, cantidad
+        FROM receta_has_ingrediente_anterior
+        WHERE id_receta IN (SELECT id_receta FROM recetas)
+          AND id_ingrediente IN (SELECT id_ingrediente FROM ingrediente)
+    """)
+    conexion.execute("DROP TABLE receta_has_ingrediente_anterior")
+    # "Recetas con X": del ingrediente a las recetas; y los ingredientes de una receta
+    conexion.execute("""
+        CREATE INDEX IF NOT EXISTS idx_receta_ingrediente_ingrediente
+        ON receta_has_ingrediente (id_ingrediente, id_receta)
+    """)
+    conexion.execute("""
+        CREATE INDEX IF NOT EXISTS idx_receta_ingrediente_receta
+        ON receta_has_ingrediente (id_receta, orden)
+    """)
+
+
+def indexar_recetas(conexion, recetas):
+    """
+    Reemplaza los ingredientes indexados de varias recetas. No confirma la
+    transacción: se hace junto con la escritura de las recetas.
+
+    Args:
+        recetas (list): Tuplas (id_receta, texto de ingredientes)
+
+    Returns:
+        int: Cantidad de filas de receta_has_ingrediente insertadas
+    """
+    parseadas = [(id_receta, parsear_ingredientes(texto)) for id_receta, texto in recetas]
+    conexion.executemany("DELETE FROM receta_has_ingrediente WHERE id_receta = ?",
+                         [(id_receta,) for id_receta, _ in parseadas])
+
+    nombres = sorted({i['nombre'] for _, ingredientes in parseadas for i in ingredientes})
+    conexion.executemany("INSERT OR IGNORE INTO ingrediente (nombre) VALUES (?)", [(n,) for n in nombres])
+    ids = {}
+    for desde in range(0, len(nombres), 500):
+        bloque = nombres[desde:desde + 500]
+        placeholders = ','.join(['?'] * len(bloque))
+        ids.update(conexion.execute(
+            f"SELECT nombre, id_ingrediente FROM ingrediente WHERE nombre IN ({placeholders})", bloque
+        ).fetchall())
+
+    filas = [
+        (id_receta, ids[i['nombre']], i['cantidad'], i['unidad'], i['texto'], orden)
+        for id_receta, ingredientes in parseadas
+        for orden, i in enumerate(ingredientes)
+    ]
+    conexion.executemany("""
+        INSERT INTO receta_has_ingrediente (id_receta, id_ingrediente, cantidad, unidad, texto, orden)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, filas)
+    return len(filas)
+
+
+def reconstruir_ingredientes(conexion, lote=2000):
+    """
+    Vuelve a indexar los ingredientes de todas las recetas. No confirma la
+    transacción.
+
+    Returns:
+        int: Cantidad de filas de receta_has_ingrediente insertadas
+    """
+    conexion.execute("DELETE FROM receta_has_ingrediente")
+    total = 0
+    ultimo = 0
+    while True:
+        recetas = conexion.execute(
+            "SELECT id_receta, ingredientes FROM recetas WHERE id_receta > ? ORDER BY id_receta LIMIT ?",
+            (ultimo, lote)
+        ).fetchall()
+        if not recetas:
+            break
+        total += indexar_recetas(conexion, [tuple(fila) for fila in recetas])
+        ultimo = recetas[-1][0]
+    # Nombres que ya no usa ninguna receta
+    conexion.execute("""
+        DELETE FROM ingrediente
+        WHERE id_ingrediente NOT IN (SELECT id_ingrediente FROM receta_has_ingrediente)
+    """)
+    # Los índices en memoria armados sobre estas tablas se recargan enteros
+    conexion.execute("UPDATE versiones_cache SET version = version + 1 WHERE clave = 'ingredientes'")
+    return total
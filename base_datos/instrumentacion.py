@@ -0,0 +1,177 @@
+"""
+Instrumentación de las consultas SQL.
+
+Las conexiones abiertas con `instrumentar=True` (ver `almacenamiento.conectar`)
+usan `ConexionInstrumentada`, cuyos cursores miden cada execute/executemany y
+cada fetch. El tiempo se acumula en el `RegistroConsultas` del contexto actual
+(uno por request, ver app.py) y toda sentencia que supere el umbral se informa
+junto con su EXPLAIN QUERY PLAN.
+
+Las conexiones sin instrumentar son `sqlite3.Connection` comunes: desactivada,
+la instrumentación no agrega ningún costo.
+"""
+import contextvars
+import sqlite3
+import time
+
+# Sentencias más lentas que este umbral se informan con su plan de ejecución
+_configuracion = {'umbral_lento': 0.1}
+
+_registro_actual = contextvars.ContextVar('registro_consultas', default=None)
+
+
+def configurar(umbral_lento_ms=None):
+    """Fija el umbral (en milisegundos) a partir del cual una sentencia es lenta."""
+    if umbral_lento_ms is not None:
+        _configuracion['umbral_lento'] = umbral_lento_ms / 1000
+
+
+class RegistroConsultas:
+    """Cantidad, tiempo total y tiempo por sentencia de las consultas de un request."""
+
+    def __init__(self):
+        self.cantidad = 0
+        self.tiempo = 0.0
+        # SQL -> [ejecuciones, segundos]
+        self.sentencias = {}
+        self._token = None
+
+    def anotar(self, sql, segundos, ejecucion=True):
+        if ejecucion:
+            self.cantidad += 1
+        self.tiempo += segundos
+        sentencia = self.sentencias.get(sql)
+        if sentencia is None:
+            self.sentencias[sql] = [int(ejecucion), segundos]
+        else:
+            sentencia[0] += ejecucion
+            sentencia[1] += segundos
+
+    def mas_lentas(self, cantidad=3):
+        """Devuelve [(sql, ejecuciones, segundos)] de las sentencias que más tiempo tomaron."""
+        ordenadas = sorted(self.sentencias.items(), key=lambda item: item[1][1], reverse=True)
+        return [(sql, ejecuciones, segundos) for sql, (ejecuciones, segundos) in ordenadas[:cantidad]]
+
+    def server_timing(self, cantidad=3):
+        """
+        Valor del encabezado Server-Timing: el total de la base de datos y las
+        sentencias más lentas (sql1, sql2, ...) con un extracto de su SQL.
+        """
+        metricas = [f'db;dur={self.tiempo * 1000:.2f};desc="{self.cantidad} consultas"']
+        for indice, (sql, ejecuciones, segundos) in enumerate(self.mas_lentas(cantidad), 1):
+            extracto = ' '.join(sql.split())[:60].replace('\\', '').replace('"', "'")
+            metricas.append(f'sql{indice};dur={segundos * 1000:.2f};desc="{ejecuciones}x {extracto}"')
+        return ', '.join(metricas)
+
+
+def iniciar_registro():
+    """Empieza a registrar las consultas del contexto actual (p. ej. un request)."""
+    registro = RegistroConsultas()
+    registro._token = _registro_actual.set(registro)
+    return registro
+
+
+def terminar_registro(registro):
+    """Deja de registrar y restaura el registro anterior del contexto."""
+    if registro._token is not None:
+        _registro_actual.reset(registro._token)
+        registro._token = None
+    return registro
+
+
+def registro_actual():
+    """Devuelve el registro del contexto actual, o None si no se está registrando."""
+    return _registro_actual.get()
+
+
+def plan_de_ejecucion(conexion, sql, parametros=()):
+    """Devuelve el EXPLAIN QUERY PLAN de una sentencia como líneas indentadas."""
+    cursor = sqlite3.Cursor(conexion)  # cursor sin instrumentar
+    try:
+        filas = sqlite3.Cursor.execute(cursor, f"EXPLAIN QUERY PLAN {sql}", parametros).fetchall()
+    except sqlite3.Error as e:
+        return [f"(sin plan: {e})"]
+    finally:
+        cursor.close()
+    profundidad = {0: -1}
+    lineas = []
+    for id_nodo, padre, _, detalle in filas:
+        profundidad[id_nodo] = profundidad.get(padre, -1) + 1
+        lineas.append('  ' * profundidad[id_nodo] + detalle)
+    return lineas
+
+
+def _anotar(conexion, sql, parametros, segundos, ejecucion=True):
+    registro = _registro_actual.get()
+    if registro is not None:
+        registro.anotar(sql, segundos, ejecucion)
+    if ejecucion and segundos >= _configuracion['umbral_lento']:
+        plan = plan_de_ejecucion(conexion, sql, parametros) if parametros is not None else []
+        print(f"Consulta lenta ({segundos * 1000:.1f} ms): {' '.join(sql.split())}")
+        for linea in plan:
+            print(f"    {linea}")
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """Cursor que mide cada sentencia y cada lectura de filas."""
+
+    _sql = None
+    _parametros = ()
+
+    def execute(self, sql, parametros=()):
+        self._sql, self._parametros = sql, parametros
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            _anotar(self.connection, sql, parametros, time.perf_counter() - inicio)
+
+    def executemany(self, sql, secuencia):
+        self._sql, self._parametros = sql, None
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, secuencia)
+        finally:
+            _anotar(self.connection, sql, None, time.perf_counter() - inicio)
+
+    def executescript(self, script):
+        self._sql, self._parametros = script, None
+        inicio = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            _anotar(self.connection, script, None, time.perf_counter() - inicio)
+
+    def _medir_lectura(self, leer, *args):
+        inicio = time.perf_counter()
+        try:
+            return leer(*args)
+        finally:
+            if self._sql is not None:
+                _anotar(self.connection, self._sql, self._parametros,
+                        time.perf_counter() - inicio, ejecucion=False)
+
+    def fetchone(self):
+        return self._medir_lectura(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self._medir_lectura(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self._medir_lectura(super().fetchall)
+
+
+class ConexionInstrumentada(sqlite3.Connection):
+    """Conexión cuyos cursores (incluidos los de execute) están instrumentados."""
+
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self.cursor().executemany(sql, secuencia)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
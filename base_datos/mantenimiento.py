@@ -0,0 +1,91 @@
+"""
+Tareas de mantenimiento de la base de datos.
+
+Uso:
+    python -m base_datos.mantenimiento migrar [--bd RUTA] [--hasta VERSION]
+    python -m base_datos.mantenimiento version-esquema [--bd RUTA]
+    python -m base_datos.mantenimiento reconstruir-busqueda [--bd RUTA]
+    python -m base_datos.mantenimiento verificar-votos [--bd RUTA]
+    python -m base_datos.mantenimiento reparar-votos [--bd RUTA]
+    python -m base_datos.mantenimiento reconstruir-relacionadas [--bd RUTA]
+    python -m base_datos.mantenimiento reconstruir-ingredientes [--bd RUTA]
+"""
+import argparse
+import time
+
+from base_datos.conexion import Conexion
+from base_datos.migraciones import version_actual, version_objetivo
+
+
+def migrar(db, args):
+    """Crea el esquema base si falta y aplica las migraciones pendientes."""
+    db.crear_esquema_base()
+    aplicadas = db.aplicar_migraciones(args.hasta)
+    if not aplicadas:
+        print("El esquema ya estaba actualizado")
+    version_esquema(db, args)
+
+
+def version_esquema(db, args):
+    """Muestra la versión de esquema de la base y la última disponible."""
+    print(f"Versión de esquema: {version_actual(db.conexion)} (última disponible: {version_objetivo()})")
+
+
+def reconstruir_busqueda(db, args):
+    """Crea (si falta) y reconstruye el índice de búsqueda de texto completo."""
+    db.crear_indice_busqueda()
+    db.reconstruir_indice_busqueda()
+    db.cursor.execute("SELECT COUNT(*) FROM recetas")
+    print(f"Índice de búsqueda reconstruido ({db.cursor.fetchone()[0]} recetas)")
+
+
+def verificar_votos(db, args):
+    """Informa las recetas cuyos contadores de votos no coinciden con la tabla votos."""
+    inconsistentes = db.verificar_contadores_votos()
+    for fila in inconsistentes:
+        print(f"Receta {fila['id_receta']}: {fila['likes']}/{fila['dislikes']} "
+              f"(reales {fila['likes_reales']}/{fila['dislikes_reales']})")
+    print(f"{len(inconsistentes)} recetas con contadores inconsistentes")
+
+
+def reparar_votos(db, args):
+    """Recalcula los contadores de votos inconsistentes."""
+    print(f"{db.reparar_contadores_votos()} recetas corregidas")
+
+
+def reconstruir_relacionadas(db, args):
+    """Recalcula las recetas relacionadas de todas las recetas (pesos IDF al día)."""
+    print(f"Recetas relacionadas reconstruidas ({db.reconstruir_recetas_relacionadas()} pares)")
+
+
+def reconstruir_ingredientes(db, args):
+    """Vuelve a indexar los ingredientes de todas las recetas desde su texto."""
+    print(f"Índice de ingredientes reconstruido ({db.reconstruir_indice_ingredientes()} ingredientes)")
+
+
+TAREAS = {
+    'migrar': migrar,
+    'version-esquema': version_esquema,
+    'reconstruir-busqueda': reconstruir_busqueda,
+    'verificar-votos': verificar_votos,
+    'reparar-votos': reparar_votos,
+    'reconstruir-relacionadas': reconstruir_relacionadas,
+    'reconstruir-ingredientes': reconstruir_ingredientes,
+}
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Tareas de mantenimiento de la base de datos")
+    parser.add_argument('tarea', choices=sorted(TAREAS))
+    parser.add_argument('--bd', default="base_datos/recetas.db", help="Ruta de la base de datos")
+    parser.add_argument('--hasta', type=int, help="Última versión de esquema a aplicar (migrar)")
+    args = parser.parse_args(argumentos)
+
+    inicio = time.perf_counter()
+    with Conexion(args.bd) as db:
+        TAREAS[args.tarea](db, args)
+    print(f"Listo en {time.perf_counter() - inicio:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""
+Métricas de la aplicación en formato de texto de Prometheus.
+
+Los contadores y los histogramas se acumulan por hilo: cada hilo escribe sólo
+en sus propios diccionarios, sin locks, y al exportar se suman los de todos los
+hilos (los de hilos terminados se pliegan en un acumulado). Los medidores
+(conexiones abiertas, entradas de caché...) se leen en el momento de exportar
+mediante funciones registradas con `registrar_medidor`.
+
+Los totales que ya llevan otros objetos (esperas de un pool, aciertos de una
+caché, rechazos del servicio de contraseñas) se leen con funciones registradas
+con `registrar_contador`: en cada lectura se suma al contador del proceso la
+diferencia con la anterior, así que se guardan y se agregan como cualquier otro
+contador y no bajan si el objeto se recrea ni cuando un worker se reinicia.
+
+Con varios procesos (p. ej. workers de gunicorn) cada uno vuelca su estado en
+`<directorio>/metricas_<pid>.json` y `/metrics` suma los archivos de todos: los
+contadores e histogramas de todos los procesos que alguna vez escribieron, y
+los medidores sólo de los procesos vivos. El directorio debe vaciarse al
+desplegar, como en cualquier esquema multiproceso de Prometheus.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+# Límites superiores (segundos) de los buckets del histograma de latencia
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Nombre -> (tipo, ayuda)
+DESCRIPCIONES = {
+    'recetas_http_pedidos_total': ('counter', 'Pedidos HTTP atendidos por endpoint, método y código'),
+    'recetas_http_errores_total': ('counter', 'Pedidos HTTP que terminaron con un error 5xx'),
+    'recetas_http_duracion_segundos': ('histogram', 'Duración de los pedidos HTTP por endpoint'),
+    'recetas_db_bloqueada_total': ('counter', "Errores 'database is locked' de SQLite"),
+    'recetas_db_conexiones': ('gauge', 'Conexiones del pool por estado (abiertas, en_uso)'),
+    'recetas_db_esperas_total': ('counter', 'Préstamos que esperaron una conexión libre del pool'),
+    'recetas_db_espera_segundos_total': ('counter', 'Tiempo total de espera por una conexión del pool'),
+    'recetas_db_agotados_total': ('counter', 'Pedidos sin conexión del pool dentro del tiempo de espera'),
+    'recetas_cache_aciertos_total': ('counter', 'Aciertos de la caché'),
+    'recetas_cache_fallos_total': ('counter', 'Fallos de la caché'),
+    'recetas_cache_entradas': ('gauge', 'Entradas guardadas en la caché'),
+    'recetas_contrasenas_pendientes': ('gauge', 'Hashes de contraseña en curso o en espera'),
+    'recetas_contrasenas_rechazados_total': ('counter', 'Operaciones de contraseña rechazadas por saturación'),
+    'recetas_contrasenas_vencidos_total': ('counter', 'Operaciones de contraseña que no terminaron a tiempo'),
+}
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatear_etiquetas(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + '}'
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Metricas:
+    """Registro de contadores, histogramas y medidores de un proceso."""
+
+    def __init__(self, buckets=BUCKETS, directorio=None, intervalo=1.0, pid=None):
+        """
+        Args:
+            buckets (tuple): Límites superiores de los buckets de los histogramas
+            directorio (str): Carpeta compartida entre procesos (None: sólo este proceso)
+            intervalo (float): Segundos mínimos entre volcados al directorio
+            pid (int): Identificador del proceso en el directorio (por defecto os.getpid())
+        """
+        self.buckets = tuple(buckets)
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self.pid = pid
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # [(hilo, datos)] de los hilos que registraron algo
+        self._hilos = []
+        # Datos de los hilos ya terminados
+        self._retirados = {'contadores': {}, 'histogramas': {}}
+        self._medidores = []
+        # Contadores leídos de otros objetos: la última lectura de cada uno y lo acumulado
+        self._contadores_leidos = []
+        self._lecturas = {}
+        self._leidos = {'contadores': {}, 'histogramas': {}}
+        self._ultimo_volcado = 0.0
+
+    # -------------------------------------------------------------
+    # REGISTRO (sin locks: cada hilo escribe en sus propios diccionarios)
+    # -------------------------------------------------------------
+
+    def _propios(self):
+        datos = getattr(self._local, 'datos', None)
+        if datos is None:
+            datos = {'contadores': {}, 'histogramas': {}}
+            self._local.datos = datos
+            with self._lock:
+                self._hilos.append((threading.current_thread(), datos))
+        return datos
+
+    def incrementar(self, nombre, etiquetas=(), valor=1):
+        """Suma `valor` a un contador. `etiquetas` es una tupla de pares (nombre, valor)."""
+        contadores = self._propios()['contadores']
+        clave = (nombre, etiquetas)
+        contadores[clave] = contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, etiquetas, valor):
+        """Registra una observación en un histograma."""
+        histogramas = self._propios()['histogramas']
+        clave = (nombre, etiquetas)
+        histograma = histogramas.get(clave)
+        if histograma is None:
+            # [cuenta por bucket..., cuenta sobre el último bucket, suma]
+            histograma = histogramas[clave] = [0] * (len(self.buckets) + 1) + [0.0]
+        histograma[bisect.bisect_left(self.buckets, valor)] += 1
+        histograma[-1] += valor
+
+    def registrar_medidor(self, funcion):
+        """
+        Registra una función que devuelve [(nombre, etiquetas, valor)] con valores
+        leídos en el momento de exportar.
+        """
+        self._medidores.append(funcion)
+
+    def registrar_contador(self, funcion):
+        """
+        Registra una función que devuelve [(nombre, etiquetas, total)] con totales
+        que acumula otro objeto del proceso. Se exportan como contadores: cada
+        lectura suma la diferencia con la anterior y, si el total bajó (el objeto
+        se recreó y empezó de cero), el total nuevo entero.
+        """
+        self._contadores_leidos.append(funcion)
+
+    # -------------------------------------------------------------
+    # LECTURA Y EXPORTACIÓN
+    # -------------------------------------------------------------
+
+    @staticmethod
+    def _sumar(destino, origen):
+        for clave, valor in list(origen['contadores'].items()):
+            destino['contadores'][clave] = destino['contadores'].get(clave, 0) + valor
+        for clave, valores in list(origen['histogramas'].items()):
+            acumulado = destino['histogramas'].get(clave)
+            if acumulado is None:
+                destino['histogramas'][clave] = list(valores)
+            else:
+                for indice, valor in enumerate(valores):
+                    acumulado[indice] += valor
+
+    def instantanea(self):
+        """Suma los datos de todos los hilos, pliega los contadores leídos y lee los medidores."""
+        lecturas = [lectura for funcion in self._contadores_leidos for lectura in funcion()]
+        with self._lock:
+            contadores = self._leidos['contadores']
+            for nombre, etiquetas, valor in lecturas:
+                clave = (nombre, etiquetas)
+                anterior = self._lecturas.get(clave, 0)
+                contadores[clave] = contadores.get(clave, 0) + (valor - anterior if valor >= anterior else valor)
+                self._lecturas[clave] = valor
+            vivos = []
+            for hilo, datos in self._hilos:
+                if hilo.is_alive():
+                    vivos.append((hilo, datos))
+                else:
+                    self._sumar(self._retirados, datos)
+            self._hilos = vivos
+            total = {'contadores': {}, 'histogramas': {}}
+            self._sumar(total, self._retirados)
+            self._sumar(total, self._leidos)
+        for _, datos in vivos:
+            self._sumar(total, datos)
+
+        total['medidores'] = {}
+        for funcion in self._medidores:
+            for nombre, etiquetas, valor in funcion():
+                total['medidores'][(nombre, etiquetas)] = valor
+        return total
+
+    def _archivo(self, pid):
+        return os.path.join(self.directorio, f"metricas_{pid}.json")
+
+    def volcar(self, forzar=False):
+        """Escribe el estado de este proceso en el directorio compartido (si hay)."""
+        ahora = time.monotonic()
+        if not self.directorio or (not forzar and ahora - self._ultimo_volcado < self.intervalo):
+            return
+        self._ultimo_volcado = ahora
+        datos = self.instantanea()
+        pid = self.pid or os.getpid()
+        serializable = {
+            tipo: [[nombre, [list(par) for par in etiquetas], valor]
+                   for (nombre, etiquetas), valor in datos[tipo].items()]
+            for tipo in ('contadores', 'histogramas', 'medidores')
+        }
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = f"{self._archivo(pid)}.{threading.get_ident()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump(serializable, archivo)
+        os.replace(temporal, self._archivo(pid))
+
+    def agregar(self):
+        """
+        Devuelve los datos de todos los procesos del directorio (o sólo los de
+        este proceso si no hay directorio).
+        """
+        if not self.directorio:
+            return self.instantanea()
+        self.volcar(forzar=True)
+        total = {'contadores': {}, 'histogramas': {}, 'medidores': {}}
+        for nombre_archivo in sorted(os.listdir(self.directorio)):
+            if not (nombre_archivo.startswith('metricas_') and nombre_archivo.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.directorio, nombre_archivo), encoding='utf-8') as archivo:
+                    datos = json.load(archivo)
+                pid = int(nombre_archivo[len('metricas_'):-len('.json')])
+            except (OSError, ValueError):
+                continue
+            proceso = {
+                tipo: {(nombre, tuple(tuple(par) for par in etiquetas)): valor
+                       for nombre, etiquetas, valor in datos.get(tipo, [])}
+                for tipo in ('contadores', 'histogramas', 'medidores')
+            }
+            self._sumar(total, proceso)
+            if _vivo(pid):
+                for clave, valor in proceso['medidores'].items():
+                    total['medidores'][clave] = total['medidores'].get(clave, 0) + valor
+        return total
+
+    def exportar(self):
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)."""
+        datos = self.agregar()
+        series = {}
+        for tipo in ('contadores', 'medidores', 'histogramas'):
+            for (nombre, etiquetas), valor in datos[tipo].items():
+                series.setdefault(nombre, []).append((etiquetas, valor))
+
+        lineas = []
+        for nombre in sorted(series):
+            tipo, ayuda = DESCRIPCIONES.get(nombre, ('untyped', nombre))
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for etiquetas, valor in sorted(series[nombre]):
+                if tipo != 'histogram':
+                    lineas.append(f"{nombre}{_formatear_etiquetas(etiquetas)} {_numero(valor)}")
+                    continue
+                acumulado = 0
+                for limite, cuenta in zip(self.buckets + (float('inf'),), valor[:-1]):
+                    acumulado += cuenta
+                    lineas.append(f"{nombre}_bucket{_formatear_etiquetas(etiquetas, [('le', _numero(limite))])} "
+                                  f"{acumulado}")
+                lineas.append(f"{nombre}_sum{_formatear_etiquetas(etiquetas)} {_numero(valor[-1])}")
+                lineas.append(f"{nombre}_count{_formatear_etiquetas(etiquetas)} {acumulado}")
+        return '\n'.join(lineas) + '\n'
@@ -0,0 +1,170 @@
+"""
+Migraciones versionadas del esquema.
+
+La versión aplicada se guarda en `PRAGMA user_version`. La versión 0 es el
+esquema base que crea `Conexion.crear_esquema_base()`; cada migración posterior
+se aplica una sola vez, en orden y dentro de su propia transacción, por lo que
+una base existente se actualiza en el lugar.
+"""
+from base_datos.busqueda import SQL_INDICE_BUSQUEDA
+from base_datos.cache import (
+    SQL_VERSIONES_CACHE, SQL_VERSIONES_ETIQUETAS, SQL_VERSION_INGREDIENTES, SQL_VERSIONES_RESTRICCIONES,
+    SQL_VERSIONES_CONDICIONALES
+)
+from base_datos.filtros import SQL_INDICES_RESTRICCIONES
+from base_datos.ingredientes import (
+    SQL_INDICE_INGREDIENTES, migrar_tabla_receta_ingrediente, reconstruir_ingredientes
+)
+from base_datos.relacionadas import SQL_TABLA_RELACIONADAS, reconstruir_relacionadas
+
+
+def agregar_columna(tabla, columna, definicion):
+    """Devuelve un paso de migración que agrega una columna si todavía no existe."""
+    def paso(conexion):
+        columnas = [fila[1] for fila in conexion.execute(f"PRAGMA table_info({tabla})")]
+        if columna not in columnas:
+            conexion.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+    return paso
+
+
+# (versión, descripción, pasos). Un paso es una sentencia SQL o una función que
+# recibe la conexión. Todos los pasos deben poder repetirse sin error.
+MIGRACIONES = [
+    (1, "Índice de búsqueda de texto completo", SQL_INDICE_BUSQUEDA + [
+        "INSERT INTO recetas_fts (recetas_fts) VALUES ('rebuild')",
+    ]),
+    (2, "Índices para las consultas frecuentes", [
+        # Listado y paginación: ORDER BY fecha_creacion DESC, id_receta DESC
+        "CREATE INDEX IF NOT EXISTS idx_recetas_fecha ON recetas (fecha_creacion, id_receta)",
+        # Comentarios de una receta ordenados por fecha
+        "CREATE INDEX IF NOT EXISTS idx_comentarios_receta ON comentarios (id_receta, fecha_creacion)",
+        # Filtro por etiqueta (la clave primaria sólo cubre id_receta primero)
+        "CREATE INDEX IF NOT EXISTS idx_receta_etiqueta_etiqueta ON receta_etiqueta (id_etiqueta, id_receta)",
+        # Estadísticas de votos sin leer las filas de la tabla
+        "CREATE INDEX IF NOT EXISTS idx_votos_receta_tipo ON votos (id_receta, tipo_voto)",
+    ]),
+    (3, "Contadores de votos por receta mantenidos por triggers", [
+        agregar_columna('recetas', 'likes', 'INTEGER NOT NULL DEFAULT 0'),
+        agregar_columna('recetas', 'dislikes', 'INTEGER NOT NULL DEFAULT 0'),
+        """
+        CREATE TRIGGER IF NOT EXISTS votos_contadores_insertar AFTER INSERT ON votos BEGIN
+            UPDATE recetas
+            SET likes = likes + (new.tipo_voto = 1),
+                dislikes = dislikes + (new.tipo_voto = -1)
+            WHERE id_receta = new.id_receta;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS votos_contadores_eliminar AFTER DELETE ON votos BEGIN
+            UPDATE recetas
+            SET likes = likes - (old.tipo_voto = 1),
+                dislikes = dislikes - (old.tipo_voto = -1)
+            WHERE id_receta = old.id_receta;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS votos_contadores_actualizar
+        AFTER UPDATE OF tipo_voto, id_receta ON votos BEGIN
+            UPDATE recetas
+            SET likes = likes - (old.tipo_voto = 1),
+                dislikes = dislikes - (old.tipo_voto = -1)
+            WHERE id_receta = old.id_receta;
+            UPDATE recetas
+            SET likes = likes + (new.tipo_voto = 1),
+                dislikes = dislikes + (new.tipo_voto = -1)
+            WHERE id_receta = new.id_receta;
+        END
+        """,
+        # Cargar los contadores con los votos existentes
+        """
+        UPDATE recetas SET
+            likes = (SELECT COUNT(*) FROM votos v WHERE v.id_receta = recetas.id_receta AND v.tipo_voto = 1),
+            dislikes = (SELECT COUNT(*) FROM votos v WHERE v.id_receta = recetas.id_receta AND v.tipo_voto = -1)
+        """,
+    ]),
+    (4, "Recetas relacionadas precalculadas por similitud de etiquetas", [
+        SQL_TABLA_RELACIONADAS,
+        reconstruir_relacionadas,
+    ]),
+    (5, "Versiones de datos para invalidar cachés entre procesos", SQL_VERSIONES_CACHE),
+    (6, "Versión del catálogo de etiquetas", SQL_VERSIONES_ETIQUETAS),
+    (7, "Progreso de importaciones masivas", [
+        # Una fila por archivo importado (base_datos/importador.py): permite continuar
+        # una importación interrumpida desde el último lote confirmado
+        """
+        CREATE TABLE IF NOT EXISTS importaciones (
+            archivo TEXT PRIMARY KEY,
+            huella TEXT NOT NULL,
+            filas INTEGER NOT NULL DEFAULT 0,
+            importadas INTEGER NOT NULL DEFAULT 0,
+            rechazadas INTEGER NOT NULL DEFAULT 0,
+            completada BOOLEAN NOT NULL DEFAULT 0,
+            objetos_diferidos TEXT,
+            actualizado TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (8, "Índice estructurado de ingredientes", SQL_INDICE_INGREDIENTES + [
+        migrar_tabla_receta_ingrediente,
+        reconstruir_ingredientes,
+    ]),
+    (9, "Versión del índice de ingredientes", SQL_VERSION_INGREDIENTES),
+    (10, "Restricciones alimentarias por receta", SQL_INDICES_RESTRICCIONES + SQL_VERSIONES_RESTRICCIONES),
+    (11, "Versiones por receta y fecha de cambio para GET condicional", [
+        agregar_columna('recetas', 'version', 'INTEGER NOT NULL DEFAULT 0'),
+        agregar_columna('recetas', 'fecha_modificacion', 'TIMESTAMP'),
+        agregar_columna('versiones_cache', 'actualizado', 'TIMESTAMP'),
+    ] + SQL_VERSIONES_CONDICIONALES),
+]
+
+
+def version_actual(conexion):
+    """Devuelve la versión de esquema registrada en la base."""
+    return conexion.execute("PRAGMA user_version").fetchone()[0]
+
+
+def version_objetivo():
+    """Devuelve la versión de la última migración conocida."""
+    return MIGRACIONES[-1][0] if MIGRACIONES else 0
+
+
+def aplicar_migraciones(conexion, hasta=None):
+    """
+    Aplica en orden las migraciones pendientes.
+
+    Cada migración corre en una transacción BEGIN IMMEDIATE y vuelve a leer la
+    versión dentro de ella, de modo que varios procesos que arrancan a la vez no
+    aplican dos veces la misma migración.
+
+    Args:
+        conexion (sqlite3.Connection): Conexión de escritura
+        hasta (int): Última versión a aplicar (por defecto, todas)
+
+    Returns:
+        list: Versiones aplicadas en esta llamada
+    """
+    if conexion.in_transaction:
+        conexion.commit()
+
+    aplicadas = []
+    for version, descripcion, pasos in MIGRACIONES:
+        if hasta is not None and version > hasta:
+            break
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= version_actual(conexion):
+                conexion.rollback()
+                continue
+            for paso in pasos:
+                if callable(paso):
+                    paso(conexion)
+                else:
+                    conexion.execute(paso)
+            conexion.execute(f"PRAGMA user_version = {int(version)}")
+            conexion.commit()
+        except Exception:
+            conexion.rollback()
+            raise
+        print(f"Migración {version} aplicada: {descripcion}")
+        aplicadas.append(version)
+    return aplicadas
@@ -0,0 +1,48 @@
+import base64
+import binascii
+import json
+
+
+def codificar_cursor(tipo, *valores):
+    """
+    Genera un token opaco con la posición de la última fila de una página.
+
+    Args:
+        tipo (str): Orden al que pertenece el cursor (por ejemplo 'fecha' o 'rango')
+        *valores: Valores de la clave de orden de la última fila
+
+    Returns:
+        str: Token seguro para usar en URLs
+    """
+    crudo = json.dumps([tipo, *valores], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(token, tipo, cantidad):
+    """
+    Decodifica un token generado por codificar_cursor.
+
+    Args:
+        token (str): Token recibido del cliente
+        tipo (str): Orden que se espera
+        cantidad (int): Cantidad de valores de la clave de orden
+
+    Returns:
+        list: Valores de la clave de orden
+
+    Raises:
+        ValueError: Si el token está mal formado, pertenece a otro orden o sus
+            valores no se pueden usar como parámetros de la consulta
+    """
+    try:
+        relleno = '=' * (-len(token) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(token + relleno))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Cursor inválido: {e}")
+    if not isinstance(datos, list) or len(datos) != cantidad + 1 or datos[0] != tipo:
+        raise ValueError("Cursor inválido para este listado")
+    valores = datos[1:]
+    # bool es subclase de int, pero ninguna clave de orden es booleana
+    if any(isinstance(v, bool) or not isinstance(v, (int, float, str)) for v in valores):
+        raise ValueError("Cursor inválido: valores de la clave de orden mal formados")
+    return valores
@@ -0,0 +1,200 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from base_datos.almacenamiento import conectar
+
+
+class PoolAgotado(sqlite3.OperationalError):
+    """Se lanza cuando no se pudo obtener una conexión dentro del tiempo de espera."""
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones SQLite reutilizables y seguro entre hilos.
+
+    Cada conexión física se abre una sola vez (con sus PRAGMA ya aplicados) y se
+    presta a un único usuario por vez. Al devolverla se deshace cualquier
+    transacción pendiente; al prestarla se verifica que siga sana y se recicla
+    si superó su edad o cantidad de usos máxima.
+    """
+
+    def __init__(self, nombre_bd="base_datos/recetas.db", tamano=5, timeout=5.0,
+                 max_usos=1000, max_edad=300.0, perfil=None, solo_lectura=False, instrumentar=False):
+        """
+        Args:
+            nombre_bd (str): Ruta del archivo de base de datos
+            tamano (int): Cantidad máxima de conexiones físicas abiertas
+            timeout (float): Segundos máximos de espera para obtener una conexión
+            max_usos (int): Préstamos tras los cuales la conexión se recicla
+            max_edad (float): Segundos de vida tras los cuales la conexión se recicla
+            perfil (dict): Perfil de PRAGMA (ver base_datos.almacenamiento)
+            solo_lectura (bool): Abrir las conexiones en modo de solo lectura
+            instrumentar (bool): Medir las consultas (ver base_datos.instrumentacion)
+        """
+        self.nombre_bd = nombre_bd
+        self.perfil = perfil
+        self.solo_lectura = solo_lectura
+        self.instrumentar = instrumentar
+        self.tamano = tamano
+        self.timeout = timeout
+        self.max_usos = max_usos
+        self.max_edad = max_edad
+
+        self._condicion = threading.Condition()
+        self._disponibles = deque()
+        # Conexión -> [momento de creación, cantidad de usos]
+        self._info = {}
+        self._abiertas = 0
+        self._en_uso = 0
+        self._cerrado = False
+
+        # Estadísticas
+        self._prestamos = 0
+        self._esperas = 0
+        self._tiempo_espera_total = 0.0
+        self._tiempo_espera_max = 0.0
+        self._agotados = 0
+        self._recicladas = 0
+
+    # -------------------------------------------------------------
+    # CICLO DE VIDA DE LAS CONEXIONES FÍSICAS
+    # -------------------------------------------------------------
+
+    def _abrir(self):
+        """Abre una conexión física y le aplica los PRAGMA una única vez."""
+        conexion = conectar(self.nombre_bd, self.perfil,
+                            solo_lectura=self.solo_lectura, check_same_thread=False,
+                            instrumentar=self.instrumentar)
+        self._info[conexion] = [time.monotonic(), 0]
+        return conexion
+
+    def _descartar(self, conexion):
+        self._info.pop(conexion, None)
+        try:
+            conexion.close()
+        except sqlite3.Error:
+            pass
+
+    def _vencida(self, conexion):
+        creada, usos = self._info.get(conexion, (0, 0))
+        return usos >= self.max_usos or time.monotonic() - creada >= self.max_edad
+
+    def _sana(self, conexion):
+        try:
+            conexion.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    # -------------------------------------------------------------
+    # PRÉSTAMO Y DEVOLUCIÓN
+    # -------------------------------------------------------------
+
+    def obtener(self, timeout=None):
+        """
+        Presta una conexión del pool, esperando si están todas en uso.
+
+        Returns:
+            sqlite3.Connection: Conexión lista para usar
+
+        Raises:
+            PoolAgotado: Si no se liberó ninguna conexión a tiempo
+        """
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        espero = False
+        conexion = None
+
+        with self._condicion:
+            while True:
+                if self._cerrado:
+                    raise sqlite3.ProgrammingError("El pool de conexiones está cerrado")
+                if self._disponibles:
+                    conexion = self._disponibles.popleft()
+                    break
+                if self._abiertas < self.tamano:
+                    # Reservar el lugar; la conexión se abre fuera del lock
+                    self._abiertas += 1
+                    break
+                espero = True
+                restante = timeout - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self._agotados += 1
+                    raise PoolAgotado(
+                        f"No hay conexiones disponibles tras {timeout:.1f}s "
+                        f"({self.tamano} en uso)"
+                    )
+                self._condicion.wait(restante)
+
+            self._en_uso += 1
+            self._prestamos += 1
+            if espero:
+                esperado = time.monotonic() - inicio
+                self._esperas += 1
+                self._tiempo_espera_total += esperado
+                self._tiempo_espera_max = max(self._tiempo_espera_max, esperado)
+
+        try:
+            if conexion is not None and (self._vencida(conexion) or not self._sana(conexion)):
+                self._descartar(conexion)
+                conexion = None
+                with self._condicion:
+                    self._recicladas += 1
+            if conexion is None:
+                conexion = self._abrir()
+        except Exception:
+            with self._condicion:
+                self._abiertas -= 1
+                self._en_uso -= 1
+                self._condicion.notify()
+            raise
+
+        self._info[conexion][1] += 1
+        return conexion
+
+    def devolver(self, conexion):
+        """Devuelve una conexión al pool deshaciendo cualquier transacción pendiente."""
+        reutilizable = True
+        try:
+            if conexion.in_transaction:
+                conexion.rollback()
+        except sqlite3.Error:
+            reutilizable = False
+
+        with self._condicion:
+            self._en_uso -= 1
+            if reutilizable and not self._cerrado and not self._vencida(conexion):
+                self._disponibles.append(conexion)
+            else:
+                self._abiertas -= 1
+                if not self._cerrado:
+                    self._recicladas += 1
+                self._descartar(conexion)
+            self._condicion.notify()
+
+    def cerrar(self):
+        """Cierra las conexiones libres; las prestadas se cierran al devolverse."""
+        with self._condicion:
+            self._cerrado = True
+            while self._disponibles:
+                self._descartar(self._disponibles.popleft())
+                self._abiertas -= 1
+            self._condicion.notify_all()
+
+    def estadisticas(self):
+        """Devuelve un diccionario con el estado actual y los contadores del pool."""
+        with self._condicion:
+            return {
+                'tamano': self.tamano,
+                'abiertas': self._abiertas,
+                'en_uso': self._en_uso,
+                'disponibles': len(self._disponibles),
+                'prestamos': self._prestamos,
+                'esperas': self._esperas,
+                'tiempo_espera_total': round(self._tiempo_espera_total, 6),
+                'tiempo_espera_max': round(self._tiempo_espera_max, 6),
+                'agotados': self._agotados,
+                'recicladas': self._recicladas,
+            }
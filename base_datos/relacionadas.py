@@ -0,0 +1,232 @@
+"""
+Índice precalculado de recetas relacionadas por similitud de etiquetas.
+
+La similitud entre dos recetas es un Jaccard ponderado por IDF: la suma de los
+pesos de las etiquetas en común dividida por la suma de los pesos de todas las
+etiquetas de ambas. Una etiqueta rara ("Keto") pesa más que una muy común, así
+que compartirla acerca más a dos recetas. Para cada receta se guardan sus
+`RELACIONADAS_POR_RECETA` vecinas más cercanas en la tabla recetas_relacionadas.
+"""
+import heapq
+import json
+import math
+from collections import defaultdict
+from operator import itemgetter
+
+RELACIONADAS_POR_RECETA = 10
+
+SQL_TABLA_RELACIONADAS = """
+    CREATE TABLE IF NOT EXISTS recetas_relacionadas (
+        id_receta INTEGER NOT NULL,
+        id_relacionada INTEGER NOT NULL,
+        puntaje REAL NOT NULL,
+        PRIMARY KEY (id_receta, id_relacionada),
+        FOREIGN KEY (id_receta) REFERENCES recetas(id_receta) ON DELETE CASCADE,
+        FOREIGN KEY (id_relacionada) REFERENCES recetas(id_receta) ON DELETE CASCADE
+    ) WITHOUT ROWID
+"""
+
+
+def peso_idf(total_recetas, recetas_con_etiqueta):
+    """Peso IDF suavizado de una etiqueta."""
+    return math.log(1 + total_recetas / max(recetas_con_etiqueta, 1))
+
+
+def similitud(etiquetas_a, etiquetas_b, pesos):
+    """Jaccard ponderado entre dos conjuntos de etiquetas."""
+    union = sum(pesos[e] for e in etiquetas_a | etiquetas_b)
+    if not union:
+        return 0.0
+    return sum(pesos[e] for e in etiquetas_a & etiquetas_b) / union
+
+
+def _cargar_etiquetas(conexion):
+    """Devuelve {id_receta: set(id_etiqueta)} y la cantidad total de recetas."""
+    etiquetas = defaultdict(set)
+    for id_receta, id_etiqueta in conexion.execute("SELECT id_receta, id_etiqueta FROM receta_etiqueta"):
+        etiquetas[id_receta].add(id_etiqueta)
+    total = conexion.execute("SELECT COUNT(*) FROM recetas").fetchone()[0]
+    return etiquetas, total
+
+
+def _pesos(conexion, total, ids_etiqueta=None):
+    query = "SELECT id_etiqueta, COUNT(*) FROM receta_etiqueta"
+    params = []
+    if ids_etiqueta is not None:
+        query += f" WHERE id_etiqueta IN ({','.join(['?'] * len(ids_etiqueta))})"
+        params = list(ids_etiqueta)
+    query += " GROUP BY id_etiqueta"
+    return {id_etiqueta: peso_idf(total, cantidad)
+            for id_etiqueta, cantidad in conexion.execute(query, params)}
+
+
+def _agrupar_por_firma(etiquetas):
+    """
+    Agrupa las recetas por su conjunto exacto de etiquetas ("firma").
+
+    Todas las recetas de una firma tienen el mismo puntaje contra cualquier otra
+    receta, así que la similitud se calcula una vez por par de firmas y no por
+    par de recetas. Los IDs quedan del más nuevo al más viejo, el mismo
+    desempate que usa la consulta de relacionadas.
+    """
+    miembros = defaultdict(list)
+    for id_receta, propias in etiquetas.items():
+        miembros[frozenset(propias)].append(id_receta)
+    for ids in miembros.values():
+        ids.sort(reverse=True)
+    return miembros
+
+
+def _mejores(puntajes, miembros, k):
+    """
+    Devuelve las k+1 mejores (puntaje, id_receta) a partir de los puntajes por
+    firma; una de más para poder excluir a la receta propia.
+    """
+    firmas = heapq.nlargest(k + 1, puntajes.items(), key=itemgetter(1))
+    return heapq.nlargest(k + 1, (
+        (p, id_receta) for f, p in firmas if p > 0 for id_receta in miembros[f][:k + 1]
+    ))
+
+
+def _recortar(conexion, ids_receta, k):
+    """Deja sólo las k mejores relacionadas de cada receta indicada."""
+    conexion.executemany("""
+        DELETE FROM recetas_relacionadas
+        WHERE id_receta = ? AND id_relacionada NOT IN (
+            SELECT id_relacionada FROM recetas_relacionadas
+            WHERE id_receta = ?
+            ORDER BY puntaje DESC, id_relacionada DESC
+            LIMIT ?
+        )
+    """, [(id_receta, id_receta, k) for id_receta in ids_receta])
+
+
+# Para cada receta de una lista JSON: cuántas relacionadas tiene, cuántas quedan
+# detrás de (puntaje, id) y si id ya está entre ellas
+SQL_COMPARAR_LISTAS = """
+    SELECT j.value, COUNT(r.id_relacionada),
+           COALESCE(SUM((r.puntaje, r.id_relacionada) < (?, ?)), 0),
+           COALESCE(MAX(r.id_relacionada = ?), 0)
+    FROM json_each(?) j
+    LEFT JOIN recetas_relacionadas r ON r.id_receta = j.value
+    GROUP BY j.value
+"""
+
+
+def _entra(cantidad, peores, presente, k):
+    """Indica si una receta debe agregarse (o actualizarse) en una lista de relacionadas."""
+    return bool(presente or cantidad < k or peores)
+
+
+def reconstruir_relacionadas(conexion, k=RELACIONADAS_POR_RECETA):
+    """
+    Recalcula desde cero las recetas relacionadas de todas las recetas.
+
+    Usa un índice invertido etiqueta -> firmas, de modo que sólo se comparan
+    firmas que comparten al menos una etiqueta. No confirma la transacción.
+
+    Returns:
+        int: Cantidad de filas escritas
+    """
+    etiquetas, total = _cargar_etiquetas(conexion)
+    pesos = _pesos(conexion, total)
+    miembros = _agrupar_por_firma(etiquetas)
+    firmas_por_etiqueta = defaultdict(list)
+    for firma in miembros:
+        for id_etiqueta in firma:
+            firmas_por_etiqueta[id_etiqueta].append(firma)
+
+    peso_firma = {firma: sum(pesos[e] for e in firma) for firma in miembros}
+
+    filas = []
+    for firma, ids in miembros.items():
+        # Peso de la intersección con cada firma candidata, acumulado etiqueta por etiqueta
+        interseccion = defaultdict(float)
+        for id_etiqueta in firma:
+            peso = pesos[id_etiqueta]
+            for otra in firmas_por_etiqueta[id_etiqueta]:
+                interseccion[otra] += peso
+        puntajes = {
+            otra: comun / (peso_firma[firma] + peso_firma[otra] - comun)
+            for otra, comun in interseccion.items()
+        }
+        mejores = _mejores(puntajes, miembros, k)
+        for id_receta in ids:
+            filas.extend(
+                (id_receta, otra, puntaje)
+                for puntaje, otra in [m for m in mejores if m[1] != id_receta][:k]
+            )
+
+    conexion.execute("DELETE FROM recetas_relacionadas")
+    conexion.executemany(
+        "INSERT INTO recetas_relacionadas (id_receta, id_relacionada, puntaje) VALUES (?, ?, ?)",
+        filas
+    )
+    return len(filas)
+
+
+def actualizar_relacionadas(conexion, id_receta, k=RELACIONADAS_POR_RECETA):
+    """
+    Actualiza el índice para una receta recién creada (o recién etiquetada).
+
+    Calcula sus vecinas y la agrega a las listas de las recetas en las que
+    entra entre las K mejores. Los pesos IDF de las demás recetas no se
+    recalculan; `reconstruir_relacionadas` lo hace periódicamente. No confirma
+    la transacción.
+    """
+    propias = frozenset(fila[0] for fila in conexion.execute(
+        "SELECT id_etiqueta FROM receta_etiqueta WHERE id_receta = ?", (id_receta,)
+    ))
+    conexion.execute("DELETE FROM recetas_relacionadas WHERE id_receta = ?", (id_receta,))
+    if not propias:
+        return
+
+    placeholders = ','.join(['?'] * len(propias))
+    candidatas = defaultdict(set)
+    for otra, id_etiqueta in conexion.execute(f"""
+        SELECT re.id_receta, re.id_etiqueta
+        FROM receta_etiqueta re
+        WHERE re.id_receta IN (
+            SELECT id_receta FROM receta_etiqueta WHERE id_etiqueta IN ({placeholders})
+        ) AND re.id_receta != ?
+    """, [*propias, id_receta]):
+        candidatas[otra].add(id_etiqueta)
+    if not candidatas:
+        return
+
+    total = conexion.execute("SELECT COUNT(*) FROM recetas").fetchone()[0]
+    miembros = _agrupar_por_firma(candidatas)
+    pesos = _pesos(conexion, total, propias.union(*miembros))
+    puntajes = {firma: similitud(propias, firma, pesos) for firma in miembros}
+
+    conexion.executemany(
+        "INSERT INTO recetas_relacionadas (id_receta, id_relacionada, puntaje) VALUES (?, ?, ?)",
+        [(id_receta, otra, puntaje) for puntaje, otra in _mejores(puntajes, miembros, k)[:k]]
+    )
+
+    # Las recetas de una firma ordenan igual a las demás y la más nueva va
+    # primera en ese orden, así que la última de su lista es la más baja de
+    # todas: si la receta nueva no la supera, no entra en ninguna. Si la
+    # supera, se compara con la lista de cada miembro y se escribe sólo donde
+    # la desplaza (mismo orden que la consulta: puntaje y luego ID), donde ya
+    # estaba o donde la lista tiene menos de K. Un empate que no la desplaza
+    # no escribe nada.
+    for firma, puntaje in puntajes.items():
+        if puntaje <= 0:
+            continue
+        ids = miembros[firma]
+        clave = (puntaje, id_receta, id_receta)
+        if not _entra(*conexion.execute(SQL_COMPARAR_LISTAS, clave + (json.dumps(ids[:1]),)).fetchone()[1:], k):
+            continue
+        entran, recortar = [], []
+        for otra, *comparacion in conexion.execute(SQL_COMPARAR_LISTAS, clave + (json.dumps(ids),)):
+            if _entra(*comparacion, k):
+                entran.append(otra)
+                cantidad, _, presente = comparacion
+                if not presente and cantidad >= k:
+                    recortar.append(otra)
+        conexion.executemany("""
+            INSERT OR REPLACE INTO recetas_relacionadas (id_receta, id_relacionada, puntaje)
+            VALUES (?, ?, ?)
+        """, [(otra, id_receta, puntaje) for otra in entran])
+        _recortar(conexion, recortar, k)
@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+
+class EscritorSaturado(Exception):
+    """Se lanza cuando un voto no se confirma dentro del timeout del escritor."""
+
+
+class EscritorVotosDiferido:
+    """
+    Agrupa ráfagas de votos en una sola transacción (escritura diferida).
+
+    Cada voto se encola y el hilo escritor junta los que ya estén esperando más
+    los que lleguen durante `intervalo` segundos (hasta `max_lote`), los aplica
+    con una única conexión de escritura y confirma una sola vez. Con intervalo 0
+    los lotes se forman solos mientras se confirma el anterior (group commit). Quien votó espera a esa confirmación, así
+    que la respuesta sigue reflejando un voto ya persistido; lo que se ahorra es
+    un commit (y su fsync) por voto.
+    """
+
+    def __init__(self, obtener_conexion, intervalo=0.0, max_lote=500, timeout=5.0):
+        """
+        Args:
+            obtener_conexion (callable): Devuelve una Conexion de escritura (context manager)
+            intervalo (float): Segundos que se esperan para juntar votos en un lote
+            max_lote (int): Cantidad máxima de votos por transacción
+            timeout (float): Segundos máximos que un voto espera su confirmación
+        """
+        self.obtener_conexion = obtener_conexion
+        self.intervalo = intervalo
+        self.max_lote = max_lote
+        self.timeout = timeout
+
+        # Estadísticas
+        self.lotes = 0
+        self.votos = 0
+        self.vencidos = 0
+
+        self._cola = queue.Queue()
+        self._detenido = False
+        self._hilo = threading.Thread(target=self._procesar, name='escritor-votos', daemon=True)
+        self._hilo.start()
+
+    def votar(self, id_receta, id_usuario, tipo_voto, alternar=False):
+        """
+        Encola un voto y espera a que su lote se confirme.
+
+        Returns:
+            dict: {'likes', 'dislikes', 'mi_voto'} después del voto
+
+        Raises:
+            EscritorSaturado: Si el lote no se confirmó dentro de `timeout`
+            Exception: El error que produjo el voto (por ejemplo, IntegrityError)
+        """
+        if self._detenido:
+            raise RuntimeError("El escritor de votos está detenido")
+        futuro = Future()
+        self._cola.put(((id_receta, id_usuario, tipo_voto, alternar), futuro))
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TimeoutError:
+            # Si su lote todavía no empezó, el voto se descarta; si ya empezó,
+            # se confirma igual aunque quien votó ya recibió el error
+            futuro.cancel()
+            self.vencidos += 1
+            raise EscritorSaturado("El voto no se confirmó a tiempo") from None
+
+    def detener(self):
+        """Procesa los votos pendientes y termina el hilo escritor."""
+        self._detenido = True
+        self._cola.put(None)
+        self._hilo.join()
+
+    def _procesar(self):
+        while True:
+            primero = self._cola.get()
+            if primero is None:
+                return
+            lote = [primero]
+            limite = time.monotonic() + self.intervalo
+            fin = False
+            while len(lote) < self.max_lote:
+                # Tomar todo lo que ya está encolado y, si hay intervalo, esperar un poco más
+                restante = limite - time.monotonic()
+                try:
+                    if restante > 0:
+                        item = self._cola.get(timeout=restante)
+                    else:
+                        item = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    fin = True
+                    break
+                lote.append(item)
+            self._aplicar_lote(lote)
+            if fin:
+                return
+
+    def _aplicar_lote(self, lote):
+        # Los votos cancelados por timeout no se aplican
+        lote = [(argumentos, futuro) for argumentos, futuro in lote if futuro.set_running_or_notify_cancel()]
+        if not lote:
+            return
+        resultados = []
+        try:
+            with self.obtener_conexion() as db:
+                db.cursor.execute("BEGIN IMMEDIATE")
+                for argumentos, futuro in lote:
+                    # Un SAVEPOINT por voto: un voto inválido no descarta al resto del lote
+                    db.cursor.execute("SAVEPOINT voto")
+                    try:
+                        resultados.append((futuro, db.aplicar_voto(*argumentos), None))
+                        db.cursor.execute("RELEASE voto")
+                    except Exception as e:
+                        db.cursor.execute("ROLLBACK TO voto")
+                        db.cursor.execute("RELEASE voto")
+                        resultados.append((futuro, None, e))
+                db.conexion.commit()
+        except Exception as e:
+            for _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+
+        self.lotes += 1
+        self.votos += len(lote)
+        for futuro, resultado, error in resultados:
+            if error is not None:
+                futuro.set_exception(error)
+            else:
+                futuro.set_result(resultado)
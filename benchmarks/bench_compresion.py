@@ -0,0 +1,128 @@
+"""
+Benchmark de compresión de respuestas: CPU contra bytes ahorrados.
+
+Genera una base sintética, pide a la app (sin comprimir) páginas y respuestas
+JSON representativas y mide, para cada codificación y nivel disponibles, el
+tamaño comprimido y el tiempo de compresión (mediana de varias repeticiones).
+Sirve para elegir COMPRESION_NIVEL_GZIP / COMPRESION_NIVEL_ZSTD y
+COMPRESION_MINIMO.
+
+Uso:
+    python -m benchmarks.bench_compresion --recetas 2000 --iteraciones 50
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from base_datos.compresion import codificaciones_disponibles, comprimir
+from benchmarks.bench_http import datos_de_prueba, preparar_app
+from benchmarks.generador import generar
+
+NIVELES = {'gzip': (1, 6, 9), 'zstd': (1, 3, 9)}
+
+
+def paginas(ruta):
+    """(nombre, URL) de las respuestas a medir sobre la base generada."""
+    with sqlite3.connect(ruta) as conexion:
+        comentada = conexion.execute("""
+            SELECT id_receta FROM comentarios GROUP BY id_receta ORDER BY COUNT(*) DESC LIMIT 1
+        """).fetchone()[0]
+    conexion.close()
+    popular = datos_de_prueba(ruta)['popular'](random.Random(1))
+    return [
+        ('portada', '/'),
+        ('recetas', '/recetas'),
+        ('recetas_busqueda', '/recetas?buscar=pollo'),
+        ('ver_receta', f'/receta/{comentada}'),
+        ('api_recetas_50', '/api/recetas?limite=50'),
+        ('api_recetas_facetas', '/api/recetas?facetas=1'),
+        ('api_receta', f'/api/receta/{popular}'),
+        ('api_etiquetas', '/api/etiquetas'),
+    ]
+
+
+def medir(cuerpo, codificacion, nivel, iteraciones):
+    tiempos = []
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        comprimido = comprimir(cuerpo, codificacion, nivel)
+        tiempos.append(time.perf_counter() - inicio)
+    mediana = statistics.median(tiempos)
+    ahorrados = len(cuerpo) - len(comprimido)
+    return {
+        'bytes': len(comprimido),
+        'ratio': round(len(comprimido) / len(cuerpo), 3),
+        'ahorrados': ahorrados,
+        'mediana_ms': round(mediana * 1000, 3),
+        'mb_por_segundo': round(len(cuerpo) / mediana / 1e6, 1),
+        # Costo de CPU por KB que no viaja por la red
+        'us_por_kb_ahorrado': round(mediana * 1e6 / (ahorrados / 1024), 2) if ahorrados > 0 else None,
+    }
+
+
+def correr(app, urls, iteraciones):
+    cliente = app.test_client()
+    resultados = {}
+    for nombre, url in urls:
+        respuesta = cliente.get(url)
+        cuerpo = respuesta.get_data()
+        respuesta.close()
+        fila = {'url': url, 'estado': respuesta.status_code, 'bytes': len(cuerpo), 'variantes': {}}
+        for codificacion in codificaciones_disponibles():
+            for nivel in NIVELES[codificacion]:
+                fila['variantes'][f"{codificacion}-{nivel}"] = medir(cuerpo, codificacion, nivel, iteraciones)
+        resultados[nombre] = fila
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bd', help="Base creada con benchmarks.generador (si no, se genera una)")
+    parser.add_argument('--recetas', type=int, default=2_000, help="Tamaño de la base a generar")
+    parser.add_argument('--iteraciones', type=int, default=50)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    directorio = None
+    ruta = args.bd
+    if not ruta:
+        directorio = tempfile.mkdtemp(prefix='bench_compresion_')
+        ruta = os.path.join(directorio, 'recetas.db')
+        generar(ruta, args.recetas, semilla=args.semilla)
+    try:
+        app = preparar_app(ruta)
+        resultados = correr(app, paginas(ruta), args.iteraciones)
+    finally:
+        from app import cerrar_pools
+        cerrar_pools()
+        if directorio:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump({
+                'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'codificaciones': codificaciones_disponibles(),
+                'paginas': resultados,
+            }, archivo, indent=2, ensure_ascii=False)
+
+    print(f"{'página':<22}{'variante':<10}{'bytes':>9}{'comprimido':>12}{'ratio':>7}"
+          f"{'ms':>8}{'MB/s':>8}{'µs/KB ahorrado':>16}")
+    for nombre, fila in resultados.items():
+        for variante, r in fila['variantes'].items():
+            print(f"{nombre:<22}{variante:<10}{fila['bytes']:>9}{r['bytes']:>12}{r['ratio']:>7}"
+                  f"{r['mediana_ms']:>8}{r['mb_por_segundo']:>8}{str(r['us_por_kb_ahorrado']):>16}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""
+Benchmark de las consultas de `Conexion` sobre bases sintéticas de varios tamaños.
+
+Para cada tamaño genera una base con `benchmarks.generador` (misma semilla, mismos
+datos) y mide cada método de lectura de `Conexion` y el conjunto de consultas
+que hace la vista `ver_receta`. Los resultados se guardan en JSON para comparar
+corridas: con --comparar se marca como regresión toda consulta cuya mediana
+empeore más que el umbral, y el proceso termina con código 1.
+
+Uso:
+    python -m benchmarks.bench_conexion --tamanos 1000,10000 --salida bench.json
+    python -m benchmarks.bench_conexion --tamanos 1000,10000 --comparar bench.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from base_datos.cache import catalogo_etiquetas, facetas_etiquetas
+from base_datos.conexion import Conexion
+from base_datos.despensa import IndiceDespensa
+from base_datos.filtros import IndiceFiltros, expresion_desde_parametros
+from benchmarks.generador import ETIQUETAS, INGREDIENTES, TAMANOS, generar
+
+# Métodos de lectura que no se miden aquí, con el motivo
+EXCLUIDOS = {
+    'verificar_usuario': "su costo es el hash de la contraseña (ver bench_login)",
+}
+
+# Diferencia mínima (ms) para considerar una regresión: por debajo es ruido
+MINIMO_MS = 0.05
+
+
+def _ver_receta(db, azar, datos):
+    """Las mismas consultas que hace la vista ver_receta para un usuario logueado."""
+    id_receta = datos['popular'](azar)
+    db.obtener_receta_por_id(id_receta)
+    db.obtener_comentarios_receta(id_receta, limite=10)
+    db.obtener_voto_usuario(id_receta, datos['usuario'](azar))
+    db.obtener_recetas_relacionadas(id_receta)
+
+
+def _facetas_sin_cache(filtro):
+    def caso(db, azar, datos):
+        facetas_etiquetas.invalidar()
+        db.obtener_facetas_etiquetas(**filtro(azar, datos))
+    return caso
+
+
+def _despensa(db, azar, datos):
+    """Lo mismo que /api/despensa: ranking en memoria y lectura de las 12 mejores."""
+    resultado = datos['despensa'].buscar(azar.sample(INGREDIENTES, 6), limite=12)
+    ids = [id_receta for id_receta, _, _ in resultado['resultados']]
+    db.obtener_recetas_por_ids(ids)
+    db.obtener_ingredientes_recetas(ids)
+
+
+def _filtro(armar):
+    """Lo mismo que /api/recetas con filtros combinados: evaluar los bitmaps y leer una página."""
+    def caso(db, azar, datos):
+        etiquetas = azar.sample(datos['etiquetas'], 3)
+        filtro = datos['filtros'].evaluar(expresion_desde_parametros(**armar(etiquetas)))
+        db.obtener_recetas_pagina(limite=12, filtro=filtro)
+    return caso
+
+
+def _catalogo_sin_cache(db, azar, datos):
+    catalogo_etiquetas.invalidar()
+    db.obtener_catalogo_etiquetas()
+
+
+# (nombre del caso, método de Conexion que cubre, función que lo ejecuta)
+CASOS = [
+    ('obtener_recetas', 'obtener_recetas', lambda db, azar, d: db.obtener_recetas(limite=10)),
+    ('obtener_recetas_busqueda', 'obtener_recetas',
+     lambda db, azar, d: db.obtener_recetas(busqueda=azar.choice(d['busquedas']), limite=10)),
+    ('obtener_recetas_etiqueta', 'obtener_recetas',
+     lambda db, azar, d: db.obtener_recetas(etiqueta=azar.choice(d['etiquetas']), limite=10)),
+    ('obtener_recetas_ingrediente', 'obtener_recetas',
+     lambda db, azar, d: db.obtener_recetas(ingrediente=azar.choice(d['ingredientes']), limite=10)),
+    ('obtener_recetas_pagina', 'obtener_recetas_pagina',
+     lambda db, azar, d: db.obtener_recetas_pagina(limite=12)),
+    ('obtener_recetas_pagina_siguiente', 'obtener_recetas_pagina',
+     lambda db, azar, d: db.obtener_recetas_pagina(limite=12, cursor=d['cursor_recetas'])),
+    ('obtener_recetas_pagina_busqueda', 'obtener_recetas_pagina',
+     lambda db, azar, d: db.obtener_recetas_pagina(busqueda=azar.choice(d['busquedas']), limite=12)),
+    ('obtener_receta_por_id', 'obtener_receta_por_id',
+     lambda db, azar, d: db.obtener_receta_por_id(d['receta'](azar))),
+    ('obtener_etiquetas_receta', 'obtener_etiquetas_receta',
+     lambda db, azar, d: db.obtener_etiquetas_receta(d['receta'](azar))),
+    ('obtener_etiquetas_recetas', 'obtener_etiquetas_recetas',
+     lambda db, azar, d: db.obtener_etiquetas_recetas([d['receta'](azar) for _ in range(12)])),
+    ('obtener_todas_etiquetas', 'obtener_todas_etiquetas', lambda db, azar, d: db.obtener_todas_etiquetas()),
+    ('obtener_id_etiqueta', 'obtener_id_etiqueta',
+     lambda db, azar, d: db.obtener_id_etiqueta(azar.choice(d['etiquetas']))),
+    ('obtener_catalogo_etiquetas', 'obtener_catalogo_etiquetas', lambda db, azar, d: db.obtener_catalogo_etiquetas()),
+    ('obtener_catalogo_etiquetas_sin_cache', 'obtener_catalogo_etiquetas', _catalogo_sin_cache),
+    ('obtener_comentarios_receta', 'obtener_comentarios_receta',
+     lambda db, azar, d: db.obtener_comentarios_receta(d['popular'](azar), limite=10)),
+    ('obtener_comentarios_receta_siguiente', 'obtener_comentarios_receta',
+     lambda db, azar, d: db.obtener_comentarios_receta(d['mas_comentada'], limite=10,
+                                                       cursor=d['cursor_comentarios'])),
+    ('obtener_estadisticas_votos', 'obtener_estadisticas_votos',
+     lambda db, azar, d: db.obtener_estadisticas_votos(d['popular'](azar))),
+    ('obtener_voto_usuario', 'obtener_voto_usuario',
+     lambda db, azar, d: db.obtener_voto_usuario(d['popular'](azar), d['usuario'](azar))),
+    ('verificar_contadores_votos', 'verificar_contadores_votos', lambda db, azar, d: db.verificar_contadores_votos()),
+    ('obtener_usuario_por_id', 'obtener_usuario_por_id',
+     lambda db, azar, d: db.obtener_usuario_por_id(d['usuario'](azar))),
+    ('obtener_usuario_por_email', 'obtener_usuario_por_email',
+     lambda db, azar, d: db.obtener_usuario_por_email(f"usuario{d['usuario'](azar)}@ejemplo.com")),
+    ('obtener_credenciales', 'obtener_credenciales',
+     lambda db, azar, d: db.obtener_credenciales(f"usuario{d['usuario'](azar)}@ejemplo.com")),
+    ('existe_email', 'existe_email',
+     lambda db, azar, d: db.existe_email(f"usuario{d['usuario'](azar)}@ejemplo.com")),
+    ('obtener_ultimas_recetas', 'obtener_ultimas_recetas', lambda db, azar, d: db.obtener_ultimas_recetas(limite=6)),
+    ('obtener_version_cache', 'obtener_version_cache', lambda db, azar, d: db.obtener_version_cache()),
+    ('obtener_recetas_relacionadas', 'obtener_recetas_relacionadas',
+     lambda db, azar, d: db.obtener_recetas_relacionadas(d['receta'](azar))),
+    ('obtener_ingredientes_receta', 'obtener_ingredientes_receta',
+     lambda db, azar, d: db.obtener_ingredientes_receta(d['receta'](azar))),
+    ('obtener_ingredientes_recetas', 'obtener_ingredientes_recetas',
+     lambda db, azar, d: db.obtener_ingredientes_recetas([d['receta'](azar) for _ in range(12)])),
+    ('obtener_recetas_por_ids', 'obtener_recetas_por_ids',
+     lambda db, azar, d: db.obtener_recetas_por_ids([d['receta'](azar) for _ in range(12)])),
+    ('obtener_facetas_etiquetas', 'obtener_facetas_etiquetas',
+     lambda db, azar, d: db.obtener_facetas_etiquetas(busqueda=azar.choice(d['busquedas']))),
+    ('obtener_facetas_etiquetas_busqueda_sin_cache', 'obtener_facetas_etiquetas',
+     _facetas_sin_cache(lambda azar, d: {'busqueda': azar.choice(d['busquedas'])})),
+    ('obtener_facetas_etiquetas_ingrediente_sin_cache', 'obtener_facetas_etiquetas',
+     _facetas_sin_cache(lambda azar, d: {'ingrediente': azar.choice(d['ingredientes'])})),
+    ('obtener_recetas_pagina_todas_las_etiquetas', 'obtener_recetas_pagina',
+     _filtro(lambda e: {'todas': e[:2]})),
+    ('obtener_recetas_pagina_alguna_sin_etiqueta', 'obtener_recetas_pagina',
+     _filtro(lambda e: {'alguna': e[:2], 'ninguna': e[2:]})),
+    ('obtener_restricciones', 'obtener_restricciones', lambda db, azar, d: db.obtener_restricciones()),
+    ('obtener_versiones_cache', 'obtener_versiones_cache',
+     lambda db, azar, d: db.obtener_versiones_cache(('recetas', 'etiquetas', 'votos', 'ingredientes'))),
+    ('obtener_version_receta', 'obtener_version_receta',
+     lambda db, azar, d: db.obtener_version_receta(d['popular'](azar))),
+    ('ver_receta', None, _ver_receta),
+    ('despensa', None, _despensa),
+]
+
+
+def metodos_sin_medir():
+    """Métodos de lectura de Conexion que ningún caso cubre (para no olvidar medir los nuevos)."""
+    cubiertos = {metodo for _, metodo, _ in CASOS} | set(EXCLUIDOS)
+    return sorted(
+        nombre for nombre in dir(Conexion)
+        if nombre.startswith(('obtener_', 'existe_', 'verificar_')) and nombre not in cubiertos
+    )
+
+
+def preparar_datos(db, tamanos):
+    """Parámetros de las consultas: ids al azar, recetas populares, cursores."""
+    populares = [fila[0] for fila in db.conexion.execute(
+        "SELECT id_receta FROM recetas ORDER BY likes + dislikes DESC LIMIT 50")]
+    mas_comentada = db.conexion.execute("""
+        SELECT id_receta FROM comentarios GROUP BY id_receta ORDER BY COUNT(*) DESC LIMIT 1
+    """).fetchone()[0]
+    despensa = IndiceDespensa(ttl=0)
+    despensa.actualizar(db)
+    filtros = IndiceFiltros(ttl=0)
+    filtros.actualizar(db)
+    return {
+        'receta': lambda azar: azar.randint(1, tamanos['recetas']),
+        'popular': lambda azar: azar.choice(populares),
+        'usuario': lambda azar: azar.randint(1, tamanos['usuarios']),
+        'etiquetas': ETIQUETAS[:min(10, tamanos['etiquetas'])],
+        'busquedas': ['pollo', 'tarta', 'chocolate', 'arroz', 'limón'],
+        'ingredientes': ['harina', 'huevos', 'ajo', 'papas', 'chocolate'],
+        'mas_comentada': mas_comentada,
+        'despensa': despensa,
+        'filtros': filtros,
+        'cursor_recetas': db.obtener_recetas_pagina(limite=12)['siguiente_cursor'],
+        'cursor_comentarios': db.obtener_comentarios_receta(mas_comentada, limite=10)['siguiente_cursor'],
+    }
+
+
+def medir(db, funcion, datos, iteraciones, semilla):
+    """Ejecuta un caso `iteraciones` veces y devuelve mediana, p95 y media en ms."""
+    azar = random.Random(semilla)
+    for _ in range(min(5, iteraciones)):  # calentar la caché de páginas
+        funcion(db, azar, datos)
+    tiempos = []
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        funcion(db, azar, datos)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        'p50_ms': round(statistics.median(tiempos), 4),
+        'p95_ms': round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 4),
+        'media_ms': round(statistics.fmean(tiempos), 4),
+    }
+
+
+def correr(recetas, iteraciones, semilla, directorio):
+    ruta = os.path.join(directorio, f"recetas_{recetas}.db")
+    generacion = generar(ruta, recetas, semilla=semilla)
+    catalogo_etiquetas.invalidar()
+    with Conexion(ruta) as db:
+        datos = preparar_datos(db, generacion)
+        consultas = {
+            nombre: medir(db, funcion, datos, iteraciones, semilla)
+            for nombre, _, funcion in CASOS
+        }
+    catalogo_etiquetas.invalidar()
+    return {'recetas': recetas, 'generacion': generacion, 'consultas': consultas}
+
+
+def comparar(anterior, actual, umbral):
+    """
+    Compara dos corridas por tamaño y consulta.
+
+    Returns:
+        list: Regresiones (tamaño, consulta, p50 anterior, p50 actual)
+    """
+    regresiones = []
+    previos = {r['recetas']: r['consultas'] for r in anterior['resultados']}
+    for resultado in actual['resultados']:
+        for nombre, medida in resultado['consultas'].items():
+            previa = previos.get(resultado['recetas'], {}).get(nombre)
+            if not previa:
+                continue
+            antes, ahora = previa['p50_ms'], medida['p50_ms']
+            if ahora > antes * (1 + umbral) and ahora - antes > MINIMO_MS:
+                regresiones.append((resultado['recetas'], nombre, antes, ahora))
+    return regresiones
+
+
+def _tamano(valor):
+    return TAMANOS[valor] if valor in TAMANOS else int(valor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tamanos', default='1000,10000',
+                        help=f"Cantidades de recetas separadas por coma (o {', '.join(TAMANOS)})")
+    parser.add_argument('--iteraciones', type=int, default=200)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', help="Archivo JSON donde guardar los resultados")
+    parser.add_argument('--comparar', help="JSON de una corrida anterior")
+    parser.add_argument('--umbral', type=float, default=0.25,
+                        help="Empeoramiento relativo de la mediana que cuenta como regresión")
+    parser.add_argument('--conservar', help="Directorio donde dejar las bases generadas")
+    args = parser.parse_args()
+
+    sin_medir = metodos_sin_medir()
+    if sin_medir:
+        print(f"Advertencia: métodos de Conexion sin medir: {', '.join(sin_medir)}")
+
+    directorio = args.conservar or tempfile.mkdtemp(prefix='bench_conexion_')
+    os.makedirs(directorio, exist_ok=True)
+    try:
+        resultados = [correr(_tamano(t), args.iteraciones, args.semilla, directorio)
+                      for t in args.tamanos.split(',')]
+    finally:
+        if not args.conservar:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    corrida = {
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'semilla': args.semilla,
+        'iteraciones': args.iteraciones,
+        'sin_medir': sin_medir,
+        'resultados': resultados,
+    }
+
+    print(f"{'consulta':<40}" + ''.join(f"{r['recetas']:>12}" for r in resultados) + "   (p50 ms)")
+    for nombre, _, _ in CASOS:
+        print(f"{nombre:<40}" + ''.join(f"{r['consultas'][nombre]['p50_ms']:>12.3f}" for r in resultados))
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(corrida, archivo, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            regresiones = comparar(json.load(archivo), corrida, args.umbral)
+        for recetas, nombre, antes, ahora in regresiones:
+            print(f"REGRESIÓN {nombre} con {recetas} recetas: {antes:.3f} ms -> {ahora:.3f} ms")
+        if regresiones:
+            sys.exit(1)
+        print("Sin regresiones")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,435 @@
+"""
+Prueba de carga HTTP con latencia por ruta (p50/p95/p99).
+
+Genera una base sintética (benchmarks.generador) y lanza contra la app una
+mezcla configurable de tráfico: portada, navegación de recetas, búsquedas,
+votos, comentarios e inicios de sesión. La app corre en el mismo proceso, ya
+sea con el cliente de pruebas de Flask (sin red) o con un servidor WSGI local
+de werkzeug en un hilo; con --url se puede atacar un servidor ya levantado
+(gunicorn, etc.) sobre una base creada con el generador y --password.
+
+Dos modos de carga:
+  - concurrencia fija (--concurrencia N): N clientes en bucle cerrado
+  - tasa de llegada fija (--tasa R): R pedidos por segundo con llegadas de
+    Poisson; la latencia se mide desde el momento programado, así que la
+    espera en cola cuenta (sin omisión coordinada)
+
+Uso:
+    python -m benchmarks.bench_http --recetas 10000 --concurrencia 8 --segundos 10
+    python -m benchmarks.bench_http --servidor wsgi --tasa 200 --mezcla navegar=60,buscar=20,votar=20
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import queue
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.generador import generar
+
+PASSWORD = 'clave-de-carga'
+
+# Costo bajo para que los inicios de sesión no dominen la prueba salvo que se pida
+METODO_PASSWORD = 'pbkdf2:sha256:1000'
+
+MEZCLA_POR_DEFECTO = 'portada=10,navegar=45,buscar=20,votar=10,comentar=5,login=10'
+
+BUSQUEDAS = ['pollo', 'tarta', 'chocolate', 'arroz', 'limón', 'guiso de papa', 'empanadas']
+
+
+# -------------------------------------------------------------
+# Clientes: cliente de pruebas de Flask o HTTP real, con la misma interfaz
+# -------------------------------------------------------------
+
+class ClienteInProceso:
+    """Cliente de pruebas de Flask: ejecuta la app sin pasar por la red."""
+
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def pedir(self, metodo, ruta, formulario=None, json_datos=None):
+        respuesta = self.cliente.open(ruta, method=metodo, data=formulario, json=json_datos)
+        respuesta.close()
+        return respuesta.status_code, respuesta.headers.get('Location', '')
+
+    def cerrar(self):
+        pass
+
+
+class ClienteHTTP:
+    """Cliente HTTP/1.1 con conexión persistente y la cookie de sesión."""
+
+    def __init__(self, url):
+        partes = urlsplit(url)
+        self.host, self.puerto = partes.hostname, partes.port or 80
+        self.conexion = None
+        self.cookie = None
+
+    def pedir(self, metodo, ruta, formulario=None, json_datos=None):
+        encabezados = {}
+        cuerpo = None
+        if formulario is not None:
+            cuerpo = urlencode(formulario)
+            encabezados['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_datos is not None:
+            cuerpo = json.dumps(json_datos)
+            encabezados['Content-Type'] = 'application/json'
+        if self.cookie:
+            encabezados['Cookie'] = self.cookie
+
+        for intento in range(2):
+            if self.conexion is None:
+                self.conexion = http.client.HTTPConnection(self.host, self.puerto, timeout=30)
+            try:
+                self.conexion.request(metodo, ruta, body=cuerpo, headers=encabezados)
+                respuesta = self.conexion.getresponse()
+                respuesta.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # El servidor cerró la conexión persistente: reintentar una vez
+                self.conexion.close()
+                self.conexion = None
+                if intento:
+                    raise
+        if respuesta.will_close:
+            self.conexion.close()
+            self.conexion = None
+
+        cookie = respuesta.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return respuesta.status, respuesta.getheader('Location') or ''
+
+    def cerrar(self):
+        if self.conexion is not None:
+            self.conexion.close()
+
+
+# -------------------------------------------------------------
+# Operaciones de la mezcla: (ruta para el reporte, función que pide y
+# devuelve el código de estado y si la respuesta fue la esperada)
+# -------------------------------------------------------------
+
+def _portada(cliente, azar, datos):
+    estado, _ = cliente.pedir('GET', '/')
+    return estado, estado == 200
+
+
+def _navegar(cliente, azar, datos):
+    estado, _ = cliente.pedir('GET', f"/receta/{datos['popular'](azar)}")
+    return estado, estado == 200
+
+
+def _buscar(cliente, azar, datos):
+    estado, _ = cliente.pedir('GET', '/recetas?' + urlencode({'buscar': azar.choice(BUSQUEDAS)}))
+    return estado, estado == 200
+
+
+def _votar(cliente, azar, datos):
+    estado, _ = cliente.pedir('POST', f"/api/receta/{datos['popular'](azar)}/votar",
+                              json_datos={'tipo_voto': azar.choice((1, 1, 1, -1))})
+    return estado, estado == 200
+
+
+def _comentar(cliente, azar, datos):
+    estado, destino = cliente.pedir('POST', f"/receta/{datos['popular'](azar)}/comentar",
+                                    formulario={'contenido': 'Comentario de la prueba de carga'})
+    return estado, estado == 302 and '/receta/' in destino
+
+
+def _login(cliente, azar, datos):
+    estado, destino = cliente.pedir('POST', '/iniciar-sesion', formulario={
+        'email': f"usuario{datos['usuario'](azar)}@ejemplo.com", 'password': PASSWORD
+    })
+    return estado, estado == 302 and '/perfil' in destino
+
+
+OPERACIONES = {
+    'portada': ('GET /', _portada),
+    'navegar': ('GET /receta/<id>', _navegar),
+    'buscar': ('GET /recetas?buscar=', _buscar),
+    'votar': ('POST /api/receta/<id>/votar', _votar),
+    'comentar': ('POST /receta/<id>/comentar', _comentar),
+    'login': ('POST /iniciar-sesion', _login),
+}
+
+
+def leer_mezcla(texto):
+    """Convierte 'navegar=60,buscar=40' en {'navegar': 60.0, 'buscar': 40.0}."""
+    mezcla = {}
+    for parte in texto.split(','):
+        nombre, _, peso = parte.partition('=')
+        nombre = nombre.strip()
+        if nombre not in OPERACIONES:
+            raise ValueError(f"Operación desconocida: {nombre} (válidas: {', '.join(OPERACIONES)})")
+        mezcla[nombre] = float(peso or 1)
+    return mezcla
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+class Registro:
+    """Latencias, errores y códigos de estado por ruta, compartidos entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}
+        self.errores = {}
+        self.codigos = {}
+        self.activo = False
+
+    def anotar(self, ruta, segundos, estado, correcto):
+        if not self.activo:
+            return
+        with self._lock:
+            self.latencias.setdefault(ruta, []).append(segundos)
+            codigos = self.codigos.setdefault(ruta, {})
+            codigos[estado] = codigos.get(estado, 0) + 1
+            if not correcto:
+                self.errores[ruta] = self.errores.get(ruta, 0) + 1
+
+    def resumen(self, duracion):
+        rutas = {}
+        for ruta, latencias in sorted(self.latencias.items()):
+            latencias = sorted(latencias)
+            errores = self.errores.get(ruta, 0)
+            rutas[ruta] = {
+                'pedidos': len(latencias),
+                'por_segundo': round(len(latencias) / duracion, 1),
+                'errores': errores,
+                'tasa_errores': round(errores / len(latencias), 4),
+                'p50_ms': round(statistics.median(latencias) * 1000, 2),
+                'p95_ms': round(percentil(latencias, 0.95) * 1000, 2),
+                'p99_ms': round(percentil(latencias, 0.99) * 1000, 2),
+                'codigos': {str(codigo): n for codigo, n in sorted(self.codigos[ruta].items(), key=str)},
+            }
+        total = sum(r['pedidos'] for r in rutas.values())
+        errores = sum(r['errores'] for r in rutas.values())
+        return {
+            'pedidos': total,
+            'por_segundo': round(total / duracion, 1),
+            'tasa_errores': round(errores / total, 4) if total else 0.0,
+            'rutas': rutas,
+        }
+
+
+def ejecutar(cliente, operacion, azar, datos, registro, inicio):
+    ruta, funcion = OPERACIONES[operacion]
+    try:
+        estado, correcto = funcion(cliente, azar, datos)
+    except Exception as e:
+        estado, correcto = type(e).__name__, False
+    registro.anotar(ruta, time.perf_counter() - inicio, estado, correcto)
+
+
+def cargar(crear_cliente, datos, mezcla, args):
+    """Corre la carga y devuelve el resumen por ruta."""
+    registro = Registro()
+    nombres, pesos = list(mezcla), list(mezcla.values())
+    hilos = args.concurrencia
+    # La ventana (calentamiento y medición) arranca cuando todos los clientes
+    # iniciaron sesión: el primer login puede esperar a que arranque el pool
+    # de contraseñas y no debe comerse el tiempo medido
+    ventana = {}
+
+    def abrir_ventana():
+        ventana['fin_calentamiento'] = time.perf_counter() + args.calentamiento
+        ventana['fin'] = ventana['fin_calentamiento'] + args.segundos
+
+    def preparar(indice):
+        # Cada cliente inicia sesión con su propio usuario antes de medir; si el
+        # servicio de contraseñas está saturado (503), reintenta
+        cliente = crear_cliente()
+        azar = random.Random(args.semilla + indice)
+        propio = dict(datos, usuario=lambda _: indice % datos['usuarios'] + 1)
+        for _ in range(50):
+            if OPERACIONES['login'][1](cliente, azar, propio)[1]:
+                break
+            time.sleep(0.1)
+        listos.wait()
+        return cliente, azar
+
+    def bucle_cerrado(indice):
+        cliente, azar = preparar(indice)
+        while time.perf_counter() < ventana['fin']:
+            operacion = azar.choices(nombres, pesos)[0]
+            ejecutar(cliente, operacion, azar, datos, registro, time.perf_counter())
+        cliente.cerrar()
+
+    pendientes = queue.Queue()
+
+    def consumidor(indice):
+        cliente, azar = preparar(indice)
+        while True:
+            tarea = pendientes.get()
+            if tarea is None:
+                cliente.cerrar()
+                return
+            programado, operacion = tarea
+            ejecutar(cliente, operacion, azar, datos, registro, programado)
+
+    def programador():
+        azar = random.Random(args.semilla)
+        listos.wait()
+        proximo = time.perf_counter()
+        while proximo < ventana['fin']:
+            espera = proximo - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            pendientes.put((proximo, azar.choices(nombres, pesos)[0]))
+            proximo += azar.expovariate(args.tasa)
+        for _ in range(hilos):
+            pendientes.put(None)
+
+    if args.tasa:
+        trabajadores = [threading.Thread(target=consumidor, args=(i,)) for i in range(hilos)]
+        trabajadores.append(threading.Thread(target=programador))
+    else:
+        trabajadores = [threading.Thread(target=bucle_cerrado, args=(i,)) for i in range(hilos)]
+    listos = threading.Barrier(len(trabajadores) + 1, action=abrir_ventana)
+    for hilo in trabajadores:
+        hilo.start()
+
+    listos.wait()
+    time.sleep(max(0.0, ventana['fin_calentamiento'] - time.perf_counter()))
+    registro.activo = True
+    inicio = time.perf_counter()
+    for hilo in trabajadores:
+        hilo.join()
+    # Con tasa fija la cola puede seguir vaciándose después del plazo: la
+    # duración real es la que cuenta para el throughput
+    return registro.resumen(time.perf_counter() - inicio)
+
+
+def preparar_app(ruta):
+    """Apunta la app del proceso a la base generada."""
+    from app import app, cache_datos, cerrar_pools
+    from base_datos.cache import catalogo_etiquetas
+
+    cerrar_pools()
+    cache_datos.invalidar()
+    catalogo_etiquetas.invalidar()
+    app.config['DATABASE'] = ruta
+    app.config['PASSWORD_METODO'] = METODO_PASSWORD
+    return app
+
+
+def iniciar_servidor_wsgi(app):
+    """Levanta el servidor de werkzeug en un puerto libre en un hilo."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class Manejador(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'  # conexiones persistentes
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    servidor = make_server('127.0.0.1', 0, app, threaded=True, request_handler=Manejador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_port}"
+
+
+def datos_de_prueba(ruta):
+    """Ids de recetas populares y cantidad de usuarios de la base generada."""
+    with sqlite3.connect(ruta) as conexion:
+        populares = [fila[0] for fila in conexion.execute(
+            "SELECT id_receta FROM recetas ORDER BY likes + dislikes DESC LIMIT 200")]
+        usuarios = conexion.execute("SELECT COUNT(*) FROM usuario").fetchone()[0]
+    conexion.close()
+    return {
+        'popular': lambda azar: azar.choice(populares),
+        'usuario': lambda azar: azar.randint(1, usuarios),
+        'usuarios': usuarios,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--servidor', choices=('inproceso', 'wsgi'), default='inproceso')
+    parser.add_argument('--url', help="Atacar un servidor ya levantado en lugar de la app del proceso")
+    parser.add_argument('--bd', help="Base creada con benchmarks.generador --password " + PASSWORD
+                                     + " (obligatoria con --url; si no, se genera una)")
+    parser.add_argument('--recetas', type=int, default=5_000, help="Tamaño de la base a generar")
+    parser.add_argument('--mezcla', default=MEZCLA_POR_DEFECTO, help="Pesos por operación")
+    parser.add_argument('--concurrencia', type=int, default=8, help="Clientes (o hilos que atienden la tasa)")
+    parser.add_argument('--tasa', type=float, help="Pedidos por segundo (tasa de llegada fija)")
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--calentamiento', type=float, default=1)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', help="Archivo JSON donde guardar los resultados")
+    parser.add_argument('--json', action='store_true', help='Imprimir el resultado como JSON')
+    args = parser.parse_args()
+    mezcla = leer_mezcla(args.mezcla)
+    if args.url and not args.bd:
+        parser.error("--url necesita --bd con la base que usa el servidor")
+
+    directorio = None
+    ruta = args.bd
+    if not ruta:
+        directorio = tempfile.mkdtemp(prefix='bench_http_')
+        ruta = os.path.join(directorio, 'recetas.db')
+        generar(ruta, args.recetas, semilla=args.semilla, password=PASSWORD, metodo_password=METODO_PASSWORD)
+
+    servidor = None
+    try:
+        datos = datos_de_prueba(ruta)
+        if args.url:
+            url = args.url
+            crear_cliente = lambda: ClienteHTTP(url)
+        else:
+            app = preparar_app(ruta)
+            if args.servidor == 'wsgi':
+                servidor, url = iniciar_servidor_wsgi(app)
+                crear_cliente = lambda: ClienteHTTP(url)
+            else:
+                crear_cliente = lambda: ClienteInProceso(app)
+        resumen = cargar(crear_cliente, datos, mezcla, args)
+    finally:
+        if servidor is not None:
+            servidor.shutdown()
+        if not args.url:
+            from app import cerrar_pools
+            cerrar_pools()
+        if directorio:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    corrida = {
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'servidor': args.url or args.servidor,
+        'modo': f"tasa {args.tasa}/s" if args.tasa else f"concurrencia {args.concurrencia}",
+        'mezcla': mezcla,
+        'segundos': args.segundos,
+        **resumen,
+    }
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(corrida, archivo, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(corrida, indent=2, ensure_ascii=False))
+        return
+
+    print(f"{corrida['modo']}, {corrida['servidor']}: {resumen['pedidos']} pedidos, "
+          f"{resumen['por_segundo']} pedidos/s, {resumen['tasa_errores']:.2%} errores")
+    print(f"{'ruta':<32}{'pedidos/s':>10}{'errores':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for ruta_reporte, r in resumen['rutas'].items():
+        print(f"{ruta_reporte:<32}{r['por_segundo']:>10}{r['errores']:>9}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark de verificación de contraseñas (logins por segundo) según el costo.
+
+Para cada método/costo mide, con varios hilos pidiendo logins a la vez:
+  - logins por segundo y latencia p50/p95 de cada verificación
+  - latencia de una tarea liviana que corre en paralelo (lo que sufren las
+    demás rutas del worker mientras se calculan hashes)
+comparando el cálculo en el hilo del request (procesos=0) con el pool de procesos.
+
+Uso:
+    python -m benchmarks.bench_login --hilos 8 --segundos 3 --procesos 2
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+from base_datos.contrasenas import ServicioContrasenas, ServicioSaturado, hashear
+
+METODOS = ['pbkdf2:sha256:100000', 'pbkdf2:sha256:600000', 'scrypt:16384:8:1', 'scrypt:32768:8:1']
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def correr(metodo, procesos, hilos, segundos):
+    hash_guardado = hashear('contraseña', metodo)
+    servicio = ServicioContrasenas(metodo=metodo, procesos=procesos,
+                                   max_pendientes=max(hilos, 1), timeout=60)
+    if procesos:
+        servicio.verificar(hash_guardado, 'contraseña')  # arrancar los procesos
+
+    latencias, livianas, rechazados = [], [], [0]
+    lock = threading.Lock()
+    fin = time.perf_counter() + segundos
+
+    def loguear():
+        while time.perf_counter() < fin:
+            inicio = time.perf_counter()
+            try:
+                servicio.verificar(hash_guardado, 'contraseña')
+            except ServicioSaturado:
+                with lock:
+                    rechazados[0] += 1
+                continue
+            with lock:
+                latencias.append(time.perf_counter() - inicio)
+
+    def tarea_liviana():
+        while time.perf_counter() < fin:
+            inicio = time.perf_counter()
+            sum(range(2000))
+            livianas.append(time.perf_counter() - inicio)
+            time.sleep(0.005)
+
+    trabajadores = [threading.Thread(target=loguear) for _ in range(hilos)]
+    trabajadores.append(threading.Thread(target=tarea_liviana))
+    for hilo in trabajadores:
+        hilo.start()
+    for hilo in trabajadores:
+        hilo.join()
+    servicio.cerrar()
+
+    return {
+        'metodo': metodo,
+        'procesos': procesos,
+        'logins_por_segundo': round(len(latencias) / segundos, 1),
+        'p50_ms': round(statistics.median(latencias) * 1000, 1) if latencias else 0.0,
+        'p95_ms': round(percentil(latencias, 0.95) * 1000, 1),
+        'liviana_p95_ms': round(percentil(livianas, 0.95) * 1000, 2),
+        'rechazados': rechazados[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hilos', type=int, default=8, help="Logins concurrentes")
+    parser.add_argument('--segundos', type=float, default=3)
+    parser.add_argument('--procesos', type=int, default=2, help="Procesos del pool de hash")
+    parser.add_argument('--metodo', action='append', help="Método a medir (se puede repetir)")
+    parser.add_argument('--json', action='store_true', help='Imprimir el resultado como JSON')
+    args = parser.parse_args()
+
+    resultados = [
+        correr(metodo, procesos, args.hilos, args.segundos)
+        for metodo in (args.metodo or METODOS)
+        for procesos in (0, args.procesos)
+    ]
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+    print(f"{'método':<24}{'procesos':>9}{'logins/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'liviana p95 ms':>16}")
+    for r in resultados:
+        print(f"{r['metodo']:<24}{r['procesos']:>9}{r['logins_por_segundo']:>10}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['liviana_p95_ms']:>16}")
+
+
+if __name__ == '__main__':
+    main()
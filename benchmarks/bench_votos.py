@@ -0,0 +1,152 @@
+"""
+Benchmark de una "tormenta de votos" concurrente.
+
+Compara tres formas de registrar un voto con el perfil WAL y un único escritor:
+  - antes:     el camino anterior (consultar voto, verificar, UPDATE/INSERT,
+               commit y agregar la tabla votos para las estadísticas)
+  - upsert:    Conexion.votar_receta (INSERT ... ON CONFLICT + contadores)
+  - diferido:  EscritorVotosDiferido, que agrupa los votos en una transacción
+
+Uso:
+    python -m benchmarks.bench_votos --hilos 8 --votos 300 [--synchronous FULL]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from base_datos.almacenamiento import PERFIL_POR_DEFECTO
+from base_datos.conexion import Conexion
+from base_datos.pool import PoolConexiones
+from base_datos.votos_diferidos import EscritorVotosDiferido
+
+
+def preparar_base(ruta, recetas, usuarios):
+    with Conexion(ruta) as db:
+        db.crear_todas_las_tablas()
+        db.cursor.executemany(
+            "INSERT INTO usuario (nombre, apellido, email, password) VALUES ('U', 'U', ?, 'x')",
+            [(f"u{i}@bench.com",) for i in range(usuarios)]
+        )
+        db.cursor.executemany(
+            "INSERT INTO recetas (titulo, id_usuario) VALUES (?, 1)",
+            [(f"Receta {i}",) for i in range(recetas)]
+        )
+        db.conexion.commit()
+
+
+def votar_como_antes(db, id_receta, id_usuario, tipo_voto):
+    """Reproduce las sentencias que ejecutaba la ruta de votos antes del upsert."""
+    db.cursor.execute(
+        "SELECT tipo_voto FROM votos WHERE id_receta = ? AND id_usuario = ?", (id_receta, id_usuario)
+    )
+    actual = db.cursor.fetchone()
+    if actual and actual[0] == tipo_voto:
+        tipo_voto = 0
+    db.cursor.execute(
+        "SELECT 1 FROM votos WHERE id_receta = ? AND id_usuario = ?", (id_receta, id_usuario)
+    )
+    if db.cursor.fetchone():
+        db.cursor.execute(
+            "UPDATE votos SET tipo_voto = ? WHERE id_receta = ? AND id_usuario = ?",
+            (tipo_voto, id_receta, id_usuario)
+        )
+    else:
+        db.cursor.execute(
+            "INSERT INTO votos (id_receta, id_usuario, tipo_voto) VALUES (?, ?, ?)",
+            (id_receta, id_usuario, tipo_voto)
+        )
+    db.conexion.commit()
+    db.cursor.execute("""
+        SELECT SUM(CASE WHEN tipo_voto = 1 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN tipo_voto = -1 THEN 1 ELSE 0 END)
+        FROM votos WHERE id_receta = ?
+    """, (id_receta,))
+    db.cursor.fetchone()
+
+
+def correr(modo, hilos, votos, recetas, usuarios, intervalo_ms, synchronous):
+    fd, ruta = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        preparar_base(ruta, recetas, usuarios)
+        perfil = dict(PERFIL_POR_DEFECTO, synchronous=synchronous)
+        pool = PoolConexiones(ruta, tamano=1, timeout=60, perfil=perfil)
+        escritor = None
+        if modo == 'diferido':
+            escritor = EscritorVotosDiferido(lambda: Conexion(pool=pool),
+                                             intervalo=intervalo_ms / 1000, timeout=60)
+
+        def trabajar(semilla):
+            azar = random.Random(semilla)
+            for _ in range(votos):
+                # Pocas recetas populares concentran los votos
+                id_receta = min(int(azar.paretovariate(1.2)), recetas)
+                id_usuario = azar.randint(1, usuarios)
+                tipo_voto = azar.choice((1, -1))
+                if escritor:
+                    escritor.votar(id_receta, id_usuario, tipo_voto, alternar=True)
+                    continue
+                with Conexion(pool=pool) as db:
+                    if modo == 'antes':
+                        votar_como_antes(db, id_receta, id_usuario, tipo_voto)
+                    else:
+                        db.votar_receta(id_receta, id_usuario, tipo_voto, alternar=True)
+
+        inicio = time.perf_counter()
+        trabajadores = [threading.Thread(target=trabajar, args=(i,)) for i in range(hilos)]
+        for hilo in trabajadores:
+            hilo.start()
+        for hilo in trabajadores:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        resultado = {
+            'modo': modo,
+            'votos_por_segundo': round(hilos * votos / duracion, 1),
+            'duracion': round(duracion, 3),
+        }
+        if escritor:
+            escritor.detener()
+            resultado['votos_por_lote'] = round(escritor.votos / max(escritor.lotes, 1), 1)
+        pool.cerrar()
+        return resultado
+    finally:
+        for sufijo in ('', '-wal', '-shm'):
+            if os.path.exists(ruta + sufijo):
+                os.unlink(ruta + sufijo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--votos', type=int, default=300, help="Votos por hilo")
+    parser.add_argument('--recetas', type=int, default=200)
+    parser.add_argument('--usuarios', type=int, default=500)
+    parser.add_argument('--intervalo-ms', type=float, default=0,
+                        help="Espera extra para juntar votos en modo diferido")
+    parser.add_argument('--synchronous', default='NORMAL',
+                        help="PRAGMA synchronous (FULL hace un fsync por commit)")
+    parser.add_argument('--json', action='store_true', help='Imprimir el resultado como JSON')
+    args = parser.parse_args()
+
+    resultados = [
+        correr(modo, args.hilos, args.votos, args.recetas, args.usuarios,
+               args.intervalo_ms, args.synchronous)
+        for modo in ('antes', 'upsert', 'diferido')
+    ]
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+    print(f"{'modo':<10}{'votos/s':>12}{'duración (s)':>15}{'votos/lote':>12}")
+    for r in resultados:
+        print(f"{r['modo']:<10}{r['votos_por_segundo']:>12}{r['duracion']:>15}"
+              f"{r.get('votos_por_lote', 1):>12}")
+
+
+if __name__ == '__main__':
+    main()
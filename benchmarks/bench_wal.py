@@ -0,0 +1,132 @@
+"""
+Benchmark de lecturas concurrentes durante una carga sostenida de escrituras.
+
+Compara el perfil clásico (diario de rollback, como antes) con el perfil WAL
+(lectores de solo lectura y un único escritor). Un hilo escritor inserta
+comentarios y votos sin pausa mientras varios hilos lectores consultan el
+listado y el detalle de recetas.
+
+Uso:
+    python -m benchmarks.bench_wal --segundos 5 --lectores 4
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from base_datos.almacenamiento import PERFIL_CLASICO, PERFIL_POR_DEFECTO
+from base_datos.conexion import Conexion
+from base_datos.pool import PoolConexiones
+
+
+def preparar_base(ruta, perfil, recetas=300):
+    """Crea el esquema y carga un usuario con recetas de prueba."""
+    with Conexion(ruta, perfil=perfil) as db:
+        db.crear_todas_las_tablas()
+        db.cursor.execute(
+            "INSERT INTO usuario (nombre, apellido, email, password) VALUES ('Bench', 'Mark', 'bench@ejemplo.com', 'x')"
+        )
+        id_usuario = db.cursor.lastrowid
+        db.cursor.executemany(
+            """
+            INSERT INTO recetas (titulo, descripcion, ingredientes, instrucciones,
+                                 tiempo_preparacion, porciones, id_usuario)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(f"Receta {i}", "Descripción " * 20, "Ingrediente\n" * 8, "Paso\n" * 6,
+              random.randint(5, 90), random.randint(1, 6), id_usuario)
+             for i in range(recetas)]
+        )
+        db.conexion.commit()
+        return id_usuario
+
+
+def correr(perfil, segundos, lectores, recetas):
+    fd, ruta = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        id_usuario = preparar_base(ruta, perfil, recetas)
+        wal = perfil['journal_mode'].upper() == 'WAL'
+        pool_lectura = PoolConexiones(ruta, tamano=lectores, perfil=perfil, solo_lectura=wal)
+        pool_escritura = PoolConexiones(ruta, tamano=1, perfil=perfil)
+
+        fin = time.monotonic() + segundos
+        lecturas = [0] * lectores
+        errores = [0] * lectores
+        escrituras = [0]
+
+        def escritor():
+            while time.monotonic() < fin:
+                try:
+                    with Conexion(pool=pool_escritura) as db:
+                        id_receta = random.randint(1, recetas)
+                        db.agregar_comentario(id_receta, id_usuario, "Comentario de carga")
+                        db.cursor.execute(
+                            "INSERT OR REPLACE INTO votos (id_receta, id_usuario, tipo_voto) VALUES (?, ?, ?)",
+                            (id_receta, id_usuario, random.choice((1, -1)))
+                        )
+                        db.conexion.commit()
+                        escrituras[0] += 1
+                except sqlite3.OperationalError:
+                    pass
+
+        def lector(indice):
+            while time.monotonic() < fin:
+                try:
+                    with Conexion(pool=pool_lectura) as db:
+                        db.obtener_recetas(limite=10)
+                        db.obtener_receta_por_id(random.randint(1, recetas))
+                        db.obtener_estadisticas_votos(random.randint(1, recetas))
+                    lecturas[indice] += 1
+                except sqlite3.OperationalError:
+                    errores[indice] += 1
+
+        hilos = [threading.Thread(target=escritor)]
+        hilos += [threading.Thread(target=lector, args=(i,)) for i in range(lectores)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        pool_lectura.cerrar()
+        pool_escritura.cerrar()
+        return {
+            'journal_mode': perfil['journal_mode'],
+            'lecturas_por_segundo': round(sum(lecturas) / segundos, 1),
+            'escrituras_por_segundo': round(escrituras[0] / segundos, 1),
+            'errores_lectura': sum(errores),
+        }
+    finally:
+        for sufijo in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(ruta + sufijo):
+                os.unlink(ruta + sufijo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--lectores', type=int, default=4)
+    parser.add_argument('--recetas', type=int, default=300)
+    parser.add_argument('--json', action='store_true', help='Imprimir el resultado como JSON')
+    args = parser.parse_args()
+
+    resultados = [
+        correr(PERFIL_CLASICO, args.segundos, args.lectores, args.recetas),
+        correr(PERFIL_POR_DEFECTO, args.segundos, args.lectores, args.recetas),
+    ]
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+    print(f"{'modo':<10}{'lecturas/s':>14}{'escrituras/s':>16}{'errores':>10}")
+    for r in resultados:
+        print(f"{r['journal_mode']:<10}{r['lecturas_por_segundo']:>14}"
+              f"{r['escrituras_por_segundo']:>16}{r['errores_lectura']:>10}")
+
+
+if __name__ == '__main__':
+    main()
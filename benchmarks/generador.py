@@ -0,0 +1,206 @@
+"""
+Generador determinístico de bases de datos sintéticas.
+
+Con la misma semilla y los mismos tamaños produce siempre los mismos datos. La
+actividad está sesgada como en un sitio real: pocos usuarios publican la mayoría
+de las recetas, pocas recetas concentran los votos y comentarios (distribución
+de Pareto) y las etiquetas siguen una distribución de Zipf.
+
+Uso:
+    python -m benchmarks.generador --bd /tmp/recetas_10k.db --recetas 10000 [--semilla 42]
+"""
+import argparse
+import datetime
+import itertools
+import os
+import random
+import time
+
+from base_datos.conexion import Conexion
+from base_datos.contrasenas import METODO_POR_DEFECTO, hashear
+
+# Tamaños predefinidos: usuarios, recetas, votos y comentarios en proporción
+TAMANOS = {
+    'chico': 1_000,
+    'mediano': 10_000,
+    'grande': 100_000,
+}
+
+ETIQUETAS = [
+    "Sin TACC", "Vegetariano", "Vegano", "Sin Lactosa", "Sin Huevo", "Apto Diabéticos",
+    "Bajo en Sodio", "Sin Azúcar", "Keto", "Alto en Proteínas", "Rápido", "Económico",
+    "Picante", "Postre", "Desayuno", "Horno", "Parrilla", "Sopa", "Ensalada", "Pastas",
+    "Mariscos", "Pollo", "Carne", "Legumbres", "Navidad", "Para niños", "Saludable",
+    "Sin Gluten", "Fitness", "Tradicional",
+]
+
+INGREDIENTES = [
+    "harina", "huevo", "leche", "manteca", "azúcar", "sal", "pimienta", "aceite de oliva",
+    "ajo", "cebolla", "tomate", "pollo", "carne picada", "arroz", "fideos", "queso",
+    "crema", "limón", "perejil", "zanahoria", "papa", "batata", "lentejas", "garbanzos",
+    "espinaca", "morrón", "chocolate", "frutillas", "banana", "miel", "levadura", "comino",
+]
+
+PLATOS = ["Tarta", "Guiso", "Ensalada", "Sopa", "Torta", "Pastel", "Salteado", "Budín",
+          "Milanesa", "Empanadas", "Risotto", "Curry", "Wok", "Pizza", "Ñoquis", "Flan"]
+
+COMENTARIOS = ["¡Riquísima!", "La hice dos veces.", "Le agregué más sal.", "Muy fácil.",
+               "A mis hijos les encantó.", "Quedó un poco seca.", "La mejor receta que probé."]
+
+FECHA_BASE = datetime.datetime(2024, 1, 1)
+
+
+def tamanos_por_recetas(recetas):
+    """Cantidades de cada entidad proporcionales a la cantidad de recetas."""
+    return {
+        'usuarios': max(10, recetas // 5),
+        'etiquetas': len(ETIQUETAS),
+        'recetas': recetas,
+        'votos': recetas * 8,
+        'comentarios': recetas * 3,
+    }
+
+
+def _fecha(azar, dias=365):
+    instante = FECHA_BASE + datetime.timedelta(seconds=azar.randrange(dias * 86400))
+    return instante.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _zipf(azar, ids, exponente=1.0):
+    """
+    Devuelve una función que elige ids con probabilidad proporcional a
+    1 / rango^exponente. Los ids se mezclan antes para que los populares no sean
+    siempre los primeros creados.
+    """
+    ids = list(ids)
+    azar.shuffle(ids)
+    acumulados = list(itertools.accumulate(1 / rango ** exponente for rango in range(1, len(ids) + 1)))
+    return lambda cantidad: azar.choices(ids, cum_weights=acumulados, k=cantidad)
+
+
+def generar(ruta, recetas=1_000, usuarios=None, etiquetas=None, votos=None, comentarios=None,
+            semilla=42, lote=5_000, password=None, metodo_password=METODO_POR_DEFECTO):
+    """
+    Crea (o reemplaza) una base con datos sintéticos.
+
+    Los usuarios son usuario1@ejemplo.com, usuario2@ejemplo.com, ... Si se indica
+    `password`, todos pueden iniciar sesión con ella (el hash se calcula una sola
+    vez y se comparte); si no, tienen un hash inválido.
+
+    Returns:
+        dict: Cantidades generadas de cada entidad (los votos repetidos se
+        descartan, así que pueden ser menos que los pedidos) y segundos empleados
+    """
+    tamanos = tamanos_por_recetas(recetas)
+    tamanos.update({clave: valor for clave, valor in
+                    (('usuarios', usuarios), ('etiquetas', etiquetas),
+                     ('votos', votos), ('comentarios', comentarios))
+                    if valor is not None})
+    azar = random.Random(semilla)
+    inicio = time.perf_counter()
+
+    for sufijo in ('', '-wal', '-shm'):
+        if os.path.exists(ruta + sufijo):
+            os.unlink(ruta + sufijo)
+
+    with Conexion(ruta) as db:
+        db.crear_todas_las_tablas()
+        conexion = db.conexion
+        ids_usuario = range(1, tamanos['usuarios'] + 1)
+        ids_receta = range(1, tamanos['recetas'] + 1)
+        autores = _zipf(azar, ids_usuario)
+        populares = _zipf(azar, ids_receta, 0.8)
+        activos = _zipf(azar, ids_usuario, 0.6)
+
+        # Un único hash para todos evita calcular miles de hashes caros
+        hash_password = hashear(password, metodo_password) if password else 'x'
+        conexion.executemany(
+            "INSERT INTO usuario (nombre, apellido, email, password, fecha_registro) VALUES (?, ?, ?, ?, ?)",
+            [(f"Usuario{i}", f"Apellido{i % 97}", f"usuario{i}@ejemplo.com", hash_password, _fecha(azar, 730))
+             for i in ids_usuario]
+        )
+        nombres = ETIQUETAS + [f"Etiqueta {i}" for i in range(len(ETIQUETAS) + 1, tamanos['etiquetas'] + 1)]
+        conexion.executemany("INSERT INTO etiquetas (nombre) VALUES (?)",
+                             [(nombre,) for nombre in nombres[:tamanos['etiquetas']]])
+
+        # Zipf sobre las etiquetas: la primera es mucho más frecuente que la última
+        pesos_etiquetas = [1 / rango for rango in range(1, tamanos['etiquetas'] + 1)]
+        for desde in range(0, tamanos['recetas'], lote):
+            filas, enlaces = [], []
+            bloque = ids_receta[desde:desde + lote]
+            for id_receta, id_usuario in zip(bloque, autores(len(bloque))):
+                ingredientes = azar.sample(INGREDIENTES, azar.randint(3, 9))
+                titulo = f"{azar.choice(PLATOS)} de {ingredientes[0]} con {ingredientes[1]} {id_receta}"
+                filas.append((
+                    id_receta, titulo,
+                    f"Receta casera de {ingredientes[0]}, ideal para compartir.",
+                    '\n'.join(f"{azar.randint(1, 500)}g de {i}" for i in ingredientes),
+                    '\n'.join(f"{paso}. Paso con {i}." for paso, i in enumerate(ingredientes, 1)),
+                    azar.choice((10, 15, 20, 30, 45, 60, 90)), azar.randint(1, 8),
+                    id_usuario, _fecha(azar)
+                ))
+                elegidas = set(azar.choices(range(1, tamanos['etiquetas'] + 1), pesos_etiquetas,
+                                            k=azar.randint(0, 4)))
+                enlaces.extend((id_receta, id_etiqueta) for id_etiqueta in elegidas)
+            conexion.executemany("""
+                INSERT INTO recetas (id_receta, titulo, descripcion, ingredientes, instrucciones,
+                                     tiempo_preparacion, porciones, id_usuario, fecha_creacion)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, filas)
+            conexion.executemany("INSERT INTO receta_etiqueta (id_receta, id_etiqueta) VALUES (?, ?)", enlaces)
+            conexion.commit()
+
+        # Votos y comentarios concentrados en pocas recetas populares y usuarios
+        # activos. Un usuario vota una vez por receta: los repetidos se descartan.
+        for desde in range(0, tamanos['votos'], lote):
+            cantidad = min(lote, tamanos['votos'] - desde)
+            conexion.executemany(
+                "INSERT OR IGNORE INTO votos (id_receta, id_usuario, tipo_voto, fecha_creacion) VALUES (?, ?, ?, ?)",
+                [(id_receta, id_usuario, 1 if azar.random() < 0.8 else -1, _fecha(azar))
+                 for id_receta, id_usuario in zip(populares(cantidad), activos(cantidad))]
+            )
+            conexion.commit()
+        for desde in range(0, tamanos['comentarios'], lote):
+            cantidad = min(lote, tamanos['comentarios'] - desde)
+            conexion.executemany(
+                "INSERT INTO comentarios (descripcion, id_usuario, id_receta, fecha_creacion) VALUES (?, ?, ?, ?)",
+                [(f"{azar.choice(COMENTARIOS)} ({desde + i})", id_usuario, id_receta, _fecha(azar))
+                 for i, (id_receta, id_usuario) in enumerate(zip(populares(cantidad), activos(cantidad)))]
+            )
+            conexion.commit()
+
+        db.reconstruir_recetas_relacionadas()
+        db.reconstruir_indice_ingredientes()
+        # Los triggers anotan la hora real de cada cambio: fijarla a la de los
+        # datos generados para que la misma semilla dé la misma base
+        conexion.execute("UPDATE recetas SET fecha_modificacion = NULL")
+        conexion.execute("UPDATE versiones_cache SET actualizado = (SELECT MAX(fecha_creacion) FROM recetas)")
+        conexion.execute("ANALYZE")
+        conexion.commit()
+        tamanos['votos'] = conexion.execute("SELECT COUNT(*) FROM votos").fetchone()[0]
+
+    tamanos['segundos'] = round(time.perf_counter() - inicio, 3)
+    return tamanos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bd', required=True, help="Ruta de la base a crear (se reemplaza)")
+    parser.add_argument('--recetas', type=int, default=1_000)
+    parser.add_argument('--usuarios', type=int)
+    parser.add_argument('--etiquetas', type=int)
+    parser.add_argument('--votos', type=int)
+    parser.add_argument('--comentarios', type=int)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--password', help="Contraseña común de todos los usuarios")
+    parser.add_argument('--metodo-password', default=METODO_POR_DEFECTO)
+    args = parser.parse_args()
+
+    resultado = generar(args.bd, args.recetas, args.usuarios, args.etiquetas,
+                        args.votos, args.comentarios, args.semilla,
+                        password=args.password, metodo_password=args.metodo_password)
+    print(', '.join(f"{clave}: {valor}" for clave, valor in resultado.items()))
+
+
+if __name__ == '__main__':
+    main()
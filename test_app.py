@@ -1,8 +1,52 @@
 import unittest
+import gzip
+import hashlib
+import io
+import json
 import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
 import tempfile
-from app import app, get_db_connection
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from unittest import mock
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+# Huella de la base versionada antes de importar la app: ni la importación ni las
+# pruebas (que usan bases temporales) deben modificarla
+RUTA_BD_VERSIONADA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'base_datos', 'recetas.db')
+
+def huella_archivo(ruta):
+    with open(ruta, 'rb') as archivo:
+        return hashlib.sha256(archivo.read()).hexdigest()
+
+HUELLA_BD_VERSIONADA = huella_archivo(RUTA_BD_VERSIONADA)
+
+from app import app, inicializar_base_datos, get_db_connection, obtener_pool, cerrar_pools, cache_datos, indices_despensa, indices_filtros, recursos_estaticos
+from base_datos.metricas import Metricas
+from base_datos.cache import catalogo_etiquetas, facetas_etiquetas
 from base_datos.conexion import Conexion
+from base_datos.pool import PoolConexiones, PoolAgotado
+from base_datos.paginacion import codificar_cursor
+from base_datos.migraciones import version_actual, version_objetivo
+from base_datos.votos_diferidos import EscritorVotosDiferido, EscritorSaturado
+from base_datos.contrasenas import ServicioContrasenas, ServicioSaturado, necesita_rehash
+from base_datos.importador import ImportadorRecetas
+from base_datos.ingredientes import parsear_linea
+from base_datos.despensa import sumar_bitsets, posiciones_con_cuenta
+from base_datos.filtros import Bitmap
+from base_datos.relacionadas import actualizar_relacionadas
+from base_datos import estaticos
+from base_datos.compresion import MiddlewareCompresion, elegir_codificacion
+from benchmarks.generador import generar
+from benchmarks.bench_conexion import metodos_sin_medir
+from benchmarks.bench_http import ClienteInProceso, PASSWORD, METODO_PASSWORD, cargar, datos_de_prueba, leer_mezcla
 
 class TestRecipeApp(unittest.TestCase):
     def setUp(self):
@@ -18,8 +62,74 @@ class TestRecipeApp(unittest.TestCase):
     
     def tearDown(self):
         # Limpiar después de las pruebas
+        cerrar_pools()
+        cache_datos.invalidar()
+        catalogo_etiquetas.invalidar()
+        facetas_etiquetas.invalidar()
+        indices_despensa.clear()
+        indices_filtros.clear()
         os.close(self.db_fd)
         os.unlink(app.config['DATABASE'])
+        for sufijo in ('-wal', '-shm'):
+            if os.path.exists(app.config['DATABASE'] + sufijo):
+                os.unlink(app.config['DATABASE'] + sufijo)
+
+    def crear_recetas_prueba(self, recetas):
+        """Inserta un usuario y las recetas indicadas (diccionarios); devuelve sus IDs"""
+        with get_db_connection() as db:
+            db.cursor.execute(
+                "INSERT OR IGNORE INTO usuario (nombre, apellido, email, password) VALUES ('Chef', 'Prueba', 'chef@prueba.com', 'x')"
+            )
+            db.cursor.execute("SELECT id_usuario FROM usuario WHERE email = 'chef@prueba.com'")
+            id_usuario = db.cursor.fetchone()[0]
+            ids = []
+            for receta in recetas:
+                db.cursor.execute("""
+                    INSERT INTO recetas (titulo, descripcion, ingredientes, instrucciones,
+                                         tiempo_preparacion, porciones, id_usuario)
+                    VALUES (?, ?, ?, ?, 10, 2, ?)
+                """, (
+                    receta['titulo'],
+                    receta.get('descripcion', ''),
+                    receta.get('ingredientes', ''),
+                    receta.get('instrucciones', ''),
+                    id_usuario
+                ))
+                ids.append(db.cursor.lastrowid)
+            db.conexion.commit()
+        return ids
+
+    def contar_sentencias(self, url, headers=None, codigo=200):
+        """Hace un GET a la URL y devuelve las sentencias SQL que ejecutó el request"""
+        sentencias = []
+        obtener_original = PoolConexiones.obtener
+
+        def obtener_con_traza(pool, *args, **kwargs):
+            conexion = obtener_original(pool, *args, **kwargs)
+            conexion.set_trace_callback(sentencias.append)
+            return conexion
+
+        with mock.patch.object(PoolConexiones, 'obtener', obtener_con_traza):
+            response = self.app.get(url, headers=headers)
+        self.assertEqual(response.status_code, codigo)
+        for pool in (obtener_pool(), obtener_pool(solo_lectura=True)):
+            with Conexion(pool=pool) as db:
+                db.conexion.set_trace_callback(None)
+        return sentencias
+
+    def etiquetar_recetas(self, ids, nombres):
+        """Asigna todas las etiquetas indicadas a cada una de las recetas"""
+        with get_db_connection() as db:
+            for nombre in nombres:
+                db.cursor.execute("INSERT OR IGNORE INTO etiquetas (nombre) VALUES (?)", (nombre,))
+                db.cursor.execute("SELECT id_etiqueta FROM etiquetas WHERE nombre = ?", (nombre,))
+                id_etiqueta = db.cursor.fetchone()[0]
+                for id_receta in ids:
+                    db.cursor.execute(
+                        "INSERT INTO receta_etiqueta (id_receta, id_etiqueta) VALUES (?, ?)",
+                        (id_receta, id_etiqueta)
+                    )
+            db.conexion.commit()
 
     def test_landing_page(self):
         """Prueba que la página principal cargue correctamente"""
@@ -94,5 +204,1114 @@ class TestRecipeApp(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'Receta de prueba', response.data)
 
+    def test_pool_reutiliza_conexiones(self):
+        """Prueba que el pool reutilice la misma conexión física entre usos"""
+        with get_db_connection() as db:
+            primera = db.conexion
+        with get_db_connection() as db:
+            self.assertIs(db.conexion, primera)
+            self.assertEqual(db.cursor.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+
+        estadisticas = obtener_pool().estadisticas()
+        self.assertEqual(estadisticas['abiertas'], 1)
+        self.assertEqual(estadisticas['en_uso'], 0)
+        self.assertGreaterEqual(estadisticas['prestamos'], 2)
+
+    def test_pool_agotado(self):
+        """Prueba que el pool respete su tamaño y tiempo de espera"""
+        pool = PoolConexiones(app.config['DATABASE'], tamano=1, timeout=0.05)
+        try:
+            with Conexion(pool=pool):
+                with self.assertRaises(PoolAgotado):
+                    pool.obtener()
+            self.assertEqual(pool.estadisticas()['agotados'], 1)
+            with Conexion(pool=pool) as db:
+                self.assertIsNotNone(db.cursor.execute("SELECT 1").fetchone())
+        finally:
+            pool.cerrar()
+
+    def test_pool_recicla_conexiones_vencidas(self):
+        """Prueba que el pool recicle conexiones que superan sus usos máximos"""
+        pool = PoolConexiones(app.config['DATABASE'], tamano=1, max_usos=1)
+        try:
+            with Conexion(pool=pool) as db:
+                primera = db.conexion
+            with Conexion(pool=pool) as db:
+                self.assertIsNot(db.conexion, primera)
+            self.assertGreaterEqual(pool.estadisticas()['recicladas'], 1)
+        finally:
+            pool.cerrar()
+
+    def test_lectores_y_escritor_separados(self):
+        """Prueba el modo WAL y que las lecturas usen conexiones de solo lectura"""
+        with get_db_connection() as db:
+            modo = db.cursor.execute("PRAGMA journal_mode").fetchone()[0]
+            self.assertEqual(modo.lower(), 'wal')
+            db.cursor.execute("INSERT INTO etiquetas (nombre) VALUES ('Prueba WAL')")
+            db.conexion.commit()
+
+        with get_db_connection(solo_lectura=True) as db:
+            nombres = [e['nombre'] for e in db.obtener_todas_etiquetas()]
+            self.assertIn('Prueba WAL', nombres)
+            with self.assertRaises(sqlite3.OperationalError):
+                db.cursor.execute("INSERT INTO etiquetas (nombre) VALUES ('No permitida')")
+
+    def test_busqueda_texto_completo(self):
+        """Prueba la búsqueda FTS5: prefijos, acentos, ranking por título y triggers"""
+        _, id_ensalada, id_torta = self.crear_recetas_prueba([
+            {'titulo': 'Pollo grillado', 'ingredientes': 'Pollo\nLechuga para ensalada'},
+            {'titulo': 'Ensalada César', 'descripcion': 'Fresca y liviana'},
+            {'titulo': 'Torta de chocolate', 'descripcion': 'Postre <b>clásico</b>'},
+        ])
+        with get_db_connection(solo_lectura=True) as db:
+            recetas = db.obtener_recetas(busqueda='ensal')
+            self.assertEqual([r['titulo'] for r in recetas], ['Ensalada César', 'Pollo grillado'])
+            self.assertIn('\x02', recetas[0]['titulo_resaltado'])
+            self.assertEqual(len(db.obtener_recetas(busqueda='cesar')), 1)
+            self.assertEqual(db.obtener_recetas(busqueda='"; DROP'), [])
+
+        with get_db_connection() as db:
+            db.cursor.execute("UPDATE recetas SET titulo = 'Torta de limón' WHERE id_receta = ?", (id_torta,))
+            db.cursor.execute("DELETE FROM recetas WHERE id_receta = ?", (id_ensalada,))
+            db.conexion.commit()
+        with get_db_connection(solo_lectura=True) as db:
+            self.assertEqual(len(db.obtener_recetas(busqueda='limon')), 1)
+            self.assertEqual(len(db.obtener_recetas(busqueda='chocolate')), 0)
+            self.assertEqual(len(db.obtener_recetas(busqueda='cesar')), 0)
+
+        response = self.app.get('/recetas?buscar=postre')
+        self.assertIn(b'<mark>Postre</mark>', response.data)
+        self.assertIn(b'&lt;b&gt;', response.data)
+
+    def test_etiquetas_por_lotes_sin_n_mas_1(self):
+        """Prueba que la cantidad de consultas no crezca con la cantidad de recetas"""
+        ids = self.crear_recetas_prueba([{'titulo': f'Receta {i}'} for i in range(2)])
+        self.etiquetar_recetas(ids, ['Vegano', 'Sin TACC'])
+        consultas_pocas = {
+            url: len(self.contar_sentencias(url))
+            for url in ('/', '/recetas', f'/receta/{ids[0]}')
+        }
+
+        otras = self.crear_recetas_prueba([{'titulo': f'Otra {i}'} for i in range(8)])
+        self.etiquetar_recetas(otras, ['Vegano', 'Keto'])
+        for url, cantidad in consultas_pocas.items():
+            self.assertLessEqual(len(self.contar_sentencias(url)), cantidad, url)
+
+        with get_db_connection(solo_lectura=True) as db:
+            recetas = db.obtener_recetas(etiqueta='Keto')
+            self.assertEqual(len(recetas), 8)
+            self.assertEqual(sorted(e['nombre'] for e in recetas[0]['etiquetas']), ['Keto', 'Vegano'])
+            receta = db.obtener_receta_por_id(ids[0])
+            self.assertEqual(sorted(e['nombre'] for e in receta['etiquetas']), ['Sin TACC', 'Vegano'])
+
+    def test_paginacion_por_keyset(self):
+        """Prueba que el listado JSON recorra todas las recetas sin repetir ni saltear"""
+        ids = self.crear_recetas_prueba([
+            {'titulo': f'Guiso {i}' if i % 2 else f'Tarta {i}'} for i in range(25)
+        ])
+        self.etiquetar_recetas(ids[:7], ['Vegano'])
+
+        def recorrer(url):
+            vistos = []
+            while url:
+                data = json.loads(self.app.get(url).data)
+                self.assertLessEqual(len(data['recetas']), 10)
+                vistos.extend(r['id_receta'] for r in data['recetas'])
+                url = data['siguiente_url']
+            return vistos
+
+        # Todas las recetas comparten fecha: el desempate por ID mantiene el orden estable
+        self.assertEqual(recorrer('/api/recetas?limite=10'), sorted(ids, reverse=True))
+        self.assertEqual(sorted(recorrer('/api/recetas?limite=10&buscar=guiso')), ids[1::2])
+        self.assertEqual(sorted(recorrer('/api/recetas?limite=3&etiqueta=Vegano')), ids[:7])
+
+        self.assertEqual(self.app.get('/api/recetas?cursor=basura').status_code, 400)
+        self.assertEqual(self.app.get('/api/recetas?limite=0').status_code, 400)
+        # Cursores bien codificados pero con otra cantidad o tipo de valores
+        for malo in (codificar_cursor('fecha', 1), codificar_cursor('fecha', {}, 1),
+                     codificar_cursor('fecha', '2024-01-01', True), codificar_cursor('fecha', 'x', 1, 2)):
+            self.assertEqual(self.app.get(f'/api/recetas?cursor={malo}').status_code, 400)
+            self.assertEqual(self.app.get(f'/recetas?cursor={malo}').status_code, 200)
+        self.assertEqual(self.app.get(f"/api/recetas?buscar=guiso&cursor={codificar_cursor('rango', 1)}").status_code, 400)
+
+        response = self.app.get('/recetas')
+        self.assertIn(b'cursor=', response.data)
+        self.assertEqual(self.app.get('/recetas?cursor=basura').status_code, 200)
+
+    def test_migraciones_actualizan_base_existente(self):
+        """Prueba que una base sin migraciones se actualice en el lugar y sin repetir pasos"""
+        fd, ruta = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            with Conexion(ruta) as db:
+                db.crear_esquema_base()
+                db.cursor.execute(
+                    "INSERT INTO usuario (nombre, apellido, email, password) VALUES ('A', 'B', 'a@b.com', 'x')"
+                )
+                db.cursor.execute(
+                    "INSERT INTO recetas (titulo, ingredientes, id_usuario) VALUES ('Receta previa', '2 cebollas', 1)"
+                )
+                db.conexion.commit()
+                self.assertEqual(version_actual(db.conexion), 0)
+
+                aplicadas = db.aplicar_migraciones()
+                self.assertEqual(aplicadas, list(range(1, version_objetivo() + 1)))
+                self.assertEqual(db.aplicar_migraciones(), [])
+                self.assertEqual(version_actual(db.conexion), version_objetivo())
+
+                # Los datos previos quedan indexados para la búsqueda
+                self.assertEqual(len(db.obtener_recetas(busqueda='previa')), 1)
+                # ...y sus ingredientes, en el índice estructurado
+                self.assertEqual(len(db.obtener_recetas(ingrediente='cebolla')), 1)
+
+                # El listado usa el índice en lugar de ordenar en un B-tree temporal
+                query, params, _ = db._consulta_recetas()
+                db.cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+                plan = ' '.join(row[3] for row in db.cursor.fetchall())
+                self.assertIn('idx_recetas_fecha', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+        finally:
+            for sufijo in ('', '-wal', '-shm'):
+                if os.path.exists(ruta + sufijo):
+                    os.unlink(ruta + sufijo)
+
+    def test_inicializar_base_datos_sin_efectos_al_importar(self):
+        # Importar app no migra ni escribe la base versionada
+        self.assertEqual(huella_archivo(RUTA_BD_VERSIONADA), HUELLA_BD_VERSIONADA)
+
+        # La inicialización explícita crea la base configurada, con el esquema al día
+        original = app.config['DATABASE']
+        directorio = tempfile.mkdtemp()
+        app.config['DATABASE'] = os.path.join(directorio, 'nueva.db')
+        try:
+            with redirect_stdout(io.StringIO()):
+                inicializar_base_datos()
+            with sqlite3.connect(app.config['DATABASE']) as conexion:
+                self.assertEqual(version_actual(conexion), version_objetivo())
+                self.assertEqual(conexion.execute(
+                    "SELECT COUNT(*) FROM usuario WHERE email = 'admin@example.com'").fetchone()[0], 1)
+            conexion.close()
+        finally:
+            cerrar_pools()
+            app.config['DATABASE'] = original
+            shutil.rmtree(directorio, ignore_errors=True)
+        self.assertEqual(huella_archivo(RUTA_BD_VERSIONADA), HUELLA_BD_VERSIONADA)
+
+    def test_contadores_de_votos(self):
+        """Prueba que los triggers mantengan los contadores y que la reparación los recalcule"""
+        id_a, id_b = self.crear_recetas_prueba([{'titulo': 'A'}, {'titulo': 'B'}])
+        with get_db_connection() as db:
+            for email in ('v1@x.com', 'v2@x.com', 'v3@x.com'):
+                db.cursor.execute(
+                    "INSERT INTO usuario (nombre, apellido, email, password) VALUES ('V', 'V', ?, 'x')",
+                    (email,)
+                )
+            db.cursor.executemany(
+                "INSERT INTO votos (id_receta, id_usuario, tipo_voto) VALUES (?, ?, ?)",
+                [(id_a, 2, 1), (id_a, 3, 1), (id_a, 4, -1), (id_b, 2, 1)]
+            )
+            db.cursor.execute("UPDATE votos SET tipo_voto = -1 WHERE id_receta = ? AND id_usuario = 2", (id_a,))
+            db.cursor.execute("DELETE FROM votos WHERE id_receta = ? AND id_usuario = 2", (id_b,))
+            db.cursor.execute(
+                "INSERT OR REPLACE INTO votos (id_receta, id_usuario, tipo_voto) VALUES (?, 3, -1)", (id_a,)
+            )
+            db.conexion.commit()
+
+            self.assertEqual(db.obtener_estadisticas_votos(id_a), {'likes': 0, 'dislikes': 3})
+            self.assertEqual(db.obtener_estadisticas_votos(id_b), {'likes': 0, 'dislikes': 0})
+            self.assertEqual(db.verificar_contadores_votos(), [])
+
+            # Corromper un contador y repararlo
+            db.cursor.execute("UPDATE recetas SET likes = 42 WHERE id_receta = ?", (id_b,))
+            db.conexion.commit()
+            self.assertEqual([f['id_receta'] for f in db.verificar_contadores_votos()], [id_b])
+            self.assertEqual(db.reparar_contadores_votos(), 1)
+            self.assertEqual(db.obtener_estadisticas_votos(id_b), {'likes': 0, 'dislikes': 0})
+
+        response = self.app.get(f'/receta/{id_a}')
+        self.assertIn(b'<span class="dislike-count">3</span>', response.data)
+
+    def test_votar_receta_api(self):
+        """Prueba el voto por API: upsert, alternar, quitar y receta inexistente"""
+        id_receta, = self.crear_recetas_prueba([{'titulo': 'Votable'}])
+        with self.app.session_transaction() as sess:
+            sess['user_id'] = 1
+
+        def votar(tipo, receta=id_receta):
+            return self.app.post(f'/api/receta/{receta}/votar', json={'tipo_voto': tipo})
+
+        self.assertEqual(votar(1).get_json(), {'success': True, 'likes': 1, 'dislikes': 0, 'mi_voto': 1})
+        self.assertEqual(votar(-1).get_json()['dislikes'], 1)
+        self.assertEqual(votar(-1).get_json(), {'success': True, 'likes': 0, 'dislikes': 0, 'mi_voto': 0})
+        # Alternar dos veces no deja filas con tipo_voto = 0
+        self.assertEqual(votar(1).get_json()['mi_voto'], 1)
+        self.assertEqual(votar(1).get_json()['mi_voto'], 0)
+        with get_db_connection(solo_lectura=True) as db:
+            db.cursor.execute("SELECT COUNT(*) FROM votos WHERE id_receta = ?", (id_receta,))
+            self.assertEqual(db.cursor.fetchone()[0], 0)
+        votar(1)
+        self.assertEqual(votar(0).get_json()['mi_voto'], 0)
+        self.assertEqual(votar(5).status_code, 400)
+        self.assertEqual(votar(1, receta=9999).status_code, 404)
+
+    def test_get_condicional_con_etag(self):
+        """Prueba ETag/Last-Modified de la API de lectura y el 304 sin consultas pesadas"""
+        id_receta, id_otra = self.crear_recetas_prueba([
+            {'titulo': 'Condicional', 'ingredientes': '2 huevos'}, {'titulo': 'Otra'}
+        ])
+        self.etiquetar_recetas([id_receta], ['Rápido'])
+        url = f'/api/receta/{id_receta}'
+
+        response = self.app.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['titulo'], 'Condicional')
+        self.assertEqual(response.get_json()['etiquetas'][0]['nombre'], 'Rápido')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        etag, modificado = response.headers['ETag'], response.headers['Last-Modified']
+
+        # Con el ETag vigente: 304 sin cuerpo y sin leer la receta
+        sentencias = self.contar_sentencias(url, headers={'If-None-Match': etag}, codigo=304)
+        self.assertFalse([s for s in sentencias if 'json_group_array' in s or 'receta_has_ingrediente' in s])
+        self.assertEqual(self.app.get(url, headers={'If-None-Match': etag}).data, b'')
+        self.assertEqual(self.app.get(url, headers={'If-Modified-Since': modificado}).status_code, 304)
+        self.assertEqual(self.app.get(url, headers={'If-Modified-Since': 'Mon, 01 Jan 2001 00:00:00 GMT'})
+                         .status_code, 200)
+        # If-None-Match manda sobre If-Modified-Since
+        self.assertEqual(self.app.get(url, headers={'If-None-Match': '"otro"', 'If-Modified-Since': modificado})
+                         .status_code, 200)
+
+        listado = self.app.get('/api/recetas')
+        votos = self.app.get(f'/api/receta/{id_receta}/votos')
+        etiquetas = self.app.get('/api/etiquetas')
+        self.assertEqual(votos.get_json(), {'likes': 0, 'dislikes': 0})
+        self.assertEqual([e['nombre'] for e in etiquetas.get_json()['etiquetas']], ['Rápido'])
+        for response, ruta in ((listado, '/api/recetas'), (votos, f'/api/receta/{id_receta}/votos'),
+                               (etiquetas, '/api/etiquetas')):
+            self.assertEqual(self.app.get(ruta, headers={'If-None-Match': response.headers['ETag']})
+                             .status_code, 304)
+
+        def vigente(ruta, response):
+            return self.app.get(ruta, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+        # Un voto cambia la receta, sus votos y el listado (que muestra los contadores)
+        with self.app.session_transaction() as sess:
+            sess['user_id'] = 1
+        self.app.post(f'/api/receta/{id_receta}/votar', json={'tipo_voto': 1})
+        self.assertNotEqual(self.app.get(url).headers['ETag'], etag)
+        self.assertFalse(vigente(f'/api/receta/{id_receta}/votos', votos))
+        self.assertFalse(vigente('/api/recetas', listado))
+        self.assertTrue(vigente('/api/etiquetas', etiquetas))
+        self.assertEqual(self.app.get(f'/api/receta/{id_receta}/votos').get_json()['likes'], 1)
+
+        # Etiquetar otra receta no cambia esta, pero sí el catálogo de etiquetas
+        detalle = self.app.get(url)
+        self.etiquetar_recetas([id_otra], ['Rápido'])
+        self.assertTrue(vigente(url, detalle))
+        self.assertFalse(vigente('/api/etiquetas', etiquetas))
+        self.etiquetar_recetas([id_receta], ['Vegano'])
+        self.assertFalse(vigente(url, detalle))
+        detalle = self.app.get(url)
+        with get_db_connection() as db:
+            db.cursor.execute("UPDATE etiquetas SET nombre = 'Veggie' WHERE nombre = 'Vegano'")
+            db.conexion.commit()
+        self.assertFalse(vigente(url, detalle))
+        self.assertIn('Veggie', [e['nombre'] for e in self.app.get(url).get_json()['etiquetas']])
+
+        self.assertEqual(self.app.get('/api/receta/9999').status_code, 404)
+        self.assertEqual(self.app.get('/api/receta/9999/votos').status_code, 404)
+        self.assertNotIn('ETag', self.app.get('/api/recetas?cursor=roto').headers)
+
+    def test_votos_diferidos_agrupan_transacciones(self):
+        """Prueba que el escritor diferido agrupe votos concurrentes en pocos commits"""
+        id_receta, = self.crear_recetas_prueba([{'titulo': 'Popular'}])
+        with get_db_connection() as db:
+            db.cursor.executemany(
+                "INSERT INTO usuario (nombre, apellido, email, password) VALUES ('U', 'U', ?, 'x')",
+                [(f'u{i}@x.com',) for i in range(40)]
+            )
+            db.conexion.commit()
+            db.cursor.execute("SELECT id_usuario FROM usuario WHERE email LIKE 'u%@x.com'")
+            usuarios = [row[0] for row in db.cursor.fetchall()]
+
+        escritor = EscritorVotosDiferido(get_db_connection, intervalo=0.05)
+        errores = []
+
+        def votar(id_usuario):
+            escritor.votar(id_receta, id_usuario, 1 if id_usuario % 2 else -1)
+            try:
+                escritor.votar(9999, id_usuario, 1)
+            except sqlite3.IntegrityError as e:
+                errores.append(e)
+
+        hilos = [threading.Thread(target=votar, args=(u,)) for u in usuarios]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        escritor.detener()
+
+        self.assertEqual(len(errores), len(usuarios))
+        self.assertLess(escritor.lotes, escritor.votos)
+        with get_db_connection(solo_lectura=True) as db:
+            estadisticas = db.obtener_estadisticas_votos(id_receta)
+            self.assertEqual(estadisticas['likes'] + estadisticas['dislikes'], len(usuarios))
+            self.assertEqual(db.verificar_contadores_votos(), [])
+
+    def test_votos_diferidos_vencidos(self):
+        """Prueba que un voto que no se confirma a tiempo responda 503 y no se aplique si no empezó"""
+        id_receta, = self.crear_recetas_prueba([{'titulo': 'Lenta'}])
+        liberar = threading.Event()
+
+        def conexion_lenta():
+            liberar.wait()
+            return get_db_connection()
+
+        escritor = EscritorVotosDiferido(conexion_lenta, timeout=0.05)
+        # El primer voto ocupa al escritor; el segundo vence todavía en la cola
+        with self.assertRaises(EscritorSaturado):
+            escritor.votar(id_receta, 1, 1)
+        with self.app.session_transaction() as sess:
+            sess['user_id'] = 2
+        app.config['VOTOS_DIFERIDOS'] = True
+        try:
+            with mock.patch('app.obtener_escritor_votos', return_value=escritor):
+                respuesta = self.app.post(f'/api/receta/{id_receta}/votar', json={'tipo_voto': -1})
+        finally:
+            app.config['VOTOS_DIFERIDOS'] = False
+        self.assertEqual(respuesta.status_code, 503)
+        self.assertEqual(respuesta.headers['Retry-After'], '1')
+        liberar.set()
+        escritor.detener()
+
+        self.assertEqual(escritor.vencidos, 2)
+        with get_db_connection(solo_lectura=True) as db:
+            self.assertEqual(db.obtener_estadisticas_votos(id_receta), {'likes': 1, 'dislikes': 0})
+
+    def test_recetas_relacionadas_precalculadas(self):
+        """Prueba el índice de relacionadas: ranking por IDF, alta incremental y una sola consulta"""
+        id_a, id_b, id_c, id_d, id_e = self.crear_recetas_prueba(
+            [{'titulo': t} for t in ('A', 'B', 'C', 'D', 'E')]
+        )
+        self.etiquetar_recetas([id_a, id_b, id_c, id_d], ['Rápido'])
+        self.etiquetar_recetas([id_a, id_b], ['Keto'])
+        self.etiquetar_recetas([id_a, id_c, id_d], ['Vegano'])
+        with get_db_connection() as db:
+            db.reconstruir_recetas_relacionadas()
+            relacionadas = [r['id_receta'] for r in db.obtener_recetas_relacionadas(id_a, limite=4)]
+        # B comparte la etiqueta rara; E no comparte ninguna y sólo completa la lista
+        self.assertEqual(relacionadas[0], id_b)
+        self.assertEqual(relacionadas[-1], id_e)
+
+        # Una receta nueva entra al índice y a las listas de sus vecinas
+        with self.app.session_transaction() as sess:
+            sess['user_id'] = 1
+        with get_db_connection() as db:
+            db.cursor.execute("SELECT id_etiqueta FROM etiquetas WHERE nombre IN ('Keto', 'Rápido')")
+            etiquetas = [str(row[0]) for row in db.cursor.fetchall()]
+        self.app.post('/crear-receta', data=dict(
+            titulo='F', descripcion='d', ingredientes='i', instrucciones='p',
+            tiempo_preparacion=5, porciones=1, etiquetas=etiquetas
+        ))
+        with get_db_connection(solo_lectura=True) as db:
+            db.cursor.execute("SELECT id_receta FROM recetas WHERE titulo = 'F'")
+            id_f = db.cursor.fetchone()[0]
+            propias = [r['id_receta'] for r in db.obtener_recetas_relacionadas(id_f, limite=10)]
+            de_b = [r['id_receta'] for r in db.obtener_recetas_relacionadas(id_b, limite=10)]
+        self.assertEqual(propias[:2], [id_b, id_a])
+        self.assertEqual(de_b[0], id_f)
+        with get_db_connection() as db:
+            db.reconstruir_recetas_relacionadas()
+            self.assertEqual([r['id_receta'] for r in db.obtener_recetas_relacionadas(id_f, limite=10)], propias)
+
+        sentencias = self.contar_sentencias(f'/receta/{id_a}')
+        self.assertEqual(len([s for s in sentencias if 'recetas_relacionadas' in s]), 1)
+        self.assertFalse([s for s in sentencias if 'DISTINCT r.*' in s])
+
+        # Alta incremental: sólo se escriben las listas que cambian. A la receta
+        # G (la misma firma que C y D) se le da un puntaje de 0,5 contra cada
+        # vecina: en la lista de A empata con la última pero no la desplaza (ID menor)
+        id_g, id_h = self.crear_recetas_prueba([{'titulo': 'G'}, {'titulo': 'H'}])
+        self.etiquetar_recetas([id_g], ['Rápido', 'Vegano'])
+        with get_db_connection() as db:
+            db.cursor.execute("DELETE FROM recetas_relacionadas")
+            db.cursor.execute("DELETE FROM receta_etiqueta WHERE id_receta NOT IN (?, ?, ?, ?)",
+                              (id_a, id_c, id_d, id_g))
+            listas = {id_a: [(id_e, 0.9), (id_h, 0.5)],  # empate con ID mayor: no cambia
+                      id_c: [(id_e, 0.9), (id_h, 0.4)],  # la desplaza
+                      id_d: [(id_e, 0.9)]}                # tiene lugar
+            db.cursor.executemany("INSERT INTO recetas_relacionadas VALUES (?, ?, ?)",
+                                  [(r, o, p) for r, lista in listas.items() for o, p in lista])
+            cambios = db.conexion.total_changes
+            with mock.patch('base_datos.relacionadas.similitud', return_value=0.5):
+                actualizar_relacionadas(db.conexion, id_g, k=2)
+            # 2 filas propias, G en las listas de C y D y la fila recortada de C
+            self.assertEqual(db.conexion.total_changes - cambios, 5)
+            db.cursor.execute("SELECT id_receta, id_relacionada FROM recetas_relacionadas WHERE id_receta != ?",
+                              (id_g,))
+            self.assertEqual(sorted(tuple(fila) for fila in db.cursor.fetchall()), sorted([
+                (id_a, id_e), (id_a, id_h), (id_c, id_e), (id_c, id_g), (id_d, id_e), (id_d, id_g)
+            ]))
+            db.conexion.rollback()
+
+    def test_cache_landing_page(self):
+        """Prueba la caché de la landing: aciertos, invalidación entre procesos y TTL"""
+        id_receta, = self.crear_recetas_prueba([{'titulo': 'Primera receta'}])
+
+        def estado():
+            return json.loads(self.app.get('/api/estado/cache').data)['datos']
+
+        inicial = estado()
+        self.assertIn(b'Primera receta', self.app.get('/').data)
+        self.app.get('/')
+        self.assertEqual(estado()['fallos'] - inicial['fallos'], 1)
+        self.assertEqual(estado()['aciertos'] - inicial['aciertos'], 1)
+
+        # Un voto no cambia la landing y no la invalida
+        with get_db_connection() as db:
+            db.votar_receta(id_receta, 1, 1)
+        antes = estado()
+        self.app.get('/')
+        self.assertEqual(estado()['aciertos'] - antes['aciertos'], 1)
+
+        # Una receta insertada desde otra conexión (otro proceso) sí la invalida
+        with Conexion(app.config['DATABASE']) as otro_proceso:
+            otro_proceso.cursor.execute(
+                "INSERT INTO recetas (titulo, descripcion, id_usuario) VALUES ('Receta de otro worker', '', 1)"
+            )
+            otro_proceso.conexion.commit()
+        antes = estado()
+        self.assertIn(b'Receta de otro worker', self.app.get('/').data)
+        self.assertEqual(estado()['fallos'] - antes['fallos'], 1)
+
+        # Vencido el TTL se vuelve a consultar aunque la versión no cambie
+        antes = estado()
+        with mock.patch.object(cache_datos, 'reloj', lambda: time.monotonic() + cache_datos.ttl + 1):
+            self.app.get('/')
+        self.assertEqual(estado()['fallos'] - antes['fallos'], 1)
+
+    def test_catalogo_de_etiquetas_en_cache(self):
+        """Prueba que el catálogo de etiquetas se lea una vez y se refresque al cambiar"""
+        ids = self.crear_recetas_prueba([{'titulo': 'Tarta'}, {'titulo': 'Guiso'}])
+        self.etiquetar_recetas(ids, ['Vegano'])
+        self.etiquetar_recetas(ids[:1], ['Keto'])
+
+        self.app.get('/recetas')
+        sentencias = self.contar_sentencias('/recetas?etiqueta=Keto')
+        self.assertFalse([s for s in sentencias if 'FROM etiquetas' in s])
+
+        with get_db_connection(solo_lectura=True) as db:
+            catalogo = db.obtener_catalogo_etiquetas()
+            self.assertEqual({e['nombre']: e['recetas'] for e in catalogo['etiquetas']},
+                             {'Vegano': 2, 'Keto': 1})
+            self.assertEqual([r['id_receta'] for r in db.obtener_recetas(etiqueta='Keto')], ids[:1])
+            self.assertEqual(db.obtener_recetas(etiqueta='Inexistente'), [])
+
+        # Etiquetar otra receta (desde otra conexión) actualiza conteos y filtros
+        self.etiquetar_recetas(ids[1:], ['Keto', 'Picante'])
+        with get_db_connection(solo_lectura=True) as db:
+            catalogo = db.obtener_catalogo_etiquetas()
+            self.assertEqual(catalogo['etiquetas'][1]['recetas'], 2)
+            self.assertIn('Picante', catalogo['por_nombre'])
+            self.assertEqual(len(db.obtener_recetas(etiqueta='Picante')), 1)
+
+    def test_comentarios_paginados(self):
+        """Prueba la primera página de comentarios en la vista y el resto por la API"""
+        id_receta, = self.crear_recetas_prueba([{'titulo': 'Muy comentada'}])
+        with get_db_connection() as db:
+            # Varios comentarios comparten fecha para probar el desempate por ID
+            db.cursor.executemany("""
+                INSERT INTO comentarios (descripcion, id_usuario, id_receta, fecha_creacion)
+                VALUES (?, 1, ?, ?)
+            """, [(f'Comentario {i}', id_receta, f'2024-01-{1 + i // 3:02d} 10:00:00') for i in range(25)])
+            db.conexion.commit()
+
+        html = self.app.get(f'/receta/{id_receta}').data.decode()
+        self.assertIn('Comentario 24', html)
+        self.assertNotIn('Comentario 0<', html)
+        self.assertIn('09/01/2024 10:00', html)
+        self.assertIn('Ver más comentarios', html)
+
+        vistos, url = [], f'/api/receta/{id_receta}/comentarios?limite=4'
+        while url:
+            data = json.loads(self.app.get(url).data)
+            vistos.extend(c['contenido'] for c in data['comentarios'])
+            url = data['siguiente_url']
+        self.assertEqual(vistos, [f'Comentario {i}' for i in range(24, -1, -1)])
+        self.assertEqual(data['comentarios'][-1]['fecha'], '2024-01-01T10:00:00')
+
+        self.assertEqual(self.app.get(f'/api/receta/{id_receta}/comentarios?cursor=xx').status_code, 400)
+        for malo in (codificar_cursor('comentario', 'x'), codificar_cursor('comentario', [], 1)):
+            self.assertEqual(self.app.get(f'/api/receta/{id_receta}/comentarios?cursor={malo}').status_code, 400)
+        self.assertEqual(self.app.get(f'/api/receta/{id_receta}/comentarios?limite=0').status_code, 400)
+
+    def test_contrasenas_en_pool_de_procesos(self):
+        """Prueba el hash en otro proceso, la actualización del costo al iniciar sesión y el 503"""
+        servicio = ServicioContrasenas(metodo='pbkdf2:sha256:1000', procesos=1)
+        try:
+            hash_viejo = servicio.hashear('secreta')
+            self.assertTrue(hash_viejo.startswith('pbkdf2:sha256:1000$'))
+            self.assertEqual(servicio.verificar(hash_viejo, 'otra'), (False, None))
+        finally:
+            servicio.cerrar()
+
+        with get_db_connection() as db:
+            db.crear_usuario('Ana', 'Costo', 'ana@prueba.com', password_hash=hash_viejo)
+            # Un correo repetido no vuelve a insertar ni a hashear
+            self.assertIsNone(db.crear_usuario('Ana', 'Otra', 'ana@prueba.com', password='x'))
+
+        response = self.app.post('/iniciar-sesion', data={'email': 'ana@prueba.com', 'password': 'secreta'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/perfil', response.location)
+        with get_db_connection(solo_lectura=True) as db:
+            hash_nuevo = db.obtener_credenciales('ana@prueba.com')['password']
+        self.assertFalse(necesita_rehash(hash_nuevo, app.config['PASSWORD_METODO']))
+
+        saturado = ServicioContrasenas(procesos=0, max_pendientes=0)
+        with mock.patch('app.obtener_servicio_contrasenas', return_value=saturado):
+            response = self.app.post('/iniciar-sesion', data={'email': 'ana@prueba.com', 'password': 'secreta'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(saturado.estadisticas()['rechazados'], 1)
+
+        # Un resultado que no llega a tiempo es un 503 y su cupo sigue ocupado
+        # hasta que el trabajo termina en el pool
+        bloqueo = threading.Event()
+        hilos = ThreadPoolExecutor(max_workers=1)
+        lento = ServicioContrasenas(procesos=1, max_pendientes=1, timeout=0.05)
+        try:
+            with mock.patch.object(lento, '_obtener_ejecutor', return_value=hilos):
+                with self.assertRaises(ServicioSaturado):
+                    lento._ejecutar(bloqueo.wait)
+                with self.assertRaises(ServicioSaturado):
+                    lento._ejecutar(bloqueo.wait)
+                estado = lento.estadisticas()
+                self.assertEqual((estado['pendientes'], estado['vencidos'], estado['rechazados']), (1, 1, 1))
+                bloqueo.set()
+                hilos.submit(int).result()  # un solo hilo: el trabajo anterior ya terminó
+                self.assertEqual(lento.estadisticas()['pendientes'], 0)
+                self.assertEqual(lento._ejecutar(len, 'libre'), 5)
+        finally:
+            bloqueo.set()
+            hilos.shutdown()
+
+    def test_importador_reanudable_con_indices_diferidos(self):
+        """Prueba la importación por lotes: rechazos, reanudación, índices diferidos y CSV"""
+        self.crear_recetas_prueba([])
+        fd, ruta = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(fd, 'w', encoding='utf-8') as archivo:
+            for i in range(25):
+                archivo.write(json.dumps({
+                    'titulo': f'Importada {i}', 'ingredientes': ['harina', 'agua'],
+                    'porciones': 2, 'etiquetas': ['Importada', 'Par' if i % 2 == 0 else 'Impar']
+                }) + '\n')
+            archivo.write('{"titulo": ""}\n{roto\n')
+        esquema = "SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') ORDER BY name"
+
+        def interrumpir(mensaje):
+            raise KeyboardInterrupt
+
+        try:
+            with get_db_connection() as db:
+                objetos = db.cursor.execute(esquema).fetchall()
+                importador = ImportadorRecetas(db, tamano_lote=10, usuario_por_defecto='chef@prueba.com',
+                                               diferir_indices=True)
+                with self.assertRaises(KeyboardInterrupt):
+                    importador.importar(ruta, informar=interrumpir)
+                self.assertEqual(db.cursor.execute("SELECT COUNT(*) FROM recetas").fetchone()[0], 10)
+
+                importador = ImportadorRecetas(db, tamano_lote=10, usuario_por_defecto='chef@prueba.com',
+                                               diferir_indices=True)
+                mensajes, salida = [], io.StringIO()
+                with redirect_stdout(salida):
+                    resumen = importador.importar(ruta, informar=mensajes.append)
+                self.assertEqual((resumen['filas'], resumen['importadas'], resumen['rechazadas']), (27, 25, 2))
+                # Los rechazos se informan por el callback, no por stdout
+                self.assertEqual(len([m for m in mensajes if m.startswith('Registro rechazado')]), 2)
+                self.assertEqual(salida.getvalue(), '')
+                self.assertEqual(db.cursor.execute(esquema).fetchall(), objetos)
+                self.assertEqual(importador.importar(ruta, informar=lambda m: None)['importadas'], 25)
+
+                self.assertEqual(db.cursor.execute("SELECT COUNT(*) FROM recetas").fetchone()[0], 25)
+                self.assertEqual(len(db.obtener_recetas(etiqueta='Par', limite=50)), 13)
+                self.assertEqual(len(db.obtener_recetas(busqueda='importada harina', limite=50)), 25)
+                self.assertEqual(len(db.obtener_recetas_relacionadas(1, limite=3)), 3)
+
+                # CSV: etiquetas separadas por "|" y autor por email
+                ruta_csv = ruta + '.csv'
+                with open(ruta_csv, 'w', encoding='utf-8') as archivo:
+                    archivo.write('titulo,email,etiquetas,tiempo_preparacion\n'
+                                  'Desde CSV,chef@prueba.com,Importada|Nueva,15\n')
+                resumen = ImportadorRecetas(db).importar(ruta_csv, informar=lambda m: None)
+                self.assertEqual(resumen['importadas'], 1)
+                self.assertEqual(len(db.obtener_recetas(etiqueta='Nueva')), 1)
+        finally:
+            for archivo in (ruta, ruta + '.csv'):
+                if os.path.exists(archivo):
+                    os.unlink(archivo)
+
+    def test_indice_de_ingredientes(self):
+        """Prueba el análisis de ingredientes, el alta incremental y el filtro por índice"""
+        self.assertEqual(parsear_linea('½ kg de papas'),
+                         {'cantidad': 0.5, 'unidad': 'kg', 'nombre': 'papa', 'texto': '½ kg de papas'})
+        self.assertEqual(parsear_linea('2-3 dientes de ajo, picados')['nombre'], 'ajo')
+        self.assertEqual(parsear_linea('Sal y pimienta a gusto')['cantidad'], None)
+        self.assertEqual(parsear_linea('3 huevos')['unidad'], 'unidad')
+        self.assertIsNone(parsear_linea('Para la masa:'))
+        # Plurales que sólo agregan 's' no pierden la vocal final
+        for linea, nombre in (('2 chiles verdes', 'chile verde'), ('100 g de dulces', 'dulce'),
+                              ('500 g de carnes', 'carne'), ('2 potajes', 'potaje'),
+                              ('3 frijoles', 'frijol'), ('4 nueces', 'nuez'), ('2 limones', 'limón'),
+                              # El singular recupera (o pierde) la tilde que cambia con el plural
+                              ('2 calabacines', 'calabacín'), ('1 calabacín', 'calabacín'),
+                              ('3 cebollines', 'cebollín'), ('1 cebollín', 'cebollín'),
+                              ('2 almacenes', 'almacén'), ('1 almacén', 'almacén'),
+                              ('4 panes', 'pan'), ('2 exámenes', 'examen')):
+            self.assertEqual(parsear_linea(linea)['nombre'], nombre)
+
+        with self.app.session_transaction() as sess:
+            sess['user_id'] = 1
+        self.crear_recetas_prueba([{'titulo': 'Previa', 'ingredientes': '1 taza de arroz'},
+                                   {'titulo': 'Budín', 'ingredientes': '2 calabacines'}])
+        self.app.post('/crear-receta', data=dict(
+            titulo='Tortilla', descripcion='d', instrucciones='p', tiempo_preparacion=5, porciones=1,
+            ingredientes='4 Huevos\n500 gr de papas\n1 cebolla'
+        ))
+        with get_db_connection(solo_lectura=True) as db:
+            db.cursor.execute("SELECT id_receta FROM recetas WHERE titulo = 'Tortilla'")
+            id_tortilla = db.cursor.fetchone()[0]
+            ingredientes = db.obtener_ingredientes_receta(id_tortilla)
+            self.assertEqual([(i['nombre'], i['cantidad'], i['unidad']) for i in ingredientes],
+                             [('huevo', 4, 'unidad'), ('papa', 500, 'g'), ('cebolla', 1, 'unidad')])
+
+            # El filtro es un join por índice, no un recorrido de receta_has_ingrediente
+            query, params, _ = db._consulta_recetas(ingrediente='papa')
+            db.cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+            plan = ' '.join(row[3] for row in db.cursor.fetchall())
+            self.assertIn('idx_ingrediente_nombre', plan)
+            self.assertIn('idx_receta_ingrediente_ingrediente', plan)
+
+        datos = self.app.get('/api/recetas?ingrediente=Papas').get_json()
+        self.assertEqual([r['titulo'] for r in datos['recetas']], ['Tortilla'])
+        self.assertEqual(self.app.get('/api/recetas?ingrediente=arroz').get_json()['recetas'], [])
+
+        # La reconstrucción completa indexa también las recetas cargadas por fuera
+        with get_db_connection() as db:
+            db.reconstruir_indice_ingredientes()
+        datos = self.app.get('/api/recetas?ingrediente=arroz').get_json()
+        self.assertEqual([r['titulo'] for r in datos['recetas']], ['Previa'])
+        for consulta in ('calabacín', 'Calabacines'):
+            datos = self.app.get(f'/api/recetas?ingrediente={consulta}').get_json()
+            self.assertEqual([r['titulo'] for r in datos['recetas']], ['Budín'])
+
+    def test_facetas_por_etiqueta(self):
+        """Prueba los conteos por etiqueta del conjunto filtrado, en una consulta y en caché"""
+        ids = self.crear_recetas_prueba([
+            {'titulo': 'Tarta de pollo', 'ingredientes': 'pollo'},
+            {'titulo': 'Pollo al horno', 'ingredientes': 'pollo\npapas'},
+            {'titulo': 'Tarta de verdura', 'ingredientes': 'acelga'},
+            {'titulo': 'Guiso', 'ingredientes': 'papas'},
+        ])
+        self.etiquetar_recetas(ids[:3], ['Rápido'])
+        self.etiquetar_recetas([ids[0], ids[2]], ['Vegano'])
+        with get_db_connection() as db:
+            db.reconstruir_indice_ingredientes()
+
+        def conteos(url):
+            facetas = self.app.get(url).get_json()['facetas']
+            return facetas['total'], {e['nombre']: e['recetas'] for e in facetas['etiquetas']}
+
+        self.assertEqual(conteos('/api/recetas?facetas=1'), (4, {'Rápido': 3, 'Vegano': 2}))
+        self.assertEqual(conteos('/api/recetas?facetas=1&buscar=tarta'), (2, {'Rápido': 2, 'Vegano': 2}))
+        self.assertEqual(conteos('/api/recetas?facetas=1&ingrediente=papa'), (2, {'Rápido': 1}))
+        self.assertEqual(conteos('/api/recetas?facetas=1&buscar=pollo&ingrediente=papa'), (1, {'Rápido': 1}))
+        # La etiqueta elegida también filtra: cada conteo es lo que daría sumarla
+        self.assertEqual(conteos('/api/recetas?facetas=1&etiqueta=Vegano'), (2, {'Rápido': 2, 'Vegano': 2}))
+        self.assertEqual(conteos('/api/recetas?facetas=1&ingrediente=papa&etiqueta=Rápido'), (1, {'Rápido': 1}))
+        # La misma selección da los mismos conteos por el filtro SQL y por el combinado
+        for simple, combinado in (('etiqueta=Vegano', 'alguna=Vegano'),
+                                  ('etiqueta=Rápido&buscar=pollo', 'alguna=Rápido&buscar=pollo'),
+                                  ('etiqueta=Rápido&ingrediente=papa', 'etiqueta=Rápido&etiqueta=Rápido&ingrediente=papa')):
+            self.assertEqual(conteos(f'/api/recetas?facetas=1&{simple}'), conteos(f'/api/recetas?facetas=1&{combinado}'))
+        # Cada etiqueta enlaza al filtro actual con ella sumada (o quitada, si ya está)
+        pagina = self.app.get('/recetas?etiqueta=Vegano').get_data(as_text=True)
+        self.assertIn('href="/recetas?etiqueta=Vegano&amp;etiqueta=R%C3%A1pido"', pagina)
+        self.assertIn('href="/recetas"', pagina)
+        self.assertNotIn('facetas', self.app.get('/api/recetas').get_json())
+
+        # Una sola consulta agregada, y ninguna mientras la caché sigue vigente
+        sentencias = self.contar_sentencias('/recetas?buscar=pollo')
+        self.assertEqual(len([s for s in sentencias if 'GROUP BY re.id_etiqueta' in s]), 1)
+        sentencias = self.contar_sentencias('/recetas?buscar=pollo')
+        self.assertFalse([s for s in sentencias if 'GROUP BY re.id_etiqueta' in s])
+
+        # Una etiqueta nueva invalida los conteos
+        self.etiquetar_recetas([ids[1]], ['Vegano'])
+        self.assertEqual(conteos('/api/recetas?facetas=1&buscar=pollo')[1], {'Rápido': 2, 'Vegano': 2})
+        response = self.app.get('/recetas?buscar=tarta')
+        self.assertIn(b'Vegano <span class="badge bg-light text-dark ms-1">2</span>', response.data)
+
+    def test_busqueda_por_despensa(self):
+        """Prueba el ranking por cobertura de la despensa, el alta incremental y la recarga"""
+        # Contador por planos de bits: posición 0 en 3 bitsets, 1 en 1, 2 en 2
+        planos = sumar_bitsets([0b101, 0b111, 0b001])
+        self.assertEqual(posiciones_con_cuenta(planos, 3, 0b111), 0b001)
+        self.assertEqual(posiciones_con_cuenta(planos, 2, 0b111), 0b100)
+        self.assertEqual(posiciones_con_cuenta(planos, 1, 0b111), 0b010)
+
+        id_tortilla, id_pure, id_torta, _ = self.crear_recetas_prueba([
+            {'titulo': 'Tortilla', 'ingredientes': '4 huevos\n2 papas\n1 cebolla'},
+            {'titulo': 'Puré', 'ingredientes': '1 kg de papas\n50 g de manteca'},
+            {'titulo': 'Torta', 'ingredientes': '3 huevos\n200 g de harina\n100 g de azúcar\nManteca'},
+            {'titulo': 'Arroz', 'ingredientes': '1 taza de arroz'},
+        ])
+        with get_db_connection() as db:
+            db.reconstruir_indice_ingredientes()
+
+        datos = self.app.get('/api/despensa?ingrediente=Huevos,papas&ingrediente=cebolla&ingrediente=caviar').get_json()
+        self.assertEqual([r['id_receta'] for r in datos['recetas']], [id_tortilla, id_pure, id_torta])
+        self.assertEqual(datos['recetas'][0]['cobertura'], 1.0)
+        self.assertEqual(datos['recetas'][1]['faltan'], ['manteca'])
+        self.assertEqual(datos['total'], 3)
+        self.assertEqual(datos['desconocidos'], ['caviar'])
+
+        datos = self.app.get('/api/despensa?ingrediente=huevo,papa,cebolla&faltantes=1').get_json()
+        self.assertEqual([r['id_receta'] for r in datos['recetas']], [id_tortilla, id_pure])
+        self.assertEqual(self.app.get('/api/despensa').status_code, 400)
+        self.assertEqual(self.app.get('/api/despensa?ingrediente=papa&faltantes=-1').status_code, 400)
+
+        # Una receta nueva entra al índice sin recargarlo entero
+        with self.app.session_transaction() as sess:
+            sess['user_id'] = 1
+        self.app.post('/crear-receta', data=dict(
+            titulo='Papas fritas', descripcion='d', instrucciones='p', tiempo_preparacion=5, porciones=1,
+            ingredientes='3 papas'
+        ))
+        datos = self.app.get('/api/despensa?ingrediente=papa&limite=1').get_json()
+        self.assertEqual([r['titulo'] for r in datos['recetas']], ['Papas fritas'])
+        estado = self.app.get('/api/estado/cache').get_json()['despensa']
+        self.assertEqual((estado['recargas'], estado['incrementales'], estado['recetas']), (1, 1, 5))
+
+        # Reconstruir el índice de ingredientes obliga a recargar
+        with get_db_connection() as db:
+            db.reconstruir_indice_ingredientes()
+        self.app.get('/api/despensa?ingrediente=arroz')
+        self.assertEqual(self.app.get('/api/estado/cache').get_json()['despensa']['recargas'], 2)
+
+    def test_filtro_combinado_de_etiquetas(self):
+        """Prueba los bitmaps comprimidos y los filtros Y/O/NO de etiquetas y restricciones"""
+        # Un bloque pasa de conjunto a bitmap al superar 4096 elementos y vuelve al achicarse
+        pares = Bitmap(range(0, 20000, 2))
+        tercios = Bitmap(range(0, 20000, 3))
+        self.assertEqual(list(pares & tercios), list(range(0, 20000, 6)))
+        self.assertEqual(len(pares | tercios), len(set(range(0, 20000, 2)) | set(range(0, 20000, 3))))
+        self.assertEqual(list(Bitmap([1, 70000, 5]) - Bitmap([5])), [1, 70000])
+        self.assertIn(19998, pares)
+        self.assertNotIn(19999, pares)
+
+        ids = self.crear_recetas_prueba([{'titulo': f'Receta {i}'} for i in range(6)])
+        self.etiquetar_recetas(ids[:4], ['Rápido'])
+        self.etiquetar_recetas(ids[2:], ['Vegano'])
+        self.etiquetar_recetas([ids[5]], ['Keto'])
+        with get_db_connection() as db:
+            restricciones = {r['nombre']: r['id_restriccion'] for r in db.obtener_restricciones()}
+            db.cursor.executemany(
+                "INSERT INTO receta_has_restriccion (id_receta, id_restriccion) VALUES (?, ?)",
+                [(i, restricciones['Sin TACC']) for i in (ids[1], ids[3], ids[5])]
+            )
+            db.conexion.commit()
+
+        def listar(consulta):
+            datos = self.app.get('/api/recetas?limite=2&' + consulta).get_json()
+            encontrados = [r['id_receta'] for r in datos['recetas']]
+            while datos['siguiente_url']:
+                datos = self.app.get(datos['siguiente_url']).get_json()
+                encontrados += [r['id_receta'] for r in datos['recetas']]
+            return sorted(encontrados)
+
+        self.assertEqual(listar('etiqueta=Rápido&etiqueta=Vegano'), ids[2:4])
+        self.assertEqual(listar('alguna=Keto&alguna=Rápido&sin=Vegano'), ids[:2])
+        self.assertEqual(listar('etiqueta=Vegano&restriccion=Sin+TACC'), [ids[3], ids[5]])
+        self.assertEqual(listar('sin=Rápido&sin=Keto'), [ids[4]])
+        self.assertEqual(listar('etiqueta=Vegano&etiqueta=Inexistente'), [])
+        self.assertEqual(listar('etiqueta=Vegano&buscar=Receta&restriccion=Sin+TACC'), [ids[3], ids[5]])
+
+        # Filtros grandes se prueban fila por fila en lugar de pasarse como lista
+        with mock.patch('base_datos.conexion.MAX_IDS_FILTRO_EN_LISTA', 1):
+            self.assertEqual(listar('etiqueta=Rápido&sin=Vegano'), ids[:2])
+
+        # Las facetas cuentan sobre el conjunto filtrado (también cuando el listado usa la UDF)
+        def facetas(consulta):
+            datos = self.app.get('/api/recetas?facetas=1&' + consulta).get_json()['facetas']
+            return datos['total'], {e['nombre']: e['recetas'] for e in datos['etiquetas']}
+
+        self.assertEqual(facetas(''), (6, {'Rápido': 4, 'Vegano': 4, 'Keto': 1}))
+        self.assertEqual(facetas('sin=Vegano'), (2, {'Rápido': 2}))
+        with mock.patch('base_datos.conexion.MAX_IDS_FILTRO_EN_LISTA', 1):
+            self.assertEqual(facetas('sin=Rápido&sin=Keto'), (1, {'Vegano': 1}))
+            self.assertEqual(facetas('buscar=Receta&sin=Vegano'), (2, {'Rápido': 2}))
+        self.assertEqual(facetas('restriccion=Sin+TACC'), (3, {'Rápido': 2, 'Vegano': 2, 'Keto': 1}))
+        # Un cambio de restricciones invalida las facetas en caché
+        with get_db_connection() as db:
+            db.cursor.execute("INSERT INTO receta_has_restriccion (id_receta, id_restriccion) VALUES (?, ?)",
+                              (ids[0], restricciones['Sin TACC']))
+            db.conexion.commit()
+        self.assertEqual(facetas('restriccion=Sin+TACC'), (4, {'Rápido': 3, 'Vegano': 2, 'Keto': 1}))
+        recargas = self.app.get('/api/estado/cache').get_json()['filtros']['recargas']
+        response = self.app.get('/recetas?etiqueta=Rápido&sin=Vegano')
+        self.assertIn('sin Vegano'.encode(), response.data)
+        self.assertIn(b'Receta 1', response.data)
+        self.assertNotIn(b'Receta 2', response.data)
+
+        # Una receta nueva con restricciones entra al índice sin recargarlo entero
+        with self.app.session_transaction() as sess:
+            sess['user_id'] = 1
+        self.app.post('/crear-receta', data=dict(
+            titulo='Nueva', descripcion='d', instrucciones='p', tiempo_preparacion=5, porciones=1,
+            ingredientes='arroz', restricciones=[restricciones['Sin TACC'], restricciones['Vegano']]
+        ))
+        nuevas = listar('restriccion=Sin+TACC&restriccion=Vegano')
+        self.assertEqual(len(nuevas), 1)
+        self.assertGreater(nuevas[0], ids[-1])
+        estado = self.app.get('/api/estado/cache').get_json()['filtros']
+        self.assertEqual((estado['recargas'], estado['incrementales'], estado['recetas']), (recargas, 1, 7))
+
+        # Quitar una etiqueta a una receta vieja obliga a recargar
+        with get_db_connection() as db:
+            db.cursor.execute("DELETE FROM receta_etiqueta WHERE id_receta = ?", (ids[2],))
+            db.conexion.commit()
+        self.assertEqual(listar('etiqueta=Rápido&etiqueta=Vegano'), [ids[3]])
+        self.assertEqual(self.app.get('/api/estado/cache').get_json()['filtros']['recargas'], recargas + 1)
+
+    def test_recursos_estaticos_con_huella(self):
+        """Prueba la huella de los estáticos, sus variantes comprimidas y los encabezados"""
+        directorio = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(directorio, 'css'))
+            with open(os.path.join(directorio, 'css', 'a.css'), 'w') as archivo:
+                archivo.write('body { color: red; }\n' * 50)
+            with open(os.path.join(directorio, 'logo.png'), 'wb') as archivo:
+                archivo.write(b'\x89PNG' * 100)
+            brotli_falso = mock.Mock(compress=lambda contenido, quality: b'br:' + contenido[:10])
+            with mock.patch.object(estaticos, 'brotli', brotli_falso):
+                resultado = estaticos.construir(directorio)
+                self.assertEqual(estaticos.construir(directorio)['escritos'], 0)
+            nombre = resultado['manifiesto']['css/a.css']
+            self.assertRegex(nombre, r'^dist/css/a\.[0-9a-f]{10}\.css$')
+            ruta = os.path.join(directorio, *nombre.split('/'))
+            self.assertTrue(os.path.exists(ruta + '.br'))
+            with open(ruta + '.gz', 'rb') as archivo:
+                self.assertEqual(gzip.decompress(archivo.read()), b'body { color: red; }\n' * 50)
+            # Las imágenes no se comprimen
+            png = os.path.join(directorio, *resultado['manifiesto']['logo.png'].split('/'))
+            self.assertFalse(os.path.exists(png + '.gz'))
+
+            # Otro contenido, otro nombre; limpiar borra la versión anterior y sus variantes
+            with open(os.path.join(directorio, 'css', 'a.css'), 'w') as archivo:
+                archivo.write('body { color: blue; }\n')
+            nuevo = estaticos.construir(directorio)['manifiesto']
+            self.assertNotEqual(nuevo['css/a.css'], nombre)
+            self.assertEqual(estaticos.limpiar(directorio, nuevo), 3)
+            self.assertFalse(os.path.exists(ruta))
+        finally:
+            shutil.rmtree(directorio)
+
+        # La aplicación sólo lee el manifiesto: sin construir enlaza los originales
+        # y no escribe nada; sobre una copia de static/ para no tocar el árbol
+        carpeta_original = app.static_folder
+        directorio = os.path.join(tempfile.mkdtemp(), 'static')
+        shutil.copytree(carpeta_original, directorio, ignore=shutil.ignore_patterns(estaticos.DIRECTORIO_SALIDA))
+        app.static_folder = directorio
+        try:
+            with mock.patch.object(recursos_estaticos, 'directorio', directorio):
+                recursos_estaticos.preparar()
+                self.assertFalse(os.path.exists(os.path.join(directorio, estaticos.DIRECTORIO_SALIDA)))
+                self.assertIn('href="/static/auth.css"', self.app.get('/').get_data(as_text=True))
+
+                # Una vez construidos (flask estaticos) enlaza las copias con huella y
+                # elige la variante según Accept-Encoding
+                recursos_estaticos.preparar(construir_antes=True)
+                enlace = re.search(r'href="(/static/dist/auth\.[0-9a-f]{10}\.css)"',
+                                   self.app.get('/').get_data(as_text=True))
+                self.assertIsNotNone(enlace)
+                original = self.app.get('/static/auth.css')
+                self.assertNotIn('immutable', original.headers.get('Cache-Control', ''))
+                response = self.app.get(enlace.group(1), headers={'Accept-Encoding': 'gzip, deflate'})
+                self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+                self.assertEqual(response.headers['Content-Type'], 'text/css; charset=utf-8')
+                self.assertIn('immutable', response.headers['Cache-Control'])
+                self.assertIn('max-age=31536000', response.headers['Cache-Control'])
+                self.assertIn('Accept-Encoding', response.headers['Vary'])
+                self.assertEqual(gzip.decompress(response.data), original.data)
+                response = self.app.get(enlace.group(1), headers={'Accept-Encoding': 'identity'})
+                self.assertNotIn('Content-Encoding', response.headers)
+                self.assertEqual(response.data, original.data)
+                original.close()
+        finally:
+            app.static_folder = carpeta_original
+            recursos_estaticos.preparar()
+            shutil.rmtree(os.path.dirname(directorio))
+
+    def test_compresion_de_respuestas(self):
+        """Prueba la compresión de HTML y JSON según Accept-Encoding, el umbral y Vary"""
+        self.assertEqual(elegir_codificacion('gzip, deflate, br'), 'gzip')
+        self.assertIsNone(elegir_codificacion('gzip;q=0, *'))
+        self.assertIsNone(elegir_codificacion(None))
+        self.assertEqual(elegir_codificacion('gzip, zstd', ['zstd', 'gzip']), 'zstd')
+        self.assertEqual(elegir_codificacion('zstd;q=0.5, gzip', ['zstd', 'gzip']), 'gzip')
+
+        id_receta, _ = self.crear_recetas_prueba([
+            {'titulo': f'Receta comprimible {i}', 'descripcion': 'Muy rica ' * 150} for i in range(2)
+        ])
+        plano = self.app.get('/recetas')
+        self.assertNotIn('Content-Encoding', plano.headers)
+        self.assertIn('Accept-Encoding', plano.headers['Vary'])
+        comprimida = self.app.get('/recetas', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(comprimida.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', comprimida.headers['Vary'])
+        self.assertEqual(int(comprimida.headers['Content-Length']), len(comprimida.data))
+        self.assertLess(len(comprimida.data), len(plano.data) / 3)
+        self.assertEqual(gzip.decompress(comprimida.data), plano.data)
+
+        # El ETag pasa a ser débil y sigue sirviendo para el GET condicional
+        detalle = self.app.get(f'/api/receta/{id_receta}', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(detalle.headers['Content-Encoding'], 'gzip')
+        self.assertTrue(detalle.headers['ETag'].startswith('W/"'))
+        self.assertEqual(self.app.get(f'/api/receta/{id_receta}', headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': detalle.headers['ETag']
+        }).status_code, 304)
+
+        # Por debajo del umbral no se comprime ni varía
+        votos = self.app.get(f'/api/receta/{id_receta}/votos', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', votos.headers)
+        self.assertNotIn('Vary', votos.headers)
+
+        # Streaming, tipos no comprimibles y cuerpos ya codificados pasan sin tocar
+        def aplicacion(environ, start_response):
+            ruta = environ['PATH_INFO']
+            if ruta == '/stream':
+                respuesta = Response((b'x' * 1000 for _ in range(5)), mimetype='text/html')
+            elif ruta == '/png':
+                respuesta = Response(b'x' * 5000, mimetype='image/png')
+            else:
+                respuesta = Response(b'x' * 5000, mimetype='application/json',
+                                     headers={'Content-Encoding': 'br', 'Vary': 'Cookie'})
+            return respuesta(environ, start_response)
+
+        cliente = Client(MiddlewareCompresion(aplicacion, minimo=100))
+        for ruta in ('/stream', '/png', '/br'):
+            respuesta = cliente.get(ruta, headers={'Accept-Encoding': 'gzip'})
+            self.assertIn(respuesta.headers.get('Content-Encoding'), (None, 'br'))
+            self.assertEqual(len(respuesta.data), 5000)
+        self.assertEqual(cliente.get('/br').headers['Vary'], 'Cookie')
+
+    def test_generador_deterministico(self):
+        """Prueba que la misma semilla genere la misma base y que el benchmark cubra Conexion"""
+        directorio = tempfile.mkdtemp()
+        try:
+            volcados = []
+            for nombre in ('a.db', 'b.db'):
+                ruta = os.path.join(directorio, nombre)
+                tamanos = generar(ruta, recetas=60, semilla=7)
+                with sqlite3.connect(ruta) as conexion:
+                    volcados.append(list(conexion.iterdump()))
+                    self.assertEqual(conexion.execute("SELECT COUNT(*) FROM recetas").fetchone()[0], 60)
+                    self.assertEqual(conexion.execute("SELECT COUNT(*) FROM votos").fetchone()[0], tamanos['votos'])
+                conexion.close()
+            self.assertEqual(volcados[0], volcados[1])
+            self.assertEqual(metodos_sin_medir(), [])
+        finally:
+            for nombre in os.listdir(directorio):
+                os.unlink(os.path.join(directorio, nombre))
+            os.rmdir(directorio)
+
+    def test_prueba_de_carga_http(self):
+        """Prueba que la carga HTTP mida cada ruta de la mezcla sin errores"""
+        cerrar_pools()
+        generar(app.config['DATABASE'], recetas=50, password=PASSWORD, metodo_password=METODO_PASSWORD)
+        args = mock.Mock(concurrencia=2, tasa=None, segundos=0.3, calentamiento=0, semilla=1)
+        resumen = cargar(lambda: ClienteInProceso(app), datos_de_prueba(app.config['DATABASE']),
+                         leer_mezcla('navegar=2,buscar=1,votar=1,comentar=1'), args)
+
+        self.assertEqual(set(resumen['rutas']), {'GET /receta/<id>', 'GET /recetas?buscar=',
+                                                  'POST /api/receta/<id>/votar', 'POST /receta/<id>/comentar'})
+        self.assertEqual(resumen['tasa_errores'], 0.0)
+        self.assertGreater(resumen['rutas']['GET /receta/<id>']['p99_ms'], 0)
+        with self.assertRaises(ValueError):
+            leer_mezcla('navegar=1,desconocida=1')
+
+    def test_instrumentacion_sql(self):
+        """Prueba el encabezado Server-Timing y el registro de consultas lentas"""
+        receta_id, = self.crear_recetas_prueba([{'titulo': 'Instrumentada'}])
+        respuesta = self.app.get(f'/receta/{receta_id}')
+        self.assertNotIn('Server-Timing', respuesta.headers)
+
+        cerrar_pools()
+        app.config.update(SQL_INSTRUMENTAR=True, SQL_UMBRAL_LENTO_MS=0)
+        try:
+            salida = io.StringIO()
+            with redirect_stdout(salida):
+                respuesta = self.app.get(f'/receta/{receta_id}')
+            self.assertEqual(respuesta.status_code, 200)
+            metricas = respuesta.headers['Server-Timing']
+            self.assertRegex(metricas, r'^db;dur=[\d.]+;desc="\d+ consultas", sql1;dur=')
+            self.assertIn('app;dur=', metricas)
+            cantidad = int(metricas.split('desc="', 1)[1].split(' ', 1)[0])
+            self.assertGreaterEqual(cantidad, 4)
+            # Con umbral 0 todas las sentencias son lentas y se informan con su plan
+            self.assertIn('Consulta lenta', salida.getvalue())
+            self.assertIn('SEARCH', salida.getvalue())
+        finally:
+            app.config.update(SQL_INSTRUMENTAR=False, SQL_UMBRAL_LENTO_MS=100)
+
+    def test_metricas_prometheus(self):
+        """Prueba /metrics: contadores e histogramas por endpoint, pools y agregación entre procesos"""
+        self.app.get('/recetas')
+        self.app.get('/recetas')
+        self.app.get('/ruta-inexistente')
+        texto = self.app.get('/metrics').get_data(as_text=True)
+
+        self.assertIn('# TYPE recetas_http_duracion_segundos histogram', texto)
+        self.assertRegex(texto, r'recetas_http_pedidos_total\{endpoint="ver_recetas",metodo="GET",codigo="200"\} ([2-9]|\d{2,})\n')
+        self.assertIn('recetas_http_pedidos_total{endpoint="sin_ruta",metodo="GET",codigo="404"}', texto)
+        self.assertRegex(texto, r'recetas_http_duracion_segundos_count\{endpoint="ver_recetas"\} ([2-9]|\d{2,})\n')
+        self.assertIn('recetas_db_conexiones{pool="lectura",estado="abiertas"}', texto)
+        self.assertIn('recetas_cache_fallos_total{cache="etiquetas"}', texto)
+
+        # Los datos de hilos ya terminados se conservan y los procesos se suman
+        directorio = tempfile.mkdtemp()
+        try:
+            procesos = [Metricas(directorio=directorio, pid=pid) for pid in (os.getpid(), os.getppid())]
+            for metricas in procesos:
+                hilo = threading.Thread(target=metricas.incrementar, args=('recetas_db_bloqueada_total',))
+                hilo.start()
+                hilo.join()
+                metricas.observar('recetas_http_duracion_segundos', (('endpoint', 'index'),), 0.02)
+                metricas.registrar_medidor(lambda: [('recetas_cache_entradas', (('cache', 'datos'),), 3)])
+            procesos[1].volcar(forzar=True)
+            texto = procesos[0].exportar()
+            self.assertIn('recetas_db_bloqueada_total 2', texto)
+            self.assertIn('recetas_http_duracion_segundos_bucket{endpoint="index",le="0.01"} 0', texto)
+            self.assertIn('recetas_http_duracion_segundos_bucket{endpoint="index",le="0.025"} 2', texto)
+            self.assertIn('recetas_cache_entradas{cache="datos"} 6', texto)
+
+            # Los totales de otros objetos se exportan como contadores que no bajan
+            # cuando un worker se reinicia (su archivo queda) ni cuando el objeto se recrea
+            proceso = subprocess.Popen([sys.executable, '-c', ''])
+            proceso.wait()
+            terminado = proceso.pid
+            anterior = Metricas(directorio=directorio, pid=terminado)
+            anterior.registrar_contador(lambda: [('recetas_db_esperas_total', (('pool', 'lectura'),), 5)])
+            anterior.volcar(forzar=True)
+            esperas = [3]
+            procesos[0].registrar_contador(lambda: [('recetas_db_esperas_total', (('pool', 'lectura'),), esperas[0])])
+            texto = procesos[0].exportar()
+            self.assertIn('# TYPE recetas_db_esperas_total counter', texto)
+            self.assertIn('recetas_db_esperas_total{pool="lectura"} 8', texto)
+            esperas[0] = 1
+            self.assertIn('recetas_db_esperas_total{pool="lectura"} 9', procesos[0].exportar())
+        finally:
+            for nombre in os.listdir(directorio):
+                os.unlink(os.path.join(directorio, nombre))
+            os.rmdir(directorio)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file